@@ -0,0 +1,131 @@
+"""Compares the segmented indicator kernels with the per-symbol `groupby.transform` lambdas.
+
+Run from the root of the repository:
+
+    python -m Benchmarks.indicator_kernels
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict
+
+from Bot import kernels
+from Bot.indicator_stream import relative_strength_index
+
+
+SYMBOL_COUNTS = [10, 100, 1000]
+BARS_PER_SYMBOL = 2000
+PERIOD = 14
+
+
+def build_prices(symbols: int, bars: int) -> pd.DataFrame:
+    """Builds a random walk of closing prices indexed by `symbol` and `datetime`."""
+
+    random = np.random.default_rng(seed=symbols)
+
+    close = 100.0 + np.cumsum(random.normal(size=(symbols, bars)), axis=1)
+    index = pd.MultiIndex.from_product(
+        [['SYM{number:04d}'.format(number=number) for number in range(symbols)],
+         pd.date_range('2021-01-04 14:30', periods=bars, freq='min')],
+        names=['symbol', 'datetime']
+    )
+
+    return pd.DataFrame(data={'close': close.ravel()}, index=index)
+
+
+def transform_indicators(frame: pd.DataFrame) -> Dict:
+    """The SMA, EMA and RSI computed the way `Indicators` used to, one lambda call per symbol."""
+
+    groups = frame.groupby(by='symbol', as_index=False, sort=True)
+
+    sma = groups['close'].transform(lambda x: x.rolling(window=PERIOD).mean())
+    ema = groups['close'].transform(lambda x: x.ewm(span=PERIOD).mean())
+
+    frame['change_in_price'] = groups['close'].transform(lambda x: x.diff())
+    frame['up_day'] = groups['change_in_price'].transform(lambda x: np.where(x >= 0, x, 0))
+    frame['down_day'] = groups['change_in_price'].transform(lambda x: np.where(x < 0, x.abs(), 0))
+    frame['ewma_up'] = groups['up_day'].transform(lambda x: x.ewm(alpha=1.0 / PERIOD, adjust=False).mean())
+    frame['ewma_down'] = groups['down_day'].transform(lambda x: x.ewm(alpha=1.0 / PERIOD, adjust=False).mean())
+
+    rsi = relative_strength_index(
+        average_up=frame['ewma_up'].to_numpy(),
+        average_down=frame['ewma_down'].to_numpy()
+    )
+
+    frame.drop(
+        labels=['ewma_up', 'ewma_down', 'down_day', 'up_day', 'change_in_price'],
+        axis=1,
+        inplace=True
+    )
+
+    return {'sma': sma.to_numpy(), 'ema': ema.to_numpy(), 'rsi': rsi}
+
+
+def kernel_indicators(close: np.ndarray, offsets: np.ndarray) -> Dict:
+    """The SMA, EMA and RSI computed over every symbol at once."""
+
+    change_in_price = kernels.diff(values=close, offsets=offsets)
+
+    average_up = kernels.ewm_mean(
+        values=np.where(change_in_price >= 0, change_in_price, 0.0),
+        offsets=offsets,
+        alpha=1.0 / PERIOD,
+        adjust=False
+    )
+    average_down = kernels.ewm_mean(
+        values=np.where(change_in_price < 0, -change_in_price, 0.0),
+        offsets=offsets,
+        alpha=1.0 / PERIOD,
+        adjust=False
+    )
+
+    return {
+        'sma': kernels.rolling_mean(values=close, offsets=offsets, window=PERIOD),
+        'ema': kernels.ewm_mean(values=close, offsets=offsets, span=PERIOD),
+        'rsi': relative_strength_index(average_up=average_up, average_down=average_down)
+    }
+
+
+def best_time(function, repeat: int = 3) -> float:
+    """Returns the fastest of a few runs, in seconds."""
+
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return min(timings)
+
+
+def main() -> None:
+
+    print('{:>8} {:>10} {:>14} {:>14} {:>9} {:>12}'.format(
+        'symbols', 'rows', 'transform (s)', 'kernels (s)', 'speedup', 'max diff'))
+
+    for symbols in SYMBOL_COUNTS:
+
+        frame = build_prices(symbols=symbols, bars=BARS_PER_SYMBOL)
+        close = frame['close'].to_numpy()
+        offsets = np.arange(symbols + 1, dtype=np.int64) * BARS_PER_SYMBOL
+
+        expected = transform_indicators(frame=frame)
+        actual = kernel_indicators(close=close, offsets=offsets)
+
+        max_difference = max(
+            np.nanmax(np.abs(expected[name] - actual[name])) for name in expected
+        )
+
+        transform_time = best_time(lambda: transform_indicators(frame=frame))
+        kernel_time = best_time(lambda: kernel_indicators(close=close, offsets=offsets))
+
+        print('{:>8} {:>10} {:>14.4f} {:>14.4f} {:>8.1f}x {:>12.2e}'.format(
+            symbols, len(close), transform_time, kernel_time, transform_time / kernel_time, max_difference))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Measures the cost per bar per symbol of each indicator, computed in full and updated incrementally.
+
+Run from the root of the repository:
+
+    python -m Benchmarks.indicator_library
+"""
+
+import time
+
+import numpy as np
+
+from typing import List
+from typing import Dict
+
+from Bot.indicator import Indicators
+from Bot.stock_frame import StockFrame
+
+
+SYMBOLS = 100
+BARS_PER_SYMBOL = 2000
+NEW_BARS = 20
+
+# The method and keyword arguments of each indicator.
+INDICATORS = {
+    'sma': ('sma', {'period': 50}),
+    'ema': ('ema', {'period': 50}),
+    'rsi': ('rsi', {'period': 14}),
+    'macd': ('macd', {}),
+    'bollinger': ('bollinger_bands', {}),
+    'atr': ('average_true_range', {}),
+    'vwap': ('vwap', {}),
+    'stochastic': ('stochastic_oscillator', {}),
+    'obv': ('on_balance_volume', {})
+}
+
+START = 1_609_770_600_000
+
+
+def build_bars(symbols: int, start_bar: int, bars: int, random: np.random.Generator) -> List[Dict]:
+    """Builds random minute candles for every symbol, in the shape `StockFrame.add_rows` reads."""
+
+    candles = []
+
+    for number in range(symbols):
+
+        close = 100.0 + np.cumsum(random.normal(size=bars))
+        spread = np.abs(random.normal(size=(2, bars)))
+        volume = random.integers(low=100, high=10000, size=bars)
+
+        for bar in range(bars):
+            candles.append({
+                'symbol': 'SYM{number:04d}'.format(number=number),
+                'open': close[bar],
+                'close': close[bar],
+                'high': close[bar] + spread[0, bar],
+                'low': close[bar] - spread[1, bar],
+                'volume': float(volume[bar]),
+                'datetime': START + (start_bar + bar) * 60_000
+            })
+
+    return candles
+
+
+def main() -> None:
+
+    random = np.random.default_rng(seed=0)
+    history = build_bars(symbols=SYMBOLS, start_bar=0, bars=BARS_PER_SYMBOL, random=random)
+    new_bars = [
+        build_bars(symbols=SYMBOLS, start_bar=BARS_PER_SYMBOL + bar, bars=1, random=random)
+        for bar in range(NEW_BARS)
+    ]
+
+    print('{} symbols, {} bars each'.format(SYMBOLS, BARS_PER_SYMBOL))
+    print('{:>12} {:>22} {:>26}'.format('indicator', 'full (us/bar/symbol)', 'incremental (us/bar/symbol)'))
+
+    for name, (method, arguments) in INDICATORS.items():
+
+        stock_frame = StockFrame(data=history)
+        indicator_client = Indicators(price_data_frame=stock_frame)
+
+        # Full history, one row is one bar of one symbol.
+        start = time.perf_counter()
+        getattr(indicator_client, method)(**arguments)
+        full_time = (time.perf_counter() - start) / (SYMBOLS * BARS_PER_SYMBOL)
+
+        # One new bar for every symbol, then a refresh.
+        refresh_time = 0.0
+
+        for candles in new_bars:
+            stock_frame.add_rows(data=candles)
+
+            start = time.perf_counter()
+            indicator_client.refresh()
+            refresh_time += time.perf_counter() - start
+
+        incremental_time = refresh_time / (SYMBOLS * NEW_BARS)
+
+        print('{:>12} {:>22.3f} {:>26.3f}'.format(name, full_time * 1e6, incremental_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
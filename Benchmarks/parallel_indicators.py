@@ -0,0 +1,65 @@
+"""Measures a full-universe indicator rebuild with the symbols sharded across worker processes.
+
+Run from the root of the repository:
+
+    python -m Benchmarks.parallel_indicators
+"""
+
+import os
+import time
+
+import numpy as np
+
+from Bot.indicator import Indicators
+from Bot.stock_frame import StockFrame
+
+from Benchmarks.indicator_library import build_bars
+
+
+SYMBOLS = 500
+BARS_PER_SYMBOL = 2000
+
+
+def main() -> None:
+
+    random = np.random.default_rng(seed=0)
+    stock_frame = StockFrame(data=build_bars(symbols=SYMBOLS, start_bar=0, bars=BARS_PER_SYMBOL, random=random))
+
+    indicator_client = Indicators(price_data_frame=stock_frame)
+    indicator_client.sma(period=50)
+    indicator_client.ema(period=50)
+    indicator_client.rsi(period=14)
+    indicator_client.macd()
+    indicator_client.bollinger_bands()
+    indicator_client.average_true_range()
+    indicator_client.vwap()
+    indicator_client.stochastic_oscillator()
+    indicator_client.on_balance_volume()
+
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    print('{} symbols, {} bars each, {} cores'.format(SYMBOLS, BARS_PER_SYMBOL, os.cpu_count()))
+    print('{:>8} {:>12} {:>9}'.format('workers', 'rebuild (s)', 'speedup'))
+
+    baseline = None
+
+    for workers in worker_counts:
+
+        indicator_client.set_parallel(workers=workers)
+
+        # The first rebuild also starts the worker processes.
+        indicator_client.refresh(incremental=False)
+
+        start = time.perf_counter()
+        indicator_client.refresh(incremental=False)
+        elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+
+        print('{:>8} {:>12.3f} {:>8.1f}x'.format(workers, elapsed, baseline / elapsed))
+
+    indicator_client.set_parallel(workers=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+import os
+import json
+import pathlib
+
+import numpy as np
+
+from typing import List
+from typing import Dict
+from urllib.parse import quote
+
+from Bot.symbol_buffer import SymbolBuffer
+
+
+class MappedSymbolBuffer(SymbolBuffer):
+
+    """
+    Represents a SymbolBuffer whose columns live in memory-mapped files,
+    one file per column, next to a JSON header describing them. The files
+    are append-only: dropping old rows only moves the start of the view into
+    the mapping, the rows stay on disk. The files are mapped again once the
+    hidden rows make up half of the mapping.
+    """
+
+    def __init__(self, folder: pathlib.Path, symbol: str, columns: List[str], capacity: int = 256,
+                 dtypes: Dict[str, np.dtype] = None) -> None:
+        """Opens the buffer for a symbol, creating the files if they don't exist.
+        Arguments:
+        ----
+        folder {pathlib.Path} -- The folder holding the symbol's column files.
+        symbol {str} -- The symbol stored in the buffer.
+        columns {List[str]} -- The value columns the buffer should hold.
+        Keyword Arguments:
+        ----
+        capacity {int} -- The number of rows to preallocate for a new buffer. (default: {256})
+        dtypes {Dict[str, np.dtype]} -- The dtypes of new columns. (default: {None})
+        """
+
+        self._folder = folder
+        self._symbol = symbol
+        self._opened = False
+
+        # The first row of the files in the view, the rows before it were dropped from the view.
+        self._base = 0
+
+        # The rows the mapping holds in front of the view.
+        self._hidden = 0
+        self._folder.mkdir(parents=True, exist_ok=True)
+
+        header = self._read_header()
+        dtypes = dict(dtypes or {})
+
+        # Existing buffers keep their size, capacity, columns and dtypes.
+        if header:
+            capacity = header['capacity']
+            columns = list(header['columns']) + [
+                column for column in columns if column not in header['columns']
+            ]
+            dtypes.update({
+                column: np.dtype(dtype) for column, dtype in header['columns'].items()
+            })
+
+        super().__init__(columns=columns, capacity=capacity, dtypes=dtypes)
+
+        if header:
+            self._size = header['size']
+
+        self._opened = True
+        self.flush()
+
+    @property
+    def header_path(self) -> pathlib.Path:
+        return self._folder.joinpath('header.json')
+
+    def add_column(self, column_name: str, dtype: np.dtype = np.float64) -> None:
+        """Adds a new column file, float columns are filled with `NaN` values."""
+
+        if column_name not in self._columns:
+            super().add_column(column_name=column_name, dtype=dtype)
+
+            # The header is written once the buffer is fully open.
+            if self._opened:
+                self.flush()
+
+    def _column_path(self, column_name: str) -> pathlib.Path:
+        return self._folder.joinpath('{column}.bin'.format(column=quote(column_name, safe='')))
+
+    def _allocate(self, column_name: str, dtype: np.dtype, capacity: int) -> np.ndarray:
+        """Maps the column file, growing it to `capacity` rows if it is shorter."""
+
+        dtype = np.dtype(dtype)
+        file_path = self._column_path(column_name=column_name)
+
+        rows = 0
+        if file_path.exists():
+            rows = file_path.stat().st_size // dtype.itemsize
+
+        if rows < self._base + capacity:
+            with open(file_path, 'ab') as column_file:
+                column_file.truncate((self._base + capacity) * dtype.itemsize)
+
+        values = np.memmap(
+            file_path,
+            dtype=dtype,
+            mode='r+',
+            offset=self._base * dtype.itemsize,
+            shape=(capacity,)
+        )
+
+        # New rows in float columns start out as NaN.
+        if rows < self._base + capacity and np.issubdtype(dtype, np.floating):
+            values[max(rows - self._base, 0):] = np.nan
+
+        return values
+
+    def _discard(self, column_name: str) -> None:
+        """Deletes the file of a dropped column."""
+
+        self._column_path(column_name=column_name).unlink()
+
+    def _resize(self, column_name: str, values: np.ndarray, capacity: int) -> np.ndarray:
+        """Grows the column file in place and maps it again from the start of the view."""
+
+        self._hidden = 0
+
+        return self._allocate(column_name=column_name, dtype=values.dtype, capacity=capacity)
+
+    def _move_base(self, base: int) -> None:
+        """Maps the files again, starting at row `base`."""
+
+        # The old mappings share their pages with the new ones, so nothing is synced first.
+        self._size += self._base - base
+        self._capacity += self._base - base
+        self._base = base
+        self._hidden = 0
+
+        self._index = self._allocate(column_name='datetime', dtype=self._index.dtype, capacity=self._capacity)
+
+        for column_name, values in self._columns.items():
+            self._columns[column_name] = self._allocate(
+                column_name=column_name,
+                dtype=values.dtype,
+                capacity=self._capacity
+            )
+
+    def drop_front(self, rows: int) -> tuple:
+        """Drops the oldest rows from the mapped view, the files keep them.
+        Arguments:
+        ----
+        rows {int} -- The number of rows to drop.
+        Returns:
+        ----
+        {tuple} -- A copy of the dropped timestamps and a dictionary of the dropped values.
+        """
+
+        rows = min(rows, self._size)
+
+        # Keep at least one row of room in the view.
+        self.reserve(rows=1)
+
+        dropped_index = self._index[:rows].copy()
+        dropped_values = {
+            column_name: values[:rows].copy() for column_name, values in self._columns.items()
+        }
+
+        # Slide the view along the mapping, the files are only mapped again once in a while.
+        self._index = self._index[rows:]
+
+        for column_name, values in self._columns.items():
+            self._columns[column_name] = values[rows:]
+
+        self._size -= rows
+        self._capacity -= rows
+        self._base += rows
+        self._hidden += rows
+
+        if self._hidden >= self._capacity:
+            self._move_base(base=self._base)
+
+        return dropped_index, dropped_values
+
+    def astype(self, column_name: str, dtype: np.dtype) -> None:
+        """Changes the dtype of a column, including the rows dropped from the view."""
+
+        base = self._base
+
+        self._move_base(base=0)
+        super().astype(column_name=column_name, dtype=dtype)
+        self._move_base(base=base)
+
+    def _read_header(self) -> Dict:
+
+        if not self.header_path.exists():
+            return {}
+
+        with open(self.header_path, 'r') as header_file:
+            return json.load(header_file)
+
+    def flush(self) -> None:
+        """Flushes the mapped columns to disk and then writes the header.
+        Overview:
+        ----
+        The header is written last and swapped in atomically, so a reader never
+        sees a size that covers rows which haven't reached the disk yet.
+        """
+
+        self._index.flush()
+
+        for values in self._columns.values():
+            values.flush()
+
+        header = {
+            'format': 1,
+            'symbol': self._symbol,
+            'size': self._base + self._size,
+            'capacity': self._base + self._capacity,
+            'index': {
+                'name': 'datetime',
+                'dtype': self._index.dtype.name,
+                'unit': 'ns'
+            },
+            'columns': {
+                column_name: values.dtype.name for column_name, values in self._columns.items()
+            }
+        }
+
+        temp_path = self._folder.joinpath('header.json.tmp')
+
+        with open(temp_path, 'w') as header_file:
+            json.dump(obj=header, fp=header_file, indent=4)
+
+        os.replace(temp_path, self.header_path)
+
+
+class BarArchive():
+
+    """
+    Represents an on-disk, append-only store of bars with one folder per
+    symbol. Opening the archive maps the column files instead of reading
+    them, so a warm start costs the same no matter how much history there is.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initalizes the archive.
+        Arguments:
+        ----
+        path {str} -- The folder the archive lives in, created if it doesn't exist.
+        Usage:
+        ----
+            >>> archive = BarArchive(path='data/bars')
+            >>> stock_frame = StockFrame(data=[], archive=archive)
+        """
+
+        self._path = pathlib.Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    @property
+    def symbols(self) -> List[str]:
+        """Returns the symbols stored in the archive."""
+
+        symbols = []
+
+        for header_path in sorted(self._path.glob('*/header.json')):
+            with open(header_path, 'r') as header_file:
+                symbols.append(json.load(header_file)['symbol'])
+
+        return symbols
+
+    def symbol_folder(self, symbol: str) -> pathlib.Path:
+        """Returns the folder holding a symbol's files."""
+
+        return self._path.joinpath(quote(symbol, safe=''))
+
+    def open_buffer(self, symbol: str, columns: List[str], capacity: int = 256,
+                    dtypes: Dict[str, np.dtype] = None) -> MappedSymbolBuffer:
+        """Opens, or creates, the buffer for a single symbol.
+        Arguments:
+        ----
+        symbol {str} -- The symbol to open.
+        columns {List[str]} -- The columns the buffer should hold.
+        Keyword Arguments:
+        ----
+        capacity {int} -- The number of rows to preallocate for a new buffer. (default: {256})
+        dtypes {Dict[str, np.dtype]} -- The dtypes of new columns. (default: {None})
+        Returns:
+        ----
+        {MappedSymbolBuffer} -- The memory-mapped buffer.
+        """
+
+        return MappedSymbolBuffer(
+            folder=self.symbol_folder(symbol=symbol),
+            symbol=symbol,
+            columns=columns,
+            capacity=capacity,
+            dtypes=dtypes
+        )
+
+    def open_buffers(self) -> Dict[str, MappedSymbolBuffer]:
+        """Opens the buffers of every symbol in the archive."""
+
+        return {
+            symbol: self.open_buffer(symbol=symbol, columns=[]) for symbol in self.symbols
+        }
@@ -0,0 +1,293 @@
+import os
+import json
+import pathlib
+import threading
+
+import numpy as np
+
+from datetime import datetime as dt
+from typing import List
+from typing import Dict
+from typing import Tuple
+from typing import Callable
+
+from Bot.bar_archive import BarArchive
+from Bot.bar_archive import MappedSymbolBuffer
+from Bot.resampler import BAR_TYPE_NANOSECONDS
+
+
+# The columns of a cached candle, besides its timestamp.
+CANDLE_COLUMNS = ['open', 'close', 'high', 'low', 'volume']
+
+# The length of a bar for each frequency type the price history API knows, in milliseconds.
+FREQUENCY_MILLISECONDS = {
+    'minute': BAR_TYPE_NANOSECONDS['minute'] // 1_000_000,
+    'daily': BAR_TYPE_NANOSECONDS['daily'] // 1_000_000,
+    'weekly': 7 * BAR_TYPE_NANOSECONDS['daily'] // 1_000_000,
+    'monthly': 31 * BAR_TYPE_NANOSECONDS['daily'] // 1_000_000
+}
+
+
+class CandleCache():
+
+    """
+    Represents an on-disk cache of price history candles, with one BarArchive
+    per frequency and one set of column files per symbol. Next to the candles,
+    each symbol keeps the time ranges that were already requested, so a request
+    only has to fetch the parts of its range that were never covered.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initalizes the cache.
+        Arguments:
+        ----
+        path {str} -- The folder the cache lives in, created if it doesn't exist.
+        Usage:
+        ----
+            >>> candle_cache = CandleCache(path='data/candles')
+            >>> trading_robot.set_candle_cache(candle_cache=candle_cache)
+        """
+
+        self._path = pathlib.Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+
+        self._archives: Dict[str, BarArchive] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    def _archive(self, frequency_type: str, frequency: int) -> BarArchive:
+        """Grabs the archive of a frequency, creating it the first time."""
+
+        key = '{frequency_type}_{frequency}'.format(frequency_type=frequency_type, frequency=frequency)
+
+        with self._lock:
+            if key not in self._archives:
+                self._archives[key] = BarArchive(path=self._path.joinpath(key))
+
+        return self._archives[key]
+
+    def _coverage_path(self, archive: BarArchive, symbol: str) -> pathlib.Path:
+        return archive.symbol_folder(symbol=symbol).joinpath('coverage.json')
+
+    def coverage(self, symbol: str, frequency_type: str, frequency: int) -> List[Tuple[int, int]]:
+        """Returns the time ranges already fetched for a symbol, in milliseconds since epoch.
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        frequency_type {str} -- The frequency type, for example `minute` or `daily`.
+        frequency {int} -- The number of `frequency_type` units in a bar.
+        Returns:
+        ----
+        {List[Tuple[int, int]]} -- The sorted, non-overlapping ranges, both ends included.
+        """
+
+        coverage_path = self._coverage_path(
+            archive=self._archive(frequency_type=frequency_type, frequency=frequency),
+            symbol=symbol
+        )
+
+        if not coverage_path.exists():
+            return []
+
+        with open(coverage_path, 'r') as coverage_file:
+            return [tuple(time_range) for time_range in json.load(coverage_file)['ranges']]
+
+    def missing(self, symbol: str, frequency_type: str, frequency: int, start: int, end: int) -> List[Tuple[int, int]]:
+        """Returns the parts of a time range that aren't covered yet.
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        frequency_type {str} -- The frequency type, for example `minute` or `daily`.
+        frequency {int} -- The number of `frequency_type` units in a bar.
+        start {int} -- The start of the range in milliseconds since epoch.
+        end {int} -- The end of the range in milliseconds since epoch.
+        Returns:
+        ----
+        {List[Tuple[int, int]]} -- The ranges to fetch, both ends included.
+        """
+
+        missing_ranges = []
+        position = start
+
+        for covered_start, covered_end in self.coverage(symbol=symbol, frequency_type=frequency_type, frequency=frequency):
+
+            if covered_end < position:
+                continue
+
+            if covered_start > end:
+                break
+
+            if covered_start <= start and covered_end >= end:
+                return []
+
+            if covered_start > position:
+                missing_ranges.append((position, covered_start))
+
+            position = max(position, covered_end)
+
+        if position < end or start == end:
+            missing_ranges.append((position, end))
+
+        return missing_ranges
+
+    def store(self, symbol: str, frequency_type: str, frequency: int, start: int, end: int,
+              candles: List[dict], fetched_at: int = None) -> None:
+        """Merges fetched candles into the cache and marks their range as covered.
+        Overview:
+        ----
+        Candles replace cached candles with the same timestamp. The last bar before
+        the fetch time may still be open, so the range is only marked as covered up
+        to one bar before it, and that bar is fetched again next time.
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        frequency_type {str} -- The frequency type, for example `minute` or `daily`.
+        frequency {int} -- The number of `frequency_type` units in a bar.
+        start {int} -- The start of the fetched range in milliseconds since epoch.
+        end {int} -- The end of the fetched range in milliseconds since epoch.
+        candles {List[dict]} -- The candles returned by the price history API.
+        Keyword Arguments:
+        ----
+        fetched_at {int} -- When the candles were fetched, in milliseconds since epoch. (default: {None}, now)
+        """
+
+        archive = self._archive(frequency_type=frequency_type, frequency=frequency)
+        buffer = self._buffer(archive=archive, symbol=symbol)
+
+        if candles:
+
+            timestamps = np.array([candle['datetime'] for candle in candles], dtype=np.int64) * 1_000_000
+            timestamps, rows = np.unique(timestamps, return_index=True)
+
+            buffer.merge(
+                timestamps=timestamps,
+                values={
+                    column: np.array([candle[column] for candle in candles])[rows]
+                    for column in CANDLE_COLUMNS
+                }
+            )
+            buffer.flush()
+
+        if fetched_at is None:
+            fetched_at = int(dt.now().timestamp() * 1000)
+
+        end = min(end, fetched_at - frequency * FREQUENCY_MILLISECONDS[frequency_type])
+
+        if end < start:
+            return
+
+        ranges = self.coverage(symbol=symbol, frequency_type=frequency_type, frequency=frequency)
+        ranges.append((start, end))
+        ranges.sort()
+
+        # Join the ranges that overlap or touch.
+        merged = [list(ranges[0])]
+        for range_start, range_end in ranges[1:]:
+            if range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+
+        coverage_path = self._coverage_path(archive=archive, symbol=symbol)
+        temp_path = coverage_path.with_suffix('.json.tmp')
+
+        with open(temp_path, 'w') as coverage_file:
+            json.dump(obj={'symbol': symbol, 'ranges': merged}, fp=coverage_file, indent=4)
+
+        os.replace(temp_path, coverage_path)
+
+    def candles(self, symbol: str, frequency_type: str, frequency: int, start: int, end: int) -> List[dict]:
+        """Returns the cached candles of a symbol between two times.
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        frequency_type {str} -- The frequency type, for example `minute` or `daily`.
+        frequency {int} -- The number of `frequency_type` units in a bar.
+        start {int} -- The first time to include, in milliseconds since epoch.
+        end {int} -- The last time to include, in milliseconds since epoch.
+        Returns:
+        ----
+        {List[dict]} -- The candles, shaped like the ones the price history API returns.
+        """
+
+        buffer = self._buffer(
+            archive=self._archive(frequency_type=frequency_type, frequency=frequency),
+            symbol=symbol
+        )
+
+        first = int(np.searchsorted(buffer.index, start * 1_000_000, side='left'))
+        last = int(np.searchsorted(buffer.index, end * 1_000_000, side='right'))
+
+        columns = {
+            column: buffer.column(column)[first:last].tolist() for column in CANDLE_COLUMNS
+        }
+        columns['datetime'] = (buffer.index[first:last] // 1_000_000).tolist()
+
+        return [
+            dict(zip(columns, values)) for values in zip(*columns.values())
+        ]
+
+    def grab(self, symbol: str, frequency_type: str, frequency: int, start: int, end: int,
+             fetch: Callable[[int, int], List[dict]]) -> List[dict]:
+        """Returns the candles between two times, fetching only the ranges that aren't cached.
+        Arguments:
+        ----
+        symbol {str} -- The symbol.
+        frequency_type {str} -- The frequency type, for example `minute` or `daily`.
+        frequency {int} -- The number of `frequency_type` units in a bar.
+        start {int} -- The first time to include, in milliseconds since epoch.
+        end {int} -- The last time to include, in milliseconds since epoch.
+        fetch {Callable[[int, int], List[dict]]} -- Fetches the candles of a range from the API.
+        Returns:
+        ----
+        {List[dict]} -- The candles, shaped like the ones the price history API returns.
+        Usage:
+        ----
+            >>> candles = candle_cache.grab(
+                    symbol='MSFT',
+                    frequency_type='minute',
+                    frequency=1,
+                    start=start,
+                    end=end,
+                    fetch=lambda start, end: td_client.get_price_history(...)['candles']
+                )
+        """
+
+        for range_start, range_end in self.missing(
+            symbol=symbol,
+            frequency_type=frequency_type,
+            frequency=frequency,
+            start=start,
+            end=end
+        ):
+            fetched_at = int(dt.now().timestamp() * 1000)
+
+            self.store(
+                symbol=symbol,
+                frequency_type=frequency_type,
+                frequency=frequency,
+                start=range_start,
+                end=range_end,
+                candles=fetch(range_start, range_end),
+                fetched_at=fetched_at
+            )
+
+        return self.candles(
+            symbol=symbol,
+            frequency_type=frequency_type,
+            frequency=frequency,
+            start=start,
+            end=end
+        )
+
+    def _buffer(self, archive: BarArchive, symbol: str) -> MappedSymbolBuffer:
+        """Opens the buffer of a symbol with the candle columns."""
+
+        return archive.open_buffer(
+            symbol=symbol,
+            columns=CANDLE_COLUMNS,
+            dtypes={'volume': np.int64}
+        )
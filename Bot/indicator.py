@@ -1,11 +1,44 @@
+import operator
+
 import numpy as np
 import pandas as pd
 
+from contextlib import contextmanager
 from typing import Any
+from typing import List
 from typing import Dict
+from typing import Tuple
 from typing import Union
 
+from Bot import kernels
 from Bot.stock_frame import StockFrame
+from Bot.indicator_graph import IndicatorGraph
+from Bot.parallel import MIN_PARALLEL_ROWS
+from Bot.parallel import ParallelIndicators
+from Bot.signal_engine import SignalEngine
+from Bot.indicator_stream import AtrStream
+from Bot.indicator_stream import BollingerStream
+from Bot.indicator_stream import EmaStream
+from Bot.indicator_stream import IndicatorStream
+from Bot.indicator_stream import MacdStream
+from Bot.indicator_stream import ObvStream
+from Bot.indicator_stream import RsiStream
+from Bot.indicator_stream import SmaStream
+from Bot.indicator_stream import StochasticStream
+from Bot.indicator_stream import VWAP_SESSION_START
+from Bot.indicator_stream import VwapStream
+from Bot.indicator_stream import bollinger_bands
+from Bot.indicator_stream import carried_value
+from Bot.indicator_stream import relative_strength_index
+from Bot.indicator_stream import session_ids
+from Bot.indicator_stream import signed_volume
+from Bot.indicator_stream import stochastic_oscillator
+from Bot.indicator_stream import true_range
+from Bot.indicator_stream import typical_price
+
+
+# Exponential indicators are treated as converged after this many periods.
+EWM_WARMUP_PERIODS = 10
 
 
 class Indicators():
@@ -36,16 +69,33 @@ class Indicators():
         """
 
         self._stock_frame: StockFrame = price_data_frame
-        self._price_groups = price_data_frame.symbol_groups
         self._current_indicators = {}
         self._indicator_signals = {}
-        self._frame = self._stock_frame.frame
+
+        # The indicators and the intermediates they share.
+        self._graph = IndicatorGraph()
+        self._graph.add_node(
+            name='offsets',
+            inputs=[],
+            function=lambda: self._stock_frame.symbol_offsets
+        )
+
+        # The process pool used for full-history computations, if any.
+        self._parallel: ParallelIndicators = None
+
+        # The indicators waiting for the end of a batch, if any.
+        self._deferred: List[str] = None
+
+        # Lazy indicator -> the bars version its columns were computed at, `None` if never.
+        self._lazy: Dict[str, int] = {}
+        self._registering_lazy = False
 
         self._indicators_comp_key = []
         self._indicators_key = []
 
-        if self.is_multi_index:
-            True
+        # The signals compiled into one evaluation, rebuilt when a signal changes.
+        self._signal_engine: SignalEngine = None
+        self._signal_logic = {'buy_logic': 'and', 'sell_logic': 'and'}
 
     def get_indicator_signal(self, indicator: str = None) -> Dict:
         """Return the raw Pandas Dataframe Object.
@@ -105,6 +155,8 @@ class Indicators():
         self._indicator_signals[indicator]['buy_operator_max'] = condition_buy_max
         self._indicator_signals[indicator]['sell_operator_max'] = condition_sell_max
 
+        self._signal_engine = None
+
     def set_indicator_signal_compare(self, indicator_1: str, indicator_2: str, condition_buy: Any, condition_sell: Any) -> None:
         """Used to set an indicator where one indicator is compared to another indicator.
         Overview:
@@ -146,25 +198,122 @@ class Indicators():
         indicator_dict['buy_operator'] = condition_buy
         indicator_dict['sell_operator'] = condition_sell
 
+        self._signal_engine = None
+
+    def set_indicator_signal_crossover(self, indicator_1: str, indicator_2: str, buy: str = 'crossover',
+                                       sell: str = 'crossunder') -> None:
+        """Used to set a signal that fires once, on the bar where one indicator crosses another.
+        Overview:
+        ----
+        Unlike `set_indicator_signal_compare`, which holds on every bar where the
+        comparison is true, a crossover only holds on the bar where it becomes true.
+        For example, the 50 bar SMA crossing above the 200 bar SMA buys once, instead
+        of on every bar it stays above. The previous bar of each symbol is read from
+        the StockFrame, `StockFrame.previous_rows`, so a cross can fire on the first check.
+        Arguments:
+        ----
+        indicator_1 {str} -- The first indicator key, for example `sma_50`.
+        indicator_2 {str} -- The indicator that `indicator_1` crosses, for example `sma_200`.
+        Keyword Arguments:
+        ----
+        buy {str} -- The cross that buys, `crossover` when `indicator_1` crosses above
+            `indicator_2`, `crossunder` when it crosses below, or `None`. (default: {'crossover'})
+        sell {str} -- The cross that sells, `crossover`, `crossunder` or `None`. (default: {'crossunder'})
+        Usage:
+        ----
+            >>> indicator_client.set_indicator_signal_crossover(
+                    indicator_1='sma_50',
+                    indicator_2='sma_200'
+                )
+        """
+
+        crosses = {'crossover': operator.gt, 'crossunder': operator.lt, None: None}
+
+        for cross in (buy, sell):
+            if cross not in crosses:
+                raise ValueError("The cross must be `crossover`, `crossunder` or `None`, not {cross}.".format(cross=cross))
+
+        # Define the key.
+        key = "{ind_1}_cross_{ind_2}".format(
+            ind_1=indicator_1,
+            ind_2=indicator_2
+        )
+
+        # Add the key if it doesn't exist.
+        if key not in self._indicator_signals:
+            self._indicator_signals[key] = {}
+            self._indicators_comp_key.append(key)
+
+        # Grab the dictionary.
+        indicator_dict = self._indicator_signals[key]
+
+        # Add the signals.
+        indicator_dict['type'] = 'crossover'
+        indicator_dict['indicator_1'] = indicator_1
+        indicator_dict['indicator_2'] = indicator_2
+        indicator_dict['buy_operator'] = crosses[buy]
+        indicator_dict['sell_operator'] = crosses[sell]
+
+        self._signal_engine = None
+
+    def set_signal_logic(self, buy_logic: str = 'and', sell_logic: str = 'and') -> None:
+        """Sets how the signals are combined when there is more than one.
+        Overview:
+        ----
+        With `and`, a symbol is only bought or sold when every signal of that side
+        holds. With `or`, any one of them is enough. A signal with a max bound
+        always needs both its threshold and its bound to hold.
+        Keyword Arguments:
+        ----
+        buy_logic {str} -- How the buy signals are combined, `and` or `or`. (default: {'and'})
+        sell_logic {str} -- How the sell signals are combined, `and` or `or`. (default: {'and'})
+        Usage:
+        ----
+            >>> indicator_client.set_signal_logic(buy_logic='and', sell_logic='or')
+        """
+
+        self._signal_logic = {'buy_logic': buy_logic, 'sell_logic': sell_logic}
+        self._signal_engine = None
+
     @property
     def price_data_frame(self) -> pd.DataFrame:
         """Return the raw Pandas Dataframe Object.
+        Overview:
+        ----
+        Lazy indicators that are out of date are computed first.
         Returns:
         ----
         {pd.DataFrame} -- A multi-index data frame.
         """
 
-        return self._frame
+        self._materialize(indicators=list(self._lazy))
+
+        return self._stock_frame.frame
 
     @price_data_frame.setter
-    def price_data_frame(self, price_data_frame: pd.DataFrame) -> None:
-        """Sets the price data frame.
+    def price_data_frame(self, price_data_frame: StockFrame) -> None:
+        """Sets the StockFrame the indicators are computed on.
+        Overview:
+        ----
+        The warm-up of every indicator carries over to the new StockFrame, and the
+        indicators are recomputed over its whole history.
         Arguments:
         ----
-        price_data_frame {pd.DataFrame} -- A multi-index data frame.
+        price_data_frame {StockFrame} -- The StockFrame to compute the indicators on.
         """
 
-        self._frame = price_data_frame
+        session_warmup = self._stock_frame.session_warmup
+
+        for name, bars in self._stock_frame.warmup.items():
+            price_data_frame.set_warmup(name=name, bars=bars, session_start=session_warmup.get(name))
+
+        self._stock_frame = price_data_frame
+
+        for indicator in self._current_indicators:
+            if self.stream(indicator=indicator):
+                self.stream(indicator=indicator).reset()
+
+        self.refresh(incremental=False)
 
     def rsi(self, period: int, method: str = 'wilders', column_name: str = 'rsi') -> pd.DataFrame:
         """Calculates the Relative Strength Index (RSI).
@@ -197,50 +346,30 @@ class Indicators():
         self._current_indicators[column_name] = {}
         self._current_indicators[column_name]['args'] = locals_data
         self._current_indicators[column_name]['func'] = self.rsi
+        self._stock_frame.set_warmup(name=column_name, bars=EWM_WARMUP_PERIODS * period)
 
-        # First calculate the Change in Price.
-        if 'change_in_price' not in self._frame.columns:
-            self.change_in_price()
-
-        # Define the up days.
-        self._frame['up_day'] = self._price_groups['change_in_price'].transform(
-            lambda x: np.where(x >= 0, x, 0)
-        )
+        # Define the up days and the down days from the Change in Price.
+        up_day, down_day = self._up_and_down_days(column_name='close')
 
-        # Define the down days.
-        self._frame['down_day'] = self._price_groups['change_in_price'].transform(
-            lambda x: np.where(x < 0, x.abs(), 0)
-        )
-
-        # Calculate the EWMA for the Up days.
-        self._frame['ewma_up'] = self._price_groups['up_day'].transform(
-            lambda x: x.ewm(span=period).mean()
-        )
-
-        # Calculate the EWMA for the Down days.
-        self._frame['ewma_down'] = self._price_groups['down_day'].transform(
-            lambda x: x.ewm(span=period).mean()
-        )
-
-        # Calculate the Relative Strength
-        relative_strength = self._frame['ewma_up'] / self._frame['ewma_down']
-
-        # Calculate the Relative Strength Index
-        relative_strength_index = 100.0 - (100.0 / (1.0 + relative_strength))
+        # Calculate Wilder's average for the Up and Down days.
+        ewma_up = self._wilders_average(node_name=up_day, period=period)
+        ewma_down = self._wilders_average(node_name=down_day, period=period)
 
         # Add the info to the data frame.
-        self._frame['rsi'] = np.where(
-            relative_strength_index == 0, 100, 100 - (100 / (1 + relative_strength_index)))
-
-        # Clean up before sending back.
-        self._frame.drop(
-            labels=['ewma_up', 'ewma_down', 'down_day',
-                    'up_day', 'change_in_price'],
-            axis=1,
-            inplace=True
+        self._graph.add_node(
+            name=column_name,
+            inputs=[ewma_up, ewma_down],
+            function=lambda average_up, average_down: relative_strength_index(
+                average_up=average_up,
+                average_down=average_down
+            ),
+            output=True
         )
 
-        return self._frame
+        self._current_indicators[column_name]['stream'] = RsiStream(period=period, column_name=column_name)
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
 
     def sma(self, period: int, column_name: str = 'sma') -> pd.DataFrame:
         # Calculates the Simple Moving Average (SMA).
@@ -268,13 +397,24 @@ class Indicators():
         self._current_indicators[column_name] = {}
         self._current_indicators[column_name]['args'] = locals_data
         self._current_indicators[column_name]['func'] = self.sma
+        self._stock_frame.set_warmup(name=column_name, bars=period)
 
-        # Add the SMA
-        self._frame[column_name] = self._price_groups['close'].transform(
-            lambda x: x.rolling(window=period).mean()
+        # Add the SMA, every window over `close` reads the same running sums.
+        self._graph.add_node(
+            name=column_name,
+            inputs=[self._prefix_sums(column_name='close'), 'offsets'],
+            function=lambda sums, offsets: kernels.window_sum(
+                sums=sums,
+                offsets=offsets,
+                window=period
+            ) / period,
+            output=True
         )
 
-        return self._frame
+        self._current_indicators[column_name]['stream'] = SmaStream(period=period, column_name=column_name)
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
 
     def ema(self, period: int, alpha: float = 0.0, column_name='ema') -> pd.DataFrame:
 
@@ -293,44 +433,908 @@ class Indicators():
         self._current_indicators[column_name] = {}
         self._current_indicators[column_name]['args'] = locals_data
         self._current_indicators[column_name]['func'] = self.ema
+        self._stock_frame.set_warmup(name=column_name, bars=EWM_WARMUP_PERIODS * period)
 
         # Add the EMA
-        self._frame[column_name] = self._price_groups['close'].transform(
-            lambda x: x.ewm(span=period).mean()
+        self._graph.add_node(
+            name=column_name,
+            inputs=[self._ewm(node_name=self._source(column_name='close'), span=period)],
+            function=lambda ema: ema,
+            output=True
+        )
+
+        self._current_indicators[column_name]['stream'] = EmaStream(period=period, column_name=column_name)
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def macd(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9,
+             column_name: str = 'macd') -> pd.DataFrame:
+        """Calculates the Moving Average Convergence Divergence (MACD).
+        Overview:
+        ----
+        Adds three columns, the MACD line in `column_name`, its signal line in
+        `column_name_signal` and the difference of the two in `column_name_histogram`.
+        Keyword Arguments:
+        ----
+        fast_period {int} -- The span of the fast EMA. (default: {12})
+        slow_period {int} -- The span of the slow EMA. (default: {26})
+        signal_period {int} -- The span of the EMA of the MACD line. (default: {9})
+        column_name {str} -- The name of the MACD column. (default: {'macd'})
+        Returns:
+        ----
+        {pd.DataFrame} -- A Pandas data frame with the MACD indicator included.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.macd(fast_period=12, slow_period=26, signal_period=9)
+        """
+
+        locals_data = locals()
+        del locals_data['self']
+
+        indicator_stream = MacdStream(
+            fast_period=fast_period,
+            slow_period=slow_period,
+            signal_period=signal_period,
+            column_name=column_name
+        )
+        macd_column, signal_column, histogram_column = indicator_stream.columns
+
+        self._current_indicators[column_name] = {}
+        self._current_indicators[column_name]['args'] = locals_data
+        self._current_indicators[column_name]['func'] = self.macd
+        self._current_indicators[column_name]['columns'] = indicator_stream.columns
+        self._current_indicators[column_name]['stream'] = indicator_stream
+        self._stock_frame.set_warmup(name=column_name, bars=EWM_WARMUP_PERIODS * (slow_period + signal_period))
+
+        # The MACD line is the fast EMA minus the slow EMA.
+        self._graph.add_node(
+            name=macd_column,
+            inputs=[self._ewm(node_name=self._source(column_name='close'), span=fast_period), self._ewm(node_name=self._source(column_name='close'), span=slow_period)],
+            function=lambda fast, slow: fast - slow,
+            output=True
+        )
+
+        # The signal line is an EMA of the MACD line.
+        self._graph.add_node(
+            name=signal_column,
+            inputs=[self._ewm(node_name=macd_column, span=signal_period)],
+            function=lambda signal: signal,
+            output=True
+        )
+
+        self._graph.add_node(
+            name=histogram_column,
+            inputs=[macd_column, signal_column],
+            function=lambda macd, signal: macd - signal,
+            output=True
+        )
+
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def bollinger_bands(self, period: int = 20, deviations: float = 2.0, column_name: str = 'bollinger') -> pd.DataFrame:
+        """Calculates the Bollinger Bands.
+        Overview:
+        ----
+        Adds the columns `column_name_upper`, `column_name_middle` and `column_name_lower`.
+        The middle band is the SMA of the close and the outer bands are `deviations`
+        standard deviations away from it.
+        Keyword Arguments:
+        ----
+        period {int} -- The number of periods in the moving window. (default: {20})
+        deviations {float} -- The width of the bands in standard deviations. (default: {2.0})
+        column_name {str} -- The prefix of the band columns. (default: {'bollinger'})
+        Returns:
+        ----
+        {pd.DataFrame} -- A Pandas data frame with the Bollinger Bands included.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.bollinger_bands(period=20, deviations=2.0)
+        """
+
+        locals_data = locals()
+        del locals_data['self']
+
+        indicator_stream = BollingerStream(period=period, deviations=deviations, column_name=column_name)
+        upper_column, middle_column, lower_column = indicator_stream.columns
+
+        self._current_indicators[column_name] = {}
+        self._current_indicators[column_name]['args'] = locals_data
+        self._current_indicators[column_name]['func'] = self.bollinger_bands
+        self._current_indicators[column_name]['columns'] = indicator_stream.columns
+        self._current_indicators[column_name]['stream'] = indicator_stream
+        self._stock_frame.set_warmup(name=column_name, bars=period)
+
+        sums = self._prefix_sums(column_name='close')
+
+        bands = self._graph.add_node(
+            name='bollinger_bands_close_{period}_{deviations}'.format(period=period, deviations=deviations),
+            inputs=[sums, self._prefix_squares(column_name='close'), 'offsets'],
+            function=lambda sums, squares, offsets: bollinger_bands(
+                middle=kernels.window_sum(sums=sums, offsets=offsets, window=period) / period,
+                deviation=kernels.window_std(sums=sums, squares=squares, offsets=offsets, window=period),
+                deviations=deviations
+            )
+        )
+
+        for position, band_column in enumerate(indicator_stream.columns):
+            self._graph.add_node(
+                name=band_column,
+                inputs=[bands],
+                function=lambda bands, position=position: bands[position],
+                output=True
+            )
+
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def average_true_range(self, period: int = 14, column_name: str = 'atr') -> pd.DataFrame:
+        """Calculates the Average True Range (ATR), Wilder's average of the true range.
+        Keyword Arguments:
+        ----
+        period {int} -- The number of periods to use when calculating the ATR. (default: {14})
+        column_name {str} -- The name of the column. (default: {'atr'})
+        Returns:
+        ----
+        {pd.DataFrame} -- A Pandas data frame with the ATR indicator included.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.average_true_range(period=14)
+        """
+
+        locals_data = locals()
+        del locals_data['self']
+
+        self._current_indicators[column_name] = {}
+        self._current_indicators[column_name]['args'] = locals_data
+        self._current_indicators[column_name]['func'] = self.average_true_range
+        self._current_indicators[column_name]['stream'] = AtrStream(period=period, column_name=column_name)
+        self._stock_frame.set_warmup(name=column_name, bars=EWM_WARMUP_PERIODS * period)
+
+        self._graph.add_node(
+            name=column_name,
+            inputs=[self._wilders_average(node_name=self._true_range(), period=period)],
+            function=lambda average: average,
+            output=True
+        )
+
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def vwap(self, column_name: str = 'vwap') -> pd.DataFrame:
+        """Calculates the Volume Weighted Average Price (VWAP) of each session.
+        Overview:
+        ----
+        The typical price, the average of the high, low and close, is weighted by
+        volume from the first bar of the session on. Sessions start at 06:00 UTC.
+        Keyword Arguments:
+        ----
+        column_name {str} -- The name of the column. (default: {'vwap'})
+        Returns:
+        ----
+        {pd.DataFrame} -- A Pandas data frame with the VWAP indicator included.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.vwap()
+        """
+
+        locals_data = locals()
+        del locals_data['self']
+
+        self._current_indicators[column_name] = {}
+        self._current_indicators[column_name]['args'] = locals_data
+        self._current_indicators[column_name]['func'] = self.vwap
+        self._current_indicators[column_name]['stream'] = VwapStream(column_name=column_name)
+        self._stock_frame.set_warmup(name=column_name, bars=0, session_start=VWAP_SESSION_START)
+
+        price = self._graph.add_node(
+            name='typical_price',
+            inputs=[self._source(column_name='high'), self._source(column_name='low'), self._source(column_name='close')],
+            function=lambda high, low, close: typical_price(high=high, low=low, close=close)
+        )
+
+        # A new sum starts with each symbol and each session.
+        resets = self._graph.add_node(
+            name='session_resets',
+            inputs=[self._timestamps(), self._segment_resets()],
+            function=lambda timestamps, segment_resets: segment_resets | np.concatenate(
+                ([True], np.diff(session_ids(timestamps=timestamps)) != 0)
+            )
+        )
+
+        self._graph.add_node(
+            name=column_name,
+            inputs=[price, self._source(column_name='volume'), resets],
+            function=lambda price, volume, resets: _ratio(
+                numerator=kernels.reset_cumsum(values=price * volume, resets=resets),
+                denominator=kernels.reset_cumsum(values=volume, resets=resets)
+            ),
+            output=True
+        )
+
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def stochastic_oscillator(self, k_period: int = 14, d_period: int = 3, column_name: str = 'stochastic') -> pd.DataFrame:
+        """Calculates the Stochastic Oscillator.
+        Overview:
+        ----
+        Adds %K, where the close sits in the high-low range of the last `k_period`
+        bars, in `column_name` and its `d_period` SMA, %D, in `column_name_signal`.
+        Keyword Arguments:
+        ----
+        k_period {int} -- The number of periods in the high-low range. (default: {14})
+        d_period {int} -- The number of periods in the average of %K. (default: {3})
+        column_name {str} -- The name of the %K column. (default: {'stochastic'})
+        Returns:
+        ----
+        {pd.DataFrame} -- A Pandas data frame with the Stochastic Oscillator included.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.stochastic_oscillator(k_period=14, d_period=3)
+        """
+
+        locals_data = locals()
+        del locals_data['self']
+
+        indicator_stream = StochasticStream(k_period=k_period, d_period=d_period, column_name=column_name)
+        k_column, d_column = indicator_stream.columns
+
+        self._current_indicators[column_name] = {}
+        self._current_indicators[column_name]['args'] = locals_data
+        self._current_indicators[column_name]['func'] = self.stochastic_oscillator
+        self._current_indicators[column_name]['columns'] = indicator_stream.columns
+        self._current_indicators[column_name]['stream'] = indicator_stream
+        self._stock_frame.set_warmup(name=column_name, bars=k_period + d_period)
+
+        lowest_low = self._graph.add_node(
+            name='rolling_min_low_{period}'.format(period=k_period),
+            inputs=[self._source(column_name='low'), 'offsets'],
+            function=lambda low, offsets: kernels.rolling_min(values=low, offsets=offsets, window=k_period)
         )
 
-        return self._frame
+        highest_high = self._graph.add_node(
+            name='rolling_max_high_{period}'.format(period=k_period),
+            inputs=[self._source(column_name='high'), 'offsets'],
+            function=lambda high, offsets: kernels.rolling_max(values=high, offsets=offsets, window=k_period)
+        )
 
-    def refresh(self):
-        """Updates the Indicator columns after adding the new rows."""
+        self._graph.add_node(
+            name=k_column,
+            inputs=[self._source(column_name='close'), lowest_low, highest_high],
+            function=lambda close, lowest_low, highest_high: stochastic_oscillator(
+                close=close,
+                lowest_low=lowest_low,
+                highest_high=highest_high
+            ),
+            output=True
+        )
 
-        # First update the groups since, we have new rows.
-        self._price_groups = self._stock_frame.symbol_groups
+        self._graph.add_node(
+            name=d_column,
+            inputs=[k_column, 'offsets'],
+            function=lambda percent_k, offsets: kernels.rolling_mean(values=percent_k, offsets=offsets, window=d_period),
+            output=True
+        )
+
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def on_balance_volume(self, column_name: str = 'obv') -> pd.DataFrame:
+        """Calculates the On Balance Volume (OBV), the running sum of volume signed by the direction of the close.
+        Overview:
+        ----
+        The sum carries on from the OBV already on the first bar of each symbol, so
+        bars dropped by the retention policy still count after a recompute.
+        Keyword Arguments:
+        ----
+        column_name {str} -- The name of the column. (default: {'obv'})
+        Returns:
+        ----
+        {pd.DataFrame} -- A Pandas data frame with the OBV indicator included.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.on_balance_volume()
+        """
+
+        locals_data = locals()
+        del locals_data['self']
+
+        self._current_indicators[column_name] = {}
+        self._current_indicators[column_name]['args'] = locals_data
+        self._current_indicators[column_name]['func'] = self.on_balance_volume
+        self._current_indicators[column_name]['stream'] = ObvStream(column_name=column_name)
+        self._current_indicators[column_name]['carried'] = True
+
+        self._graph.add_node(
+            name=column_name,
+            inputs=[
+                self._change_in_price(column_name='close'),
+                self._source(column_name='volume'),
+                self._segment_resets(),
+                self._carried(column_name=column_name)
+            ],
+            function=lambda change_in_price, volume, resets, carried: carried + kernels.reset_cumsum(
+                values=signed_volume(change_in_price=change_in_price, volume=volume),
+                resets=resets
+            ),
+            output=True
+        )
+
+        self._compute(indicators=[column_name])
+
+        return self._stock_frame.frame
+
+    def sweep(self, indicator: str, periods: List[int], column_name: str = 'close') -> np.ndarray:
+        """Computes an indicator for a whole grid of periods in one pass.
+        Overview:
+        ----
+        Meant for parameter searches, like picking the periods of a moving average
+        crossover. The SMA of every period reads one set of prefix sums, and the EMA
+        and RSI run the recurrences of all the periods as a batch. Nothing is added
+        to the StockFrame.
+        Arguments:
+        ----
+        indicator {str} -- One of `sma`, `ema` or `rsi`.
+        periods {List[int]} -- The periods to compute.
+        Keyword Arguments:
+        ----
+        column_name {str} -- The price column the indicator is computed on. (default: {'close'})
+        Returns:
+        ----
+        {np.ndarray} -- An array of shape (symbols, datetimes, periods). The symbols follow
+            `StockFrame.symbols` and the datetimes follow the `datetime` level of the frame
+            index. Datetimes where a symbol has no bar are `NaN`.
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> sma_grid = indicator_client.sweep(indicator='sma', periods=range(10, 210, 10))
+            >>> sma_grid.shape
+            (2, 390, 20)
+        """
+
+        periods = np.asarray(periods, dtype=np.int64)
+
+        if indicator == 'sma':
+
+            sums, offsets = self._evaluate(nodes=[self._prefix_sums(column_name=column_name), 'offsets'])
+
+            # Each period is kept contiguous while it is filled in.
+            values = np.empty((len(periods), len(sums[2])))
+
+            for position, period in enumerate(periods):
+                values[position] = kernels.window_sum(sums=sums, offsets=offsets, window=period) / period
+
+            values = values.T
+
+        elif indicator == 'ema':
+
+            prices, offsets = self._evaluate(nodes=[self._source(column_name=column_name), 'offsets'])
+
+            values = kernels.ewm_mean(values=prices, offsets=offsets, span=periods)
+
+        elif indicator == 'rsi':
+
+            up_day, down_day = self._up_and_down_days(column_name=column_name)
+            up_days, down_days, offsets = self._evaluate(nodes=[up_day, down_day, 'offsets'])
+
+            values = relative_strength_index(
+                average_up=kernels.ewm_mean(values=up_days, offsets=offsets, alpha=1.0 / periods, adjust=False),
+                average_down=kernels.ewm_mean(values=down_days, offsets=offsets, alpha=1.0 / periods, adjust=False)
+            )
+
+        else:
+            raise ValueError("Indicator must be one of ['sma', 'ema', 'rsi']")
+
+        # Spread the rows out on the symbol and datetime axes.
+        index = self._stock_frame.frame.index
+
+        grid = np.full((len(index.levels[0]), len(index.levels[1]), len(periods)), np.nan)
+        grid[index.codes[0], index.codes[1]] = values
+
+        return grid
+
+    def _evaluate(self, nodes: List[str]) -> List[np.ndarray]:
+        """Returns the values of graph nodes, in the same order."""
+
+        values = self._graph.evaluate(targets=nodes)
+
+        return [values[node] for node in nodes]
+
+    def _source(self, column_name: str) -> str:
+        """Adds a price column of every symbol, back to back, to the graph."""
+
+        return self._graph.add_node(
+            name=column_name,
+            inputs=[],
+            function=lambda: self._stock_frame.frame[column_name].to_numpy(dtype=np.float64)
+        )
+
+    def _timestamps(self) -> str:
+        """Adds the bar timestamps of every symbol, in nanoseconds, to the graph."""
+
+        return self._graph.add_node(
+            name='timestamps',
+            inputs=[],
+            function=lambda: self._stock_frame.frame.index.get_level_values('datetime').to_numpy().view(np.int64)
+        )
+
+    def _segment_resets(self) -> str:
+        """Adds a mask of the first row of each symbol to the graph."""
+
+        return self._graph.add_node(
+            name='segment_resets',
+            inputs=['offsets'],
+            function=lambda offsets: np.isin(
+                np.arange(offsets[-1]),
+                kernels.segment_starts(offsets=offsets)
+            )
+        )
+
+    def _carried(self, column_name: str) -> str:
+        """Adds the value a running sum carries on from, its value on the first row of each symbol, to the graph."""
+
+        return self._graph.add_node(
+            name='carried_{column}'.format(column=column_name),
+            inputs=['offsets'],
+            function=lambda offsets: np.repeat(
+                [
+                    carried_value(buffer=self._stock_frame.buffer(symbol=symbol), column_name=column_name)
+                    for symbol in self._stock_frame.symbols
+                ],
+                np.diff(offsets)
+            )
+        )
+
+    def _change_in_price(self, column_name: str) -> str:
+        """Adds the change of a price column from the previous bar to the graph."""
+
+        return self._graph.add_node(
+            name='change_in_price_{column}'.format(column=column_name),
+            inputs=[self._source(column_name=column_name), 'offsets'],
+            function=lambda values, offsets: kernels.diff(values=values, offsets=offsets)
+        )
+
+    def _up_and_down_days(self, column_name: str) -> Tuple[str, str]:
+        """Adds the rise of a price column on up days and its fall on down days to the graph."""
+
+        change_in_price = self._change_in_price(column_name=column_name)
+
+        up_day = self._graph.add_node(
+            name='up_day_{column}'.format(column=column_name),
+            inputs=[change_in_price],
+            function=lambda change: np.where(change >= 0, change, 0.0)
+        )
+
+        down_day = self._graph.add_node(
+            name='down_day_{column}'.format(column=column_name),
+            inputs=[change_in_price],
+            function=lambda change: np.where(change < 0, -change, 0.0)
+        )
+
+        return up_day, down_day
+
+    def _previous(self, column_name: str) -> str:
+        """Adds the value of a price column on the previous bar to the graph."""
+
+        return self._graph.add_node(
+            name='previous_{column}'.format(column=column_name),
+            inputs=[self._source(column_name=column_name), 'offsets'],
+            function=lambda values, offsets: kernels.shift(values=values, offsets=offsets)
+        )
+
+    def _true_range(self) -> str:
+        """Adds the true range, the largest of the bar range and the gaps from the previous close, to the graph."""
+
+        return self._graph.add_node(
+            name='true_range',
+            inputs=[self._source(column_name='high'), self._source(column_name='low'), self._previous(column_name='close')],
+            function=lambda high, low, previous_close: true_range(
+                high=high,
+                low=low,
+                previous_close=previous_close
+            )
+        )
+
+    def _prefix_sums(self, column_name: str) -> str:
+        """Adds the running sums that rolling sums of any window are read from to the graph."""
+
+        return self._graph.add_node(
+            name='prefix_sums_{column}'.format(column=column_name),
+            inputs=[self._source(column_name=column_name), 'offsets'],
+            function=lambda values, offsets: kernels.prefix_sums(values=values, offsets=offsets)
+        )
+
+    def _prefix_squares(self, column_name: str) -> str:
+        """Adds the running sums of squares that rolling deviations are read from to the graph."""
+
+        return self._graph.add_node(
+            name='prefix_squares_{column}'.format(column=column_name),
+            inputs=[self._source(column_name=column_name), 'offsets'],
+            function=lambda values, offsets: kernels.prefix_squares(values=values, offsets=offsets)
+        )
+
+    def _ewm(self, node_name: str, span: int) -> str:
+        """Adds the exponential moving average of another node to the graph."""
+
+        return self._graph.add_node(
+            name='ewm_{node}_{span}'.format(node=node_name, span=span),
+            inputs=[node_name, 'offsets'],
+            function=lambda values, offsets: kernels.ewm_mean(values=values, offsets=offsets, span=span)
+        )
+
+    def _wilders_average(self, node_name: str, period: int) -> str:
+        """Adds Wilder's moving average of another node to the graph."""
+
+        return self._graph.add_node(
+            name='wilders_{node}_{period}'.format(node=node_name, period=period),
+            inputs=[node_name, 'offsets'],
+            function=lambda values, offsets: kernels.ewm_mean(
+                values=values,
+                offsets=offsets,
+                alpha=1.0 / period,
+                adjust=False
+            )
+        )
+
+    def _compute(self, indicators: List[str], parallel: bool = False) -> None:
+        """Computes indicators over the whole history.
+        Overview:
+        ----
+        The columns are computed in a single pass over the graph, so intermediates
+        they share are computed once. Only the indicator columns are written to the
+        StockFrame, and the running state of each indicator restarts from the end.
+        Arguments:
+        ----
+        indicators {List[str]} -- The indicators to compute.
+        Keyword Arguments:
+        ----
+        parallel {bool} -- Sends the indicators to the process pool together, if one is
+            set and there are at least `MIN_PARALLEL_ROWS` bars. (default: {False})
+        """
+
+        # Lazy indicators are computed when they are read.
+        if self._registering_lazy:
+            self._lazy.update({indicator: None for indicator in indicators})
+            return
+
+        # Inside a batch, the indicators are computed together when it ends.
+        if self._deferred is not None:
+            self._deferred += [indicator for indicator in indicators if indicator not in self._deferred]
+            return
+
+        column_names = []
+        for indicator in indicators:
+            column_names += self._current_indicators[indicator].get('columns', [indicator])
+
+        use_pool = (
+            parallel and
+            self._parallel is not None and
+            self._stock_frame.symbol_offsets[-1] >= MIN_PARALLEL_ROWS and
+            all(self.stream(indicator=indicator) for indicator in indicators)
+        )
+
+        if use_pool:
+            self._compute_parallel(indicators=indicators, column_names=column_names)
+            return
+
+        values = self._graph.evaluate(targets=column_names)
+
+        for column_name in column_names:
+            self._stock_frame.set_column(column_name=column_name, values=values[column_name])
+
+        for indicator in indicators:
+
+            indicator_stream = self._current_indicators[indicator].get('stream')
+
+            if indicator_stream:
+                for symbol in self._stock_frame.symbols:
+                    indicator_stream.seed(symbol=symbol, buffer=self._stock_frame.buffer(symbol=symbol))
+
+    def _compute_parallel(self, indicators: List[str], column_names: List[str]) -> None:
+        """Computes indicators over the whole history in the process pool."""
+
+        # Running sums carry on from the values already in the StockFrame.
+        carried = [
+            column_name
+            for indicator in indicators if self._current_indicators[indicator].get('carried')
+            for column_name in self._current_indicators[indicator].get('columns', [indicator])
+        ]
+
+        values, states = self._parallel.compute(
+            stock_frame=self._stock_frame,
+            carried=carried,
+            indicators=[
+                (
+                    indicator,
+                    self._current_indicators[indicator]['func'].__name__,
+                    self._current_indicators[indicator]['args']
+                )
+                for indicator in indicators
+            ],
+            column_names=column_names
+        )
+
+        for column_name in column_names:
+            self._stock_frame.set_column(column_name=column_name, values=values[column_name])
+
+        # The shards were fresh buffers, so the states carry their edit counters, not ours.
+        edits = {symbol: self._stock_frame.buffer(symbol=symbol).edits for symbol in self._stock_frame.symbols}
+
+        for indicator in indicators:
+
+            indicator_stream = self.stream(indicator=indicator)
+            indicator_stream.reset()
+            indicator_stream.load_states(states={
+                symbol: (anchor, edits[symbol], state)
+                for symbol, (anchor, _, state) in states[indicator].items()
+            })
+
+    @contextmanager
+    def batch(self):
+        """Defers the computation of the indicators added inside the block.
+        Overview:
+        ----
+        When the block ends, the indicators are computed in a single pass over the
+        graph, so the intermediates they share are only computed once.
+        Usage:
+        ----
+            >>> with indicator_client.batch():
+                    indicator_client.sma(period=20)
+                    indicator_client.bollinger_bands(period=20)
+        """
+
+        self._deferred = []
+
+        try:
+            yield self
+        finally:
+            indicators, self._deferred = self._deferred, None
+
+        if indicators:
+            self._compute(indicators=indicators, parallel=True)
+
+    @contextmanager
+    def lazy(self):
+        """Registers the indicators added inside the block as lazy columns.
+        Overview:
+        ----
+        A lazy indicator is not computed when it is added or refreshed. Its columns
+        are computed when something reads them, through `price_data_frame` or a
+        signal, and the result is kept until the bars change. Indicators that only
+        feed dashboards or research then cost nothing on every bar.
+        Usage:
+        ----
+            >>> with indicator_client.lazy():
+                    indicator_client.bollinger_bands(period=20)
+                    indicator_client.on_balance_volume()
+            >>> indicator_client.refresh()
+            >>> indicator_client.price_data_frame['obv']
+        """
+
+        self._registering_lazy = True
+
+        try:
+            yield self
+        finally:
+            self._registering_lazy = False
+
+    def _materialize(self, indicators: List[str]) -> None:
+        """Brings the columns of lazy indicators up to date with the bars.
+        Overview:
+        ----
+        Indicators computed before fold the new rows into their running state, the
+        others are computed together over the whole history.
+        Arguments:
+        ----
+        indicators {List[str]} -- The lazy indicators to update.
+        """
+
+        bars_version = self._stock_frame.bars_version
+        stale = [indicator for indicator in indicators if self._lazy.get(indicator, bars_version) != bars_version]
+
+        full_indicators = []
+
+        for indicator in stale:
+
+            if self._lazy[indicator] is not None and self.stream(indicator=indicator):
+                self._refresh_stream(stream=self.stream(indicator=indicator))
+            else:
+                full_indicators.append(indicator)
+
+        if full_indicators:
+            self._compute(indicators=full_indicators, parallel=True)
+
+        for indicator in stale:
+            self._lazy[indicator] = bars_version
+
+    def stream(self, indicator: str) -> IndicatorStream:
+        """Returns the running state of an indicator, `None` if it has none."""
+
+        return self._current_indicators[indicator].get('stream')
+
+    def set_parallel(self, workers: int = None) -> None:
+        """Computes full-history indicators in a pool of worker processes.
+        Overview:
+        ----
+        The symbols are split into shards that the workers compute side by side,
+        reading the bars from shared memory. This pays off when the whole universe
+        is rebuilt, for example at startup. The pool only gets whole batches: the
+        indicators of a full `refresh`, of a `batch` block, or the lazy indicators
+        being read, and only with at least `MIN_PARALLEL_ROWS` bars. Adding a single
+        indicator and incremental refreshes stay in process.
+        Keyword Arguments:
+        ----
+        workers {int} -- The number of worker processes, `1` turns the parallel mode
+            off. (default: {None}, one per core)
+        Usage:
+        ----
+            >>> indicator_client = Indicators(price_data_frame=stock_frame)
+            >>> indicator_client.set_parallel(workers=4)
+            >>> indicator_client.refresh(incremental=False)
+        """
+
+        if self._parallel:
+            self._parallel.close()
+            self._parallel = None
+
+        if workers is None or workers > 1:
+            self._parallel = ParallelIndicators(workers=workers)
+
+    def refresh(self, incremental: bool = True):
+        """Updates the Indicator columns after adding the new rows.
+        Overview:
+        ----
+        By default, each indicator only folds the new rows of each symbol into its
+        running state, so the cost of a refresh does not grow with the history.
+        Symbols whose older rows changed are recomputed in full automatically.
+        Keyword Arguments:
+        ----
+        incremental {bool} -- Set to `False` to recompute every indicator over the
+            whole history. (default: {True})
+        """
+
+        full_indicators = []
 
         # Grab all the details of the indicators so far.
         for indicator in self._current_indicators:
 
-            # Grab the function.
-            indicator_argument = self._current_indicators[indicator]['args']
+            # Lazy indicators wait until they are read.
+            if indicator in self._lazy:
+                if not incremental:
+                    self._lazy[indicator] = None
+                continue
 
-            # Grab the arguments.
-            indicator_function = self._current_indicators[indicator]['func']
+            # Grab the running state.
+            indicator_stream = self._current_indicators[indicator].get('stream')
 
-            # Update the function.
-            indicator_function(**indicator_argument)
+            if incremental and indicator_stream:
+                self._refresh_stream(stream=indicator_stream)
+            else:
+                full_indicators.append(indicator)
 
-    def check_signals(self) -> Union[pd.DataFrame, None]:
+        if full_indicators:
+
+            # Recompute the rest together, so they share their intermediates.
+            self._compute(indicators=full_indicators, parallel=True)
+
+    def _refresh_stream(self, stream: IndicatorStream) -> None:
+        """Folds the new rows of every symbol into an indicator's running state."""
+
+        for symbol in self._stock_frame.symbols:
+
+            position, values = stream.update(
+                symbol=symbol,
+                buffer=self._stock_frame.buffer(symbol=symbol)
+            )
+
+            for column_name, column_values in values.items():
+                self._stock_frame.write_rows(
+                    column_name=column_name,
+                    symbol=symbol,
+                    position=position,
+                    values=column_values
+                )
+
+    def check_signals(self) -> Dict[str, pd.Series]:
         """Checks to see if any signals have been generated.
+        Overview:
+        ----
+        The signals are compiled once into a `SignalEngine` and checked against the
+        latest row of every symbol in a single vectorized pass.
         Returns:
         ----
-        {Union[pd.DataFrame, None]} -- If signals are generated then a pandas.DataFrame
-            is returned otherwise nothing is returned.
+        {Dict[str, pd.Series]} -- The `buys` and `sells` rows, indexed by `symbol` and
+            `datetime`. A side without signals is an empty series.
         """
 
-        signals_df = self._stock_frame._check_signals(
-            indicators=self._indicator_signals,
-            indciators_comp_key=self._indicators_comp_key,
-            indicators_key=self._indicators_key
+        signal_engine = self._compiled_signals()
+
+        signals = signal_engine.evaluate(
+            frame=self._stock_frame.latest_rows,
+            previous=self._stock_frame.previous_rows if signal_engine.crossovers else None
         )
 
-        return signals_df
+        return signals
+
+    def signal_history(self) -> Dict[str, Union[pd.DataFrame, pd.Series]]:
+        """Evaluates the signals over the whole history, as if they had been checked on every bar.
+        Overview:
+        ----
+        The same compiled rules as `check_signals` are evaluated over every row of
+        every symbol in one vectorized pass, so research and live signals can't
+        drift apart. Crossovers compare each bar with the bar before it.
+        Returns:
+        ----
+        {Dict[str, Union[pd.DataFrame, pd.Series]]} -- The `buys` and `sells` matrices,
+            one row per symbol and one column per timestamp, `False` where a symbol has
+            no bar. Then the `entries` and `exits` events, indexed by `symbol` and `datetime`.
+        Usage:
+        ----
+            >>> history = indicator_client.signal_history()
+            >>> history['buys'].sum(axis=1)
+            >>> history['entries'].index.get_level_values('datetime')
+        """
+
+        signal_engine = self._compiled_signals()
+
+        frame = self._stock_frame.frame
+
+        masks = signal_engine.history(
+            values=frame[signal_engine.columns].to_numpy(dtype=np.float64),
+            offsets=self._stock_frame.symbol_offsets
+        )
+
+        signals = {}
+
+        for side in ('buys', 'sells'):
+            signals[side] = pd.Series(masks[side], index=frame.index).unstack(
+                level='datetime',
+                fill_value=False
+            )
+
+        for event in ('entries', 'exits'):
+            signals[event] = pd.Series(True, index=frame.index[masks[event]], dtype=bool)
+
+        return signals
+
+    def _compiled_signals(self) -> SignalEngine:
+        """Returns the compiled signals, compiling them if a signal changed."""
+
+        if self._signal_engine is None:
+            self._signal_engine = SignalEngine(
+                indicators=self._indicator_signals,
+                indicators_comp_key=self._indicators_comp_key,
+                indicators_key=self._indicators_key,
+                **self._signal_logic
+            )
+
+        # Compute the lazy indicators the signals read.
+        self._materialize(indicators=[
+            indicator for indicator in self._lazy
+            if set(self._current_indicators[indicator].get('columns', [indicator])) & set(self._signal_engine.columns)
+        ])
+
+        # Check to see if all the columns exist.
+        self._stock_frame.do_indicator_exist(column_names=self._signal_engine.columns)
+
+        return self._signal_engine
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divides two arrays, `NaN` where the denominator is zero."""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return numerator / denominator
@@ -0,0 +1,146 @@
+from typing import Any
+from typing import List
+from typing import Dict
+from typing import Callable
+
+
+class IndicatorGraph():
+
+    """
+    Represents the indicators as a graph of named nodes. Each node is
+    computed from the values of its inputs, so an intermediate like the
+    change in price is computed once and shared by every indicator that
+    needs it.
+    """
+
+    def __init__(self) -> None:
+        """Initalizes an empty graph."""
+
+        # Node name -> (input names, function).
+        self._nodes: Dict[str, tuple] = {}
+        self._outputs: List[str] = []
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    @property
+    def outputs(self) -> List[str]:
+        """Returns the nodes whose values are written to the StockFrame."""
+
+        return list(self._outputs)
+
+    def add_node(self, name: str, inputs: List[str], function: Callable[..., Any], output: bool = False) -> str:
+        """Adds a node to the graph.
+        Overview:
+        ----
+        Intermediate names describe what they compute, for example `change_in_price_close`,
+        so adding one that already exists keeps the existing node. Output nodes are
+        replaced, since an indicator can be added again with other arguments.
+        Arguments:
+        ----
+        name {str} -- The name of the node, the column name for outputs.
+        inputs {List[str]} -- The nodes whose values are passed to `function`, in order.
+        function {Callable[..., Any]} -- Computes the value of the node from the values of its inputs.
+        Keyword Arguments:
+        ----
+        output {bool} -- Whether the node is an indicator column. (default: {False})
+        Returns:
+        ----
+        {str} -- The name of the node.
+        """
+
+        if name in self._nodes and not output:
+            if name in self._outputs:
+                raise ValueError("The intermediate {name} has the same name as an indicator column.".format(name=name))
+            return name
+
+        if output and name in self._nodes and name not in self._outputs:
+            raise ValueError("The column {name} has the same name as an intermediate.".format(name=name))
+
+        missing_inputs = [input_name for input_name in inputs if input_name not in self._nodes]
+
+        if missing_inputs:
+            raise KeyError("The node {name} depends on unknown nodes: {inputs}".format(
+                name=name,
+                inputs=missing_inputs
+            ))
+
+        self._nodes[name] = (list(inputs), function)
+
+        if output and name not in self._outputs:
+            self._outputs.append(name)
+
+        return name
+
+    def order(self, targets: List[str]) -> List[str]:
+        """Returns the nodes needed for `targets` in topological order.
+        Arguments:
+        ----
+        targets {List[str]} -- The nodes to compute.
+        Returns:
+        ----
+        {List[str]} -- Each needed node once, after all of its inputs.
+        """
+
+        ordered = []
+        visited = set()
+        visiting = set()
+
+        def visit(name: str) -> None:
+
+            if name in visited:
+                return
+
+            if name in visiting:
+                raise ValueError("The node {name} depends on itself.".format(name=name))
+
+            visiting.add(name)
+
+            for input_name in self._nodes[name][0]:
+                visit(input_name)
+
+            visiting.discard(name)
+            visited.add(name)
+            ordered.append(name)
+
+        for target in targets:
+            visit(target)
+
+        return ordered
+
+    def evaluate(self, targets: List[str]) -> Dict[str, Any]:
+        """Computes the target nodes, computing each shared node once.
+        Overview:
+        ----
+        Intermediate values are released as soon as the last node that reads them
+        is done, so they never become columns of the StockFrame.
+        Arguments:
+        ----
+        targets {List[str]} -- The nodes to compute.
+        Returns:
+        ----
+        {Dict[str, Any]} -- The value of each target node.
+        """
+
+        ordered = self.order(targets=targets)
+
+        # The number of nodes still waiting to read each value.
+        readers = {name: 0 for name in ordered}
+        for name in ordered:
+            for input_name in self._nodes[name][0]:
+                readers[input_name] += 1
+
+        values = {}
+
+        for name in ordered:
+
+            input_names, function = self._nodes[name]
+            values[name] = function(*[values[input_name] for input_name in input_names])
+
+            for input_name in input_names:
+                readers[input_name] -= 1
+                if not readers[input_name] and input_name not in targets:
+                    del values[input_name]
+
+        return {target: values[target] for target in targets}
@@ -0,0 +1,741 @@
+import math
+
+import numpy as np
+
+from typing import Any
+from typing import List
+from typing import Dict
+from typing import Tuple
+
+from Bot import kernels
+from Bot.resampler import BAR_TYPE_NANOSECONDS
+from Bot.symbol_buffer import SymbolBuffer
+
+
+# VWAP sessions start at 06:00 UTC, in the overnight gap of US equities.
+VWAP_SESSION_START = 6 * 60 * 60 * 1_000_000_000
+
+
+class IndicatorStream():
+
+    """
+    Represents the running, per-symbol state of an indicator so new bars
+    can be folded in one at a time instead of recomputing the history.
+    """
+
+    def __init__(self, columns: List[str]) -> None:
+        """Initalizes the stream.
+        Arguments:
+        ----
+        columns {List[str]} -- The indicator columns the stream writes.
+        """
+
+        self.columns = columns
+
+        # Symbol -> (timestamp of the last row folded in, buffer edits, state before that row)
+        self._states: Dict[str, Tuple[int, int, Any]] = {}
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+        """Computes the indicator over the whole history of one symbol."""
+
+        raise NotImplementedError
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Any:
+        """Returns the state after folding in the rows before position `end`."""
+
+        raise NotImplementedError
+
+    def step(self, state: Any, buffer: SymbolBuffer, position: int) -> Tuple[Any, tuple]:
+        """Folds in the row at `position`, returning the new state and the indicator values."""
+
+        raise NotImplementedError
+
+    def can_resume(self, state: Any, buffer: SymbolBuffer, position: int) -> bool:
+        """Checks that the rows `step` looks back at are still in the buffer."""
+
+        return True
+
+    @property
+    def states(self) -> Dict[str, Tuple[int, int, Any]]:
+        """Returns the state of each symbol, keyed by symbol."""
+
+        return self._states
+
+    def load_states(self, states: Dict[str, Tuple[int, int, Any]]) -> None:
+        """Adds symbol states computed elsewhere, for example by a worker process."""
+
+        self._states.update(states)
+
+    def reset(self) -> None:
+        """Forgets every symbol's state, for example after a full recompute."""
+
+        self._states.clear()
+
+    def seed(self, symbol: str, buffer: SymbolBuffer) -> None:
+        """Sets the state of a symbol to the end of its buffer after a full recompute."""
+
+        if len(buffer):
+            self._states[symbol] = (
+                buffer.index[-1],
+                buffer.edits,
+                self.initialize(buffer=buffer, end=len(buffer) - 1)
+            )
+
+    def update(self, symbol: str, buffer: SymbolBuffer) -> Tuple[int, Dict[str, np.ndarray]]:
+        """Folds the new rows of a symbol into its state.
+        Overview:
+        ----
+        The row that was last at the end of the buffer is folded in again, so a new
+        copy of the current bar replaces the old one. If older rows were inserted
+        or rewritten, or the symbol has no state yet, the symbol is recomputed in full.
+        Arguments:
+        ----
+        symbol {str} -- The symbol to update.
+        buffer {SymbolBuffer} -- The symbol's buffer.
+        Returns:
+        ----
+        {Tuple[int, Dict[str, np.ndarray]]} -- The first row position written and the
+            values of each indicator column from that row on.
+        """
+
+        size = len(buffer)
+
+        if not size:
+            return 0, {}
+
+        position = None
+
+        if symbol in self._states:
+
+            anchor, edits, state = self._states[symbol]
+            position = int(np.searchsorted(buffer.index, anchor))
+
+            if (edits != buffer.edits or position >= size or buffer.index[position] != anchor
+                    or not self.can_resume(state=state, buffer=buffer, position=position)):
+                position = None
+
+        # Start over from the full history.
+        if position is None:
+            self.seed(symbol=symbol, buffer=buffer)
+            return 0, self.compute(buffer=buffer)
+
+        outputs = [np.empty(size - position) for _ in self.columns]
+
+        for row in range(position, size):
+
+            state_before = state
+            state, values = self.step(state=state, buffer=buffer, position=row)
+
+            for output, value in zip(outputs, values):
+                output[row - position] = value
+
+        self._states[symbol] = (buffer.index[-1], buffer.edits, state_before)
+
+        return position, dict(zip(self.columns, outputs))
+
+
+class SmaStream(IndicatorStream):
+
+    """A Simple Moving Average kept as a running sum over the window."""
+
+    def __init__(self, period: int, column_name: str = 'sma', source: str = 'close') -> None:
+
+        super().__init__(columns=[column_name])
+
+        self.period = period
+        self.source = source
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        sma = kernels.rolling_mean(
+            values=buffer.column(self.source),
+            offsets=np.array([0, len(buffer)]),
+            window=self.period
+        )
+
+        return {self.columns[0]: sma}
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[float, int]:
+
+        window = buffer.column(self.source)[max(end - self.period, 0):end]
+
+        return float(np.sum(window, dtype=np.float64)), len(window)
+
+    def can_resume(self, state: Tuple[float, int], buffer: SymbolBuffer, position: int) -> bool:
+
+        # The value leaving the window must still be in the buffer.
+        return state[1] < self.period or position >= self.period
+
+    def step(self, state: Tuple[float, int], buffer: SymbolBuffer, position: int) -> Tuple[Tuple[float, int], tuple]:
+
+        total, count = state
+        values = buffer.column(self.source)
+
+        total += float(values[position])
+
+        if count == self.period:
+            total -= float(values[position - self.period])
+        else:
+            count += 1
+
+        sma = total / self.period if count == self.period else np.nan
+
+        return (total, count), (sma,)
+
+
+class EmaStream(IndicatorStream):
+
+    """An Exponential Moving Average, matching `ewm(span=period).mean()`."""
+
+    def __init__(self, period: int, column_name: str = 'ema', source: str = 'close') -> None:
+
+        super().__init__(columns=[column_name])
+
+        self.period = period
+        self.source = source
+        self.decay = 1.0 - 2.0 / (period + 1.0)
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        ema = kernels.ewm_mean(
+            values=buffer.column(self.source),
+            offsets=np.array([0, len(buffer)]),
+            span=self.period
+        )
+
+        return {self.columns[0]: ema}
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[float, float]:
+
+        # The weighted sum of the values and of the weights.
+        weights = self.decay ** np.arange(end - 1, -1, -1, dtype=np.float64)
+        values = buffer.column(self.source)[:end].astype(np.float64)
+
+        return float(np.dot(weights, values)), float(np.sum(weights))
+
+    def step(self, state: Tuple[float, float], buffer: SymbolBuffer, position: int) -> Tuple[Tuple[float, float], tuple]:
+
+        numerator, denominator = state
+
+        numerator = float(buffer.column(self.source)[position]) + self.decay * numerator
+        denominator = 1.0 + self.decay * denominator
+
+        return (numerator, denominator), (numerator / denominator,)
+
+
+class RsiStream(IndicatorStream):
+
+    """A Relative Strength Index with Wilder's smoothing of the up and down moves."""
+
+    def __init__(self, period: int, column_name: str = 'rsi', source: str = 'close') -> None:
+
+        super().__init__(columns=[column_name])
+
+        self.period = period
+        self.source = source
+        self.alpha = 1.0 / period
+
+    def _moves(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Splits the change in price into up and down moves, the first row has no move."""
+
+        change_in_price = np.diff(values, prepend=np.nan)
+
+        up_move = np.where(change_in_price >= 0, change_in_price, 0.0)
+        down_move = np.where(change_in_price < 0, -change_in_price, 0.0)
+
+        return up_move, down_move
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        up_move, down_move = self._moves(values=buffer.column(self.source).astype(np.float64))
+
+        offsets = np.array([0, len(buffer)])
+
+        average_up = kernels.ewm_mean(values=up_move, offsets=offsets, alpha=self.alpha, adjust=False)
+        average_down = kernels.ewm_mean(values=down_move, offsets=offsets, alpha=self.alpha, adjust=False)
+
+        return {self.columns[0]: relative_strength_index(average_up=average_up, average_down=average_down)}
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[float, float, float]:
+
+        if not end:
+            return np.nan, np.nan, np.nan
+
+        up_move, down_move = self._moves(values=buffer.column(self.source)[:end].astype(np.float64))
+
+        # Wilder's average unrolled, the first move seeds the average.
+        weights = self.alpha * (1.0 - self.alpha) ** np.arange(end - 1, -1, -1, dtype=np.float64)
+        weights[0] = (1.0 - self.alpha) ** (end - 1)
+
+        return (
+            float(buffer.column(self.source)[end - 1]),
+            float(np.dot(weights, up_move)),
+            float(np.dot(weights, down_move))
+        )
+
+    def step(self, state: Tuple[float, float, float], buffer: SymbolBuffer, position: int) -> Tuple[tuple, tuple]:
+
+        last_price, average_up, average_down = state
+        price = float(buffer.column(self.source)[position])
+
+        change_in_price = price - last_price
+        up_move = change_in_price if change_in_price >= 0 else 0.0
+        down_move = -change_in_price if change_in_price < 0 else 0.0
+
+        if np.isnan(average_up):
+            average_up, average_down = up_move, down_move
+        else:
+            average_up = self.alpha * up_move + (1.0 - self.alpha) * average_up
+            average_down = self.alpha * down_move + (1.0 - self.alpha) * average_down
+
+        if average_down == 0:
+            rsi = 100.0
+        else:
+            rsi = 100.0 - (100.0 / (1.0 + average_up / average_down))
+
+        return (price, average_up, average_down), (rsi,)
+
+
+class MacdStream(IndicatorStream):
+
+    """The Moving Average Convergence Divergence line, its signal line and their difference."""
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9,
+                 column_name: str = 'macd', source: str = 'close') -> None:
+
+        super().__init__(columns=[
+            column_name,
+            column_name + '_signal',
+            column_name + '_histogram'
+        ])
+
+        self.spans = (fast_period, slow_period, signal_period)
+        self.source = source
+
+    def _averages(self, buffer: SymbolBuffer, end: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the fast and slow averages and the signal line of the first `end` rows."""
+
+        offsets = np.array([0, end])
+        fast_period, slow_period, signal_period = self.spans
+
+        close = buffer.column(self.source)[:end]
+        fast = kernels.ewm_mean(values=close, offsets=offsets, span=fast_period)
+        slow = kernels.ewm_mean(values=close, offsets=offsets, span=slow_period)
+        signal = kernels.ewm_mean(values=fast - slow, offsets=offsets, span=signal_period)
+
+        return fast, slow, signal
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        fast, slow, signal = self._averages(buffer=buffer, end=len(buffer))
+
+        return dict(zip(self.columns, (fast - slow, signal, fast - slow - signal)))
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[tuple, int]:
+
+        if not end:
+            return (np.nan, np.nan, np.nan), 0
+
+        fast, slow, signal = self._averages(buffer=buffer, end=end)
+
+        return (fast[-1], slow[-1], signal[-1]), end
+
+    def step(self, state: Tuple[tuple, int], buffer: SymbolBuffer, position: int) -> Tuple[tuple, tuple]:
+
+        (fast, slow, signal), count = state
+        price = float(buffer.column(self.source)[position])
+
+        fast_period, slow_period, signal_period = self.spans
+
+        fast = adjusted_ewm_step(average=fast, count=count, value=price, span=fast_period)
+        slow = adjusted_ewm_step(average=slow, count=count, value=price, span=slow_period)
+        signal = adjusted_ewm_step(average=signal, count=count, value=fast - slow, span=signal_period)
+
+        return ((fast, slow, signal), count + 1), (fast - slow, signal, fast - slow - signal)
+
+
+class BollingerStream(IndicatorStream):
+
+    """The Bollinger Bands, a moving average with bands a number of standard deviations away."""
+
+    def __init__(self, period: int = 20, deviations: float = 2.0, column_name: str = 'bollinger',
+                 source: str = 'close') -> None:
+
+        super().__init__(columns=[
+            column_name + '_upper',
+            column_name + '_middle',
+            column_name + '_lower'
+        ])
+
+        self.period = period
+        self.deviations = deviations
+        self.source = source
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        values = buffer.column(self.source)
+        offsets = np.array([0, len(buffer)])
+
+        sums = kernels.prefix_sums(values=values, offsets=offsets)
+        middle = kernels.window_sum(sums=sums, offsets=offsets, window=self.period) / self.period
+        deviation = kernels.window_std(
+            sums=sums,
+            squares=kernels.prefix_squares(values=values, offsets=offsets),
+            offsets=offsets,
+            window=self.period
+        )
+
+        return dict(zip(self.columns, bollinger_bands(
+            middle=middle,
+            deviation=deviation,
+            deviations=self.deviations
+        )))
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> None:
+
+        # Each row reads its own window, there is nothing to carry.
+        return None
+
+    def step(self, state: None, buffer: SymbolBuffer, position: int) -> Tuple[None, tuple]:
+
+        if position < self.period - 1:
+            return None, (np.nan, np.nan, np.nan)
+
+        window = buffer.column(self.source)[position - self.period + 1:position + 1].astype(np.float64)
+
+        return None, bollinger_bands(
+            middle=window.mean(),
+            deviation=window.std(ddof=1) if self.period > 1 else np.nan,
+            deviations=self.deviations
+        )
+
+
+class AtrStream(IndicatorStream):
+
+    """The Average True Range, Wilder's average of the true range."""
+
+    def __init__(self, period: int = 14, column_name: str = 'atr') -> None:
+
+        super().__init__(columns=[column_name])
+
+        self.period = period
+        self.alpha = 1.0 / period
+
+    def _average_true_range(self, buffer: SymbolBuffer, end: int) -> np.ndarray:
+
+        offsets = np.array([0, end])
+        previous_close = kernels.shift(values=buffer.column('close')[:end], offsets=offsets)
+
+        return kernels.ewm_mean(
+            values=true_range(
+                high=buffer.column('high')[:end].astype(np.float64),
+                low=buffer.column('low')[:end].astype(np.float64),
+                previous_close=previous_close
+            ),
+            offsets=offsets,
+            alpha=self.alpha,
+            adjust=False
+        )
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        return {self.columns[0]: self._average_true_range(buffer=buffer, end=len(buffer))}
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[float, float]:
+
+        if not end:
+            return np.nan, np.nan
+
+        return (
+            float(buffer.column('close')[end - 1]),
+            float(self._average_true_range(buffer=buffer, end=end)[-1])
+        )
+
+    def step(self, state: Tuple[float, float], buffer: SymbolBuffer, position: int) -> Tuple[tuple, tuple]:
+
+        previous_close, average = state
+
+        bar_range = float(true_range(
+            high=float(buffer.column('high')[position]),
+            low=float(buffer.column('low')[position]),
+            previous_close=previous_close
+        ))
+
+        if np.isnan(average):
+            average = bar_range
+        else:
+            average = self.alpha * bar_range + (1.0 - self.alpha) * average
+
+        return (float(buffer.column('close')[position]), average), (average,)
+
+
+class VwapStream(IndicatorStream):
+
+    """The Volume Weighted Average Price of the typical price, starting over every session."""
+
+    def __init__(self, column_name: str = 'vwap') -> None:
+
+        super().__init__(columns=[column_name])
+
+    def _sums(self, buffer: SymbolBuffer, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the running sums of price times volume and of volume over the first `end` rows."""
+
+        sessions = session_ids(timestamps=buffer.index[:end])
+        resets = np.concatenate(([True], sessions[1:] != sessions[:-1]))
+
+        volume = buffer.column('volume')[:end].astype(np.float64)
+        price = typical_price(
+            high=buffer.column('high')[:end].astype(np.float64),
+            low=buffer.column('low')[:end].astype(np.float64),
+            close=buffer.column('close')[:end].astype(np.float64)
+        )
+
+        return (
+            kernels.reset_cumsum(values=price * volume, resets=resets),
+            kernels.reset_cumsum(values=volume, resets=resets)
+        )
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        price_volume, volume = self._sums(buffer=buffer, end=len(buffer))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {self.columns[0]: price_volume / volume}
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[int, float, float]:
+
+        if not end:
+            return None, 0.0, 0.0
+
+        # Only the rows of the last session are needed.
+        sessions = session_ids(timestamps=buffer.index[:end])
+        start = int(np.searchsorted(sessions, sessions[-1]))
+
+        view = _RowsView(buffer=buffer, start=start)
+        price_volume, volume = self._sums(buffer=view, end=end - start)
+
+        return int(sessions[-1]), float(price_volume[-1]), float(volume[-1])
+
+    def step(self, state: Tuple[int, float, float], buffer: SymbolBuffer, position: int) -> Tuple[tuple, tuple]:
+
+        session, total_price_volume, total_volume = state
+        bar_session = session_ids(timestamps=int(buffer.index[position]))
+
+        if bar_session != session:
+            session, total_price_volume, total_volume = bar_session, 0.0, 0.0
+
+        volume = float(buffer.column('volume')[position])
+        price = typical_price(
+            high=float(buffer.column('high')[position]),
+            low=float(buffer.column('low')[position]),
+            close=float(buffer.column('close')[position])
+        )
+
+        # Missing values count as zero, like in the full computation.
+        if not math.isnan(volume):
+            total_volume += volume
+            if not math.isnan(price):
+                total_price_volume += price * volume
+
+        vwap = total_price_volume / total_volume if total_volume else np.nan
+
+        return (session, total_price_volume, total_volume), (vwap,)
+
+
+class StochasticStream(IndicatorStream):
+
+    """The Stochastic Oscillator, %K and its moving average %D, in the columns `column_name` and `column_name_signal`."""
+
+    def __init__(self, k_period: int = 14, d_period: int = 3, column_name: str = 'stochastic') -> None:
+
+        super().__init__(columns=[column_name, column_name + '_signal'])
+
+        self.k_period = k_period
+        self.d_period = d_period
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        offsets = np.array([0, len(buffer)])
+
+        percent_k = stochastic_oscillator(
+            close=buffer.column('close').astype(np.float64),
+            lowest_low=kernels.rolling_min(values=buffer.column('low'), offsets=offsets, window=self.k_period),
+            highest_high=kernels.rolling_max(values=buffer.column('high'), offsets=offsets, window=self.k_period)
+        )
+        percent_d = kernels.rolling_mean(values=percent_k, offsets=offsets, window=self.d_period)
+
+        return dict(zip(self.columns, (percent_k, percent_d)))
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> tuple:
+
+        # The %K of the rows before `end` that the next %D averages.
+        return tuple(
+            self._percent_k(buffer=buffer, position=row) for row in range(max(end - self.d_period + 1, 0), end)
+        )
+
+    def _percent_k(self, buffer: SymbolBuffer, position: int) -> float:
+
+        if position < self.k_period - 1:
+            return np.nan
+
+        first = position - self.k_period + 1
+
+        return float(stochastic_oscillator(
+            close=float(buffer.column('close')[position]),
+            lowest_low=float(np.min(buffer.column('low')[first:position + 1])),
+            highest_high=float(np.max(buffer.column('high')[first:position + 1]))
+        ))
+
+    def step(self, state: tuple, buffer: SymbolBuffer, position: int) -> Tuple[tuple, tuple]:
+
+        percent_k = self._percent_k(buffer=buffer, position=position)
+        recent_k = (state + (percent_k,))[-self.d_period:]
+
+        percent_d = np.nan
+        if len(recent_k) == self.d_period:
+            percent_d = sum(recent_k) / self.d_period
+
+        return recent_k[1:] if self.d_period > 1 else (), (percent_k, percent_d)
+
+
+class ObvStream(IndicatorStream):
+
+    """
+    The On Balance Volume, the running sum of volume signed by the direction of
+    the close. It carries on from the OBV already on the first row, so rows
+    dropped from the front of the buffer still count.
+    """
+
+    def __init__(self, column_name: str = 'obv') -> None:
+
+        super().__init__(columns=[column_name])
+
+    def compute(self, buffer: SymbolBuffer) -> Dict[str, np.ndarray]:
+
+        offsets = np.array([0, len(buffer)])
+
+        return {self.columns[0]: carried_value(buffer=buffer, column_name=self.columns[0]) + kernels.reset_cumsum(
+            values=signed_volume(
+                change_in_price=kernels.diff(values=buffer.column('close'), offsets=offsets),
+                volume=buffer.column('volume').astype(np.float64)
+            ),
+            resets=np.arange(len(buffer)) == 0
+        )}
+
+    def initialize(self, buffer: SymbolBuffer, end: int) -> Tuple[float, float]:
+
+        if not end:
+            return np.nan, 0.0
+
+        offsets = np.array([0, end])
+        change_in_price = kernels.diff(values=buffer.column('close')[:end], offsets=offsets)
+        volume = buffer.column('volume')[:end].astype(np.float64)
+
+        return (
+            float(buffer.column('close')[end - 1]),
+            carried_value(buffer=buffer, column_name=self.columns[0]) +
+            float(np.sum(signed_volume(change_in_price=change_in_price, volume=volume)))
+        )
+
+    def step(self, state: Tuple[float, float], buffer: SymbolBuffer, position: int) -> Tuple[tuple, tuple]:
+
+        previous_close, total = state
+        close = float(buffer.column('close')[position])
+        volume = float(buffer.column('volume')[position])
+
+        if close > previous_close:
+            total += 0.0 if math.isnan(volume) else volume
+        elif close < previous_close:
+            total -= 0.0 if math.isnan(volume) else volume
+
+        return (close, total), (total,)
+
+
+class _RowsView():
+
+    """A read-only view of the rows of a buffer from `start` on, used to initialize a state from a slice."""
+
+    def __init__(self, buffer: SymbolBuffer, start: int) -> None:
+
+        self._buffer = buffer
+        self._start = start
+
+    @property
+    def index(self) -> np.ndarray:
+        return self._buffer.index[self._start:]
+
+    def column(self, column_name: str) -> np.ndarray:
+        return self._buffer.column(column_name)[self._start:]
+
+
+def adjusted_ewm_step(average: float, count: int, value: float, span: float) -> float:
+    """Folds one value into an average matching `ewm(span=span).mean()` after `count` values."""
+
+    if not count:
+        return value
+
+    decay = 1.0 - 2.0 / (span + 1.0)
+
+    # The sum of the weights of the previous values.
+    weights = (1.0 - decay ** count) / (1.0 - decay)
+
+    return (value + decay * average * weights) / (1.0 + decay * weights)
+
+
+def true_range(high: np.ndarray, low: np.ndarray, previous_close: np.ndarray) -> np.ndarray:
+    """Returns the largest of the bar range and the gaps from the previous close, the bar range on the first bar."""
+
+    return np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+
+
+def typical_price(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """Returns the average of the high, low and close."""
+
+    return (high + low + close) / 3.0
+
+
+def session_ids(timestamps: np.ndarray) -> np.ndarray:
+    """Numbers the trading session each timestamp in nanoseconds falls in."""
+
+    return (timestamps - VWAP_SESSION_START) // BAR_TYPE_NANOSECONDS['daily']
+
+
+def bollinger_bands(middle: np.ndarray, deviation: np.ndarray, deviations: float) -> tuple:
+    """Returns the upper band, the middle band and the lower band."""
+
+    return middle + deviations * deviation, middle, middle - deviations * deviation
+
+
+def stochastic_oscillator(close: np.ndarray, lowest_low: np.ndarray, highest_high: np.ndarray) -> np.ndarray:
+    """Returns where the close sits in the range of the window, from 0 at the low to 100 at the high."""
+
+    close = np.asarray(close, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 * (close - lowest_low) / (highest_high - lowest_low)
+
+
+def signed_volume(change_in_price: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """Returns the volume, negative when the close went down and zero when it didn't move."""
+
+    return np.nan_to_num(np.sign(change_in_price) * volume, nan=0.0)
+
+
+def carried_value(buffer: SymbolBuffer, column_name: str) -> float:
+    """Returns the value of a running sum on the first row of a buffer, zero if there is none yet."""
+
+    if not len(buffer) or column_name not in buffer.columns:
+        return 0.0
+
+    value = float(buffer.column(column_name)[0])
+
+    return 0.0 if math.isnan(value) else value
+
+
+def relative_strength_index(average_up: np.ndarray, average_down: np.ndarray) -> np.ndarray:
+    """Turns the average up and down moves into the RSI, which is 100 when there are no down moves."""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_strength = average_up / average_down
+
+    return np.where(average_down == 0, 100.0, 100.0 - (100.0 / (1.0 + relative_strength)))
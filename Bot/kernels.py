@@ -0,0 +1,404 @@
+import numpy as np
+
+from typing import Tuple
+from typing import Union
+
+
+# Keeps the scale factors used by `decayed_sum` well inside the float64 range.
+MAX_BLOCK_SCALE = 230.0
+
+
+def segment_lengths(offsets: np.ndarray) -> np.ndarray:
+    """Returns the number of rows in each segment given their offsets."""
+
+    return np.diff(offsets)
+
+
+def segment_starts(offsets: np.ndarray) -> np.ndarray:
+    """Returns the first row of each segment that has rows."""
+
+    return offsets[:-1][segment_lengths(offsets=offsets) > 0] - offsets[0]
+
+
+def segment_positions(offsets: np.ndarray) -> np.ndarray:
+    """Returns the position of each row inside its segment, starting at 0."""
+
+    lengths = segment_lengths(offsets=offsets)
+    rows = int(offsets[-1]) - int(offsets[0])
+
+    return np.arange(rows, dtype=np.int64) - np.repeat(offsets[:-1] - offsets[0], lengths)
+
+
+def diff(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Returns the change from the previous row, `NaN` on the first row of each segment."""
+
+    values = np.asarray(values, dtype=np.float64)
+    change = np.diff(values, prepend=np.nan)
+
+    starts = segment_starts(offsets=offsets)
+    change[starts] = np.nan
+
+    return change
+
+
+def shift(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Returns the value of the previous row, `NaN` on the first row of each segment."""
+
+    values = np.asarray(values, dtype=np.float64)
+    previous = np.concatenate(([np.nan], values[:-1]))
+
+    starts = segment_starts(offsets=offsets)
+    previous[starts] = np.nan
+
+    return previous
+
+
+def prefix_sums(values: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the cumulative sums every rolling window of a column can be read from.
+    Overview:
+    ----
+    A single cumulative sum runs over all the segments, so each window is the
+    difference of two sums. Values are centered on the first valid value of their segment
+    first, so the sums stay small and the difference keeps its precision. The sums
+    don't depend on the window, so windows of any length can share them.
+    Arguments:
+    ----
+    values {np.ndarray} -- The values of every segment, back to back.
+    offsets {np.ndarray} -- The row offsets of the segments, one more than there are segments.
+    Returns:
+    ----
+    {Tuple[np.ndarray, np.ndarray, np.ndarray]} -- The centered sums, the running count
+        of `NaN` values, both with a leading zero, and the value each row was centered on.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    # Center each segment on its first value.
+    first_values = _segment_centers(values=values, offsets=offsets)
+    missing = np.isnan(values)
+    centered = np.where(missing, 0.0, values - first_values)
+
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    missing_counts = np.concatenate(([0], np.cumsum(missing)))
+
+    return sums, missing_counts, first_values
+
+
+def prefix_squares(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Returns the cumulative sum of the squared values, centered like `prefix_sums`, with a leading zero."""
+
+    values = np.asarray(values, dtype=np.float64)
+
+    first_values = _segment_centers(values=values, offsets=offsets)
+    centered = np.nan_to_num(values - first_values, nan=0.0)
+
+    return np.concatenate(([0.0], np.cumsum(centered * centered)))
+
+
+def window_sum(sums: Tuple[np.ndarray, np.ndarray, np.ndarray], offsets: np.ndarray, window: int) -> np.ndarray:
+    """Returns the rolling sum of every segment from its `prefix_sums`, matching `rolling(window).sum()`."""
+
+    centered_sums, missing_counts, first_values = sums
+    rows = len(first_values)
+
+    result = np.full(rows, np.nan)
+
+    if rows < window or window < 1:
+        return result
+
+    totals = centered_sums[window:] - centered_sums[:-window] + window * first_values[window - 1:]
+    totals[missing_counts[window:] - missing_counts[:-window] > 0] = np.nan
+
+    result[window - 1:] = totals
+    result[_incomplete_windows(offsets=offsets, window=window)] = np.nan
+
+    return result
+
+
+def window_std(sums: Tuple[np.ndarray, np.ndarray, np.ndarray], squares: np.ndarray, offsets: np.ndarray,
+               window: int, ddof: int = 1) -> np.ndarray:
+    """Returns the rolling standard deviation of every segment, matching `rolling(window).std()`.
+    Arguments:
+    ----
+    sums {Tuple[np.ndarray, np.ndarray, np.ndarray]} -- The `prefix_sums` of the values.
+    squares {np.ndarray} -- The `prefix_squares` of the values.
+    offsets {np.ndarray} -- The row offsets of the segments, one more than there are segments.
+    window {int} -- The number of rows in the window.
+    Keyword Arguments:
+    ----
+    ddof {int} -- The delta degrees of freedom. (default: {1})
+    Returns:
+    ----
+    {np.ndarray} -- The rolling standard deviation.
+    """
+
+    centered_sums, missing_counts, first_values = sums
+    rows = len(first_values)
+
+    result = np.full(rows, np.nan)
+
+    if rows < window or window <= ddof:
+        return result
+
+    # The variance doesn't change when the values are centered.
+    totals = centered_sums[window:] - centered_sums[:-window]
+    squared_totals = squares[window:] - squares[:-window]
+
+    variance = np.maximum(squared_totals - totals * totals / window, 0.0) / (window - ddof)
+    variance[missing_counts[window:] - missing_counts[:-window] > 0] = np.nan
+
+    result[window - 1:] = np.sqrt(variance)
+    result[_incomplete_windows(offsets=offsets, window=window)] = np.nan
+
+    return result
+
+
+def rolling_max(values: np.ndarray, offsets: np.ndarray, window: int) -> np.ndarray:
+    """Returns the rolling maximum of every segment, matching `rolling(window).max()`."""
+
+    return _rolling_reduce(values=values, offsets=offsets, window=window, reduce=np.maximum, padding=-np.inf)
+
+
+def rolling_min(values: np.ndarray, offsets: np.ndarray, window: int) -> np.ndarray:
+    """Returns the rolling minimum of every segment, matching `rolling(window).min()`."""
+
+    return _rolling_reduce(values=values, offsets=offsets, window=window, reduce=np.minimum, padding=np.inf)
+
+
+def reset_cumsum(values: np.ndarray, resets: np.ndarray) -> np.ndarray:
+    """Returns the cumulative sum of the values, starting over at every row where `resets` is True.
+    Arguments:
+    ----
+    values {np.ndarray} -- The values to add up, `NaN` values count as zero.
+    resets {np.ndarray} -- A boolean mask of the rows where a new sum starts, for example
+        the first row of each symbol or session.
+    Returns:
+    ----
+    {np.ndarray} -- The running sums.
+    """
+
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+    sums = np.cumsum(values)
+
+    # The sum just before the start of each run, carried forward over the run.
+    last_reset = np.maximum.accumulate(np.where(resets, np.arange(len(values)), 0))
+    before = np.concatenate(([0.0], sums))[last_reset]
+
+    return sums - before
+
+
+def rolling_mean(values: np.ndarray, offsets: np.ndarray, window: int) -> np.ndarray:
+    """Returns the rolling mean of every segment, matching `rolling(window).mean()`.
+    Arguments:
+    ----
+    values {np.ndarray} -- The values of every segment, back to back.
+    offsets {np.ndarray} -- The row offsets of the segments, one more than there are segments.
+    window {int} -- The number of rows in the window.
+    Returns:
+    ----
+    {np.ndarray} -- The rolling mean, `NaN` until a segment has `window` rows or when
+        the window holds a `NaN` value.
+    """
+
+    sums = prefix_sums(values=values, offsets=offsets)
+
+    return window_sum(sums=sums, offsets=offsets, window=window) / window
+
+
+def decayed_sum(values: np.ndarray, offsets: np.ndarray, decay: Union[float, np.ndarray]) -> np.ndarray:
+    """Solves `z[t] = values[t] + decay * z[t - 1]` on every segment at once.
+    Overview:
+    ----
+    The segments are laid out as the rows of a padded 2D array, which is cut into
+    blocks of time. Inside a block the recurrence is a scaled cumulative sum, so it
+    runs for every symbol and every block in one step. Only the carry from one block
+    to the next is a Python loop, over the blocks and not over the rows. Passing an
+    array of decays solves the recurrence for all of them in the same steps.
+    Arguments:
+    ----
+    values {np.ndarray} -- The values of every segment, back to back.
+    offsets {np.ndarray} -- The row offsets of the segments, one more than there are segments.
+    decay {Union[float, np.ndarray]} -- The decay applied to the previous sum, between 0 and 1,
+        or an array of decays.
+    Returns:
+    ----
+    {np.ndarray} -- The decayed sums, restarting at the first row of each segment, with
+        one column per decay when `decay` is an array.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    decays = np.atleast_1d(np.asarray(decay, dtype=np.float64))
+
+    decaying = np.flatnonzero(decays > 0.0)
+
+    # Each decay is kept contiguous, without decay every sum is just the value.
+    if len(values) and len(decaying) == len(decays):
+        result = _decayed_sums(values=values, offsets=offsets, decays=decays)
+    else:
+        result = np.empty((len(decays), len(values)))
+        result[:] = values
+        if len(values) and len(decaying):
+            result[decaying] = _decayed_sums(values=values, offsets=offsets, decays=decays[decaying])
+
+    return result.T if np.ndim(decay) else result[0]
+
+
+def ewm_mean(values: np.ndarray, offsets: np.ndarray, span: Union[float, np.ndarray] = None,
+             alpha: Union[float, np.ndarray] = None, adjust: bool = True) -> np.ndarray:
+    """Returns the exponential moving average of every segment.
+    Overview:
+    ----
+    Matches `ewm(span=span, adjust=adjust).mean()`, or `ewm(alpha=alpha, ...)`, run
+    separately on each segment. The values should not hold `NaN` values. An array of
+    spans, or of alphas, computes every average in one batch.
+    Arguments:
+    ----
+    values {np.ndarray} -- The values of every segment, back to back.
+    offsets {np.ndarray} -- The row offsets of the segments, one more than there are segments.
+    Keyword Arguments:
+    ----
+    span {Union[float, np.ndarray]} -- The span of the average. (default: {None})
+    alpha {Union[float, np.ndarray]} -- The smoothing factor, used when no span is given. (default: {None})
+    adjust {bool} -- Divide by the decayed sum of the weights instead of running the
+        recursive form. (default: {True})
+    Returns:
+    ----
+    {np.ndarray} -- The moving average, with one column per span or alpha when they are an array.
+    """
+
+    if span is not None:
+        alpha = 2.0 / (np.asarray(span, dtype=np.float64) + 1.0)
+
+    batched = np.ndim(alpha) > 0
+    alphas = np.atleast_1d(np.asarray(alpha, dtype=np.float64))
+    decays = 1.0 - alphas
+
+    values = np.asarray(values, dtype=np.float64)
+    positions = segment_positions(offsets=offsets)[:, None]
+    sums = decayed_sum(values=values, offsets=offsets, decay=decays)
+
+    if adjust:
+        # The sum of the weights has a closed form.
+        averages = sums * alphas / (1.0 - decays ** (positions + 1))
+    else:
+        # The first row of each segment seeds the average.
+        lengths = segment_lengths(offsets=offsets)
+        first_values = np.repeat(values[segment_starts(offsets=offsets)], lengths[lengths > 0])
+        averages = alphas * sums + first_values[:, None] * decays ** (positions + 1)
+
+    return averages if batched else averages[:, 0]
+
+
+def _decayed_sums(values: np.ndarray, offsets: np.ndarray, decays: np.ndarray) -> np.ndarray:
+    """Solves the `decayed_sum` recurrence for decays between 0 and 1, one row per decay."""
+
+    padded, mask = _pad_segments(values=values, offsets=offsets)
+    segments, longest = padded.shape
+
+    # The longest block whose scale factors stay finite for every decay.
+    block_size = longest
+    smallest_decay = decays.min()
+    if smallest_decay < 1.0:
+        block_size = int(min(longest, max(1, MAX_BLOCK_SCALE / -np.log(smallest_decay))))
+
+    blocks = -(-longest // block_size)
+    padded = np.pad(padded, ((0, 0), (0, blocks * block_size - longest)))
+    padded = padded.reshape(1, segments, blocks, block_size)
+
+    powers = (decays[:, None] ** np.arange(block_size, dtype=np.float64))[:, None, None, :]
+
+    # The recurrence inside each block, as if the block started from zero.
+    sums = np.cumsum(padded / powers, axis=3) * powers
+
+    # Carry the last sum of each block into the next one.
+    carry_powers = powers[:, :, 0, :] * decays[:, None, None]
+    for block in range(1, blocks):
+        sums[:, :, block, :] += sums[:, :, block - 1, -1:] * carry_powers
+
+    sums = sums.reshape(len(decays), segments, -1)[:, :, :longest]
+
+    return sums[:, mask]
+
+
+def _segment_centers(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Returns the first value of each segment that isn't `NaN`, repeated over the rows of the segment."""
+
+    lengths = segment_lengths(offsets=offsets)
+    starts = segment_starts(offsets=offsets)
+
+    if not len(starts):
+        return np.empty(0)
+
+    rows = len(values)
+    valid_rows = np.where(np.isnan(values), rows, np.arange(rows))
+    first_valid = np.minimum.reduceat(valid_rows, starts)
+
+    centers = np.where(first_valid < rows, values[np.minimum(first_valid, rows - 1)], 0.0)
+
+    return np.repeat(centers, lengths[lengths > 0])
+
+
+def _incomplete_windows(offsets: np.ndarray, window: int) -> np.ndarray:
+    """Returns the rows whose window reaches back into the previous segment."""
+
+    lengths = segment_lengths(offsets=offsets)
+    rows = (offsets[:-1, None] - offsets[0]) + np.arange(window - 1)
+
+    return rows[np.arange(window - 1) < lengths[:, None]]
+
+
+def _rolling_reduce(values: np.ndarray, offsets: np.ndarray, window: int, reduce: np.ufunc,
+                    padding: float) -> np.ndarray:
+    """Reduces every full window of every segment with `reduce`, a window with a `NaN` value gives `NaN`.
+    Overview:
+    ----
+    The rows are cut into blocks of `window` rows, so every window is the end of
+    one block joined with the start of the next. Running the reduction forward and
+    backward through each block gives both parts, which costs O(N) no matter how
+    long the window is.
+    Arguments:
+    ----
+    values {np.ndarray} -- The values of every segment, back to back.
+    offsets {np.ndarray} -- The row offsets of the segments, one more than there are segments.
+    window {int} -- The number of rows in the window.
+    reduce {np.ufunc} -- The reduction, for example `np.maximum`.
+    padding {float} -- The identity of `reduce`, used to fill the last block.
+    Returns:
+    ----
+    {np.ndarray} -- The reduced windows, `NaN` until a segment has `window` rows.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+
+    if len(values) < window or window < 1:
+        return result
+
+    blocks = -(-len(values) // window)
+
+    padded = np.full(blocks * window, padding)
+    padded[:len(values)] = values
+    padded = padded.reshape(blocks, window)
+
+    # The reduction from the start of each block, and from each row to the end of its block.
+    forward = reduce.accumulate(padded, axis=1).ravel()
+    backward = reduce.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    result[window - 1:] = reduce(backward[:len(values) - window + 1], forward[window - 1:len(values)])
+    result[_incomplete_windows(offsets=offsets, window=window)] = np.nan
+
+    return result
+
+
+def _pad_segments(values: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Lays the segments out as the rows of a 2D array padded with zeros."""
+
+    lengths = segment_lengths(offsets=offsets)
+    longest = int(lengths.max()) if len(lengths) else 0
+
+    mask = np.arange(longest) < lengths[:, None]
+
+    padded = np.zeros((len(lengths), longest))
+    padded[mask] = values
+
+    return padded, mask
@@ -0,0 +1,502 @@
+import json
+import asyncio
+import threading
+
+import time as time_true
+import websockets
+
+from typing import Any
+from typing import List
+from typing import Dict
+from typing import Callable
+from typing import Optional
+
+from Bot.quote_aggregator import QuoteAggregator
+from Bot.resampler import BAR_TYPE_NANOSECONDS
+from Bot.stock_frame import StockFrame
+
+
+# The seconds `MarketStream` waits for messages before it checks for bars to close.
+RECEIVE_TIMEOUT = 1.0
+
+# The level one quote fields `TDStreamTransport` subscribes to, by the names `get_quotes` uses.
+QUOTE_FIELDS = {
+    '1': 'bidPrice',
+    '2': 'askPrice',
+    '3': 'lastPrice',
+    '4': 'bidSize',
+    '5': 'askSize',
+    '8': 'totalVolume',
+    '50': 'quoteTimeInLong',
+    '51': 'tradeTimeInLong'
+}
+
+# The quote fields that only change when a trade prints.
+TRADE_FIELDS = {'3', '8', '51'}
+
+# The chart fields `TDStreamTransport` subscribes to, by the names of a candle.
+CHART_FIELDS = {
+    '1': 'open',
+    '2': 'high',
+    '3': 'low',
+    '4': 'close',
+    '5': 'volume',
+    '7': 'datetime'
+}
+
+
+class StreamTransport():
+
+    """
+    Represents the connection a MarketStream reads from. A transport delivers
+    messages, each a dictionary with a `type` of `quote` or `bar` and a `symbol`.
+    Quotes carry the fields `get_quotes` returns, like `lastPrice`, `totalVolume`
+    and `tradeTimeInLong`. Bars carry the fields of a candle. Subclasses connect
+    to a broker, or replay recorded messages in tests.
+    """
+
+    def connect(self, symbols: List[str]) -> None:
+        """Opens the connection and subscribes to the symbols."""
+
+        pass
+
+    def receive(self, timeout: float) -> Optional[List[Dict]]:
+        """Waits for the next messages.
+        Arguments:
+        ----
+        timeout {float} -- The most seconds to wait.
+        Returns:
+        ----
+        {Optional[List[Dict]]} -- The messages that arrived, an empty list if none did
+            before the timeout, or `None` once the stream has ended.
+        """
+
+        raise NotImplementedError()
+
+    def clock(self) -> int:
+        """Returns the current time of the stream in milliseconds since epoch, the wall clock for live data."""
+
+        return int(time_true.time() * 1000)
+
+    def close(self) -> None:
+        """Closes the connection."""
+
+        pass
+
+
+class ReplayTransport(StreamTransport):
+
+    """
+    Represents a transport that replays recorded messages, so a recorded session
+    can stand in for the broker.
+    """
+
+    def __init__(self, messages: List[Dict] = None, path: str = None, speed: float = None, batch_size: int = 100) -> None:
+        """Initalizes the replay.
+        Keyword Arguments:
+        ----
+        messages {List[Dict]} -- The messages to replay, in order. (default: {None})
+        path {str} -- A file with one JSON message per line, read when `messages` isn't
+            given. (default: {None})
+        speed {float} -- Replays the gaps between the message timestamps this many times
+            faster than they happened, `None` replays without waiting. (default: {None})
+        batch_size {int} -- The most messages returned by one `receive`. (default: {100})
+        Usage:
+        ----
+            >>> transport = ReplayTransport(path='data/session.jsonl', speed=60.0)
+            >>> market_stream = trading_robot.new_market_stream(transport=transport, on_bar=on_bar)
+            >>> market_stream.run()
+        """
+
+        if messages is None:
+            with open(path, 'r') as replay_file:
+                messages = [json.loads(line) for line in replay_file if line.strip()]
+
+        self.speed = speed
+        self.batch_size = batch_size
+
+        self._messages = messages
+        self._position = 0
+        self._symbols = None
+        self._clock: int = None
+
+    def connect(self, symbols: List[str]) -> None:
+        """Replays only the messages of the subscribed symbols, every message if `symbols` is empty."""
+
+        self._symbols = set(symbols) if symbols else None
+
+    def receive(self, timeout: float) -> Optional[List[Dict]]:
+
+        if self._position >= len(self._messages):
+            return None
+
+        batch = []
+
+        while self._position < len(self._messages) and len(batch) < self.batch_size:
+
+            message = self._messages[self._position]
+            timestamp = message_timestamp(message=message)
+
+            # Return what we have before waiting for a later message.
+            if self.speed and self._clock is not None and timestamp > self._clock:
+
+                if batch:
+                    break
+
+                delay = (timestamp - self._clock) / 1000 / self.speed
+
+                if delay > timeout:
+                    time_true.sleep(timeout)
+                    self._clock += int(timeout * self.speed * 1000)
+                    return batch
+
+                time_true.sleep(delay)
+
+            self._position += 1
+            self._clock = timestamp if self._clock is None else max(self._clock, timestamp)
+
+            if self._symbols is None or message['symbol'] in self._symbols:
+                batch.append(message)
+
+        return batch
+
+    def clock(self) -> int:
+        """Returns the time of the replay, the timestamp of the last message replayed."""
+
+        if self._clock is None:
+            return super().clock()
+
+        return self._clock
+
+
+class TDStreamTransport(StreamTransport):
+
+    """
+    Represents the TD Ameritrade streaming API as a transport. It subscribes
+    to the one minute chart bars or the level one quotes of the symbols, turns
+    the numbered fields of each update into the messages a MarketStream reads,
+    and connects again whenever the socket drops.
+    """
+
+    def __init__(self, session: Any, source: str = 'chart', reconnect_delay: float = 1.0,
+                 max_reconnect_delay: float = 30.0) -> None:
+        """Initalizes the transport, the socket opens on `connect`.
+        Arguments:
+        ----
+        session {TDClient} -- A logged in session, or the robot's `ThrottledSession`.
+        Keyword Arguments:
+        ----
+        source {str} -- `chart` streams the finished one minute bars, `quotes` streams
+            the quotes so the MarketStream builds the bars, of any size. (default: {'chart'})
+        reconnect_delay {float} -- The seconds to wait before the first reconnect. (default: {1.0})
+        max_reconnect_delay {float} -- The longest wait between reconnects, the wait
+            doubles after every failed attempt. (default: {30.0})
+        Usage:
+        ----
+            >>> transport = TDStreamTransport(session=trading_robot.session)
+            >>> market_stream = trading_robot.new_market_stream(transport=transport, on_bar=on_bar)
+            >>> market_stream.start()
+        """
+
+        if source not in ('chart', 'quotes'):
+            raise ValueError("The source must be `chart` or `quotes`, not {source}.".format(source=source))
+
+        self.session = session
+        self.source = source
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        # The times the socket dropped and was opened again.
+        self.reconnects = 0
+
+        self._symbols: List[str] = []
+        self._loop: asyncio.AbstractEventLoop = None
+        self._connection = None
+
+        # The latest quote of each symbol, updates only carry the fields that changed.
+        self._quotes: Dict[str, Dict] = {}
+
+        self._delay = reconnect_delay
+        self._retry_at: float = None
+
+    def connect(self, symbols: List[str]) -> None:
+        """Opens the socket in the calling thread, with an event loop of its own."""
+
+        self._symbols = list(symbols)
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        self._open()
+
+    def _open(self) -> None:
+        """Logs in to the streamer and subscribes to the bars or the quotes of the symbols."""
+
+        streaming_session = self.session.create_streaming_session()
+
+        if self.source == 'quotes':
+            streaming_session.level_one_quotes(symbols=self._symbols, fields=[int(field) for field in QUOTE_FIELDS])
+        else:
+            streaming_session.chart(
+                service='CHART_EQUITY',
+                symbols=self._symbols,
+                fields=[int(field) for field in CHART_FIELDS]
+            )
+
+        self._connection = self._loop.run_until_complete(streaming_session.build_pipeline())
+
+        self._delay = self.reconnect_delay
+        self._retry_at = None
+
+    def receive(self, timeout: float) -> Optional[List[Dict]]:
+        """Waits for the next update, while the socket is down it tries to connect again."""
+
+        if self._connection is None:
+            return self._reconnect(timeout=timeout)
+
+        try:
+            message = self._loop.run_until_complete(asyncio.wait_for(self._connection.recv(), timeout=timeout))
+        except asyncio.TimeoutError:
+            return []
+        except (websockets.exceptions.ConnectionClosed, OSError):
+            self._drop()
+            return []
+
+        return self.translate(message=json.loads(message))
+
+    def _drop(self) -> None:
+        """Forgets a dead socket and schedules the reconnect."""
+
+        self._connection = None
+        self._retry_at = time_true.monotonic() + self._delay
+
+    def _reconnect(self, timeout: float) -> List[Dict]:
+        """Connects again once the backoff has passed, waiting at most `timeout` seconds for it."""
+
+        wait = self._retry_at - time_true.monotonic()
+
+        if wait > timeout:
+            time_true.sleep(timeout)
+            return []
+
+        time_true.sleep(max(wait, 0.0))
+
+        try:
+            self._open()
+            self.reconnects += 1
+        except Exception:
+            self._delay = min(self._delay * 2, self.max_reconnect_delay)
+            self._drop()
+
+        return []
+
+    def translate(self, message: Dict) -> List[Dict]:
+        """Turns a message from the streamer into quote and bar messages.
+        Overview:
+        ----
+        Quote updates are merged into the latest quote of their symbol, and a quote
+        message is only returned when a trade field changed, so bid and ask updates
+        don't touch the bars. Each chart update becomes a bar message. Heartbeats
+        and responses to requests return nothing.
+        Arguments:
+        ----
+        message {Dict} -- The decoded message.
+        Returns:
+        ----
+        {List[Dict]} -- The quote and bar messages, in the order they came.
+        """
+
+        messages = []
+
+        for data in message.get('data', []):
+
+            for content in data.get('content', []):
+
+                symbol = content.get('key')
+
+                if data.get('service') == 'QUOTE':
+
+                    quote = self._quotes.setdefault(symbol, {'type': 'quote', 'symbol': symbol})
+                    quote.update({
+                        name: content[field] for field, name in QUOTE_FIELDS.items() if field in content
+                    })
+
+                    if TRADE_FIELDS.intersection(content) and quote.get('lastPrice') is not None and (
+                            quote.get('tradeTimeInLong') or quote.get('quoteTimeInLong')):
+                        messages.append(dict(quote))
+
+                elif data.get('service') == 'CHART_EQUITY':
+
+                    bar = {'type': 'bar', 'symbol': symbol}
+                    bar.update({name: content[field] for field, name in CHART_FIELDS.items()})
+                    messages.append(bar)
+
+        return messages
+
+    def close(self) -> None:
+
+        if self._connection is not None:
+            self._loop.run_until_complete(self._connection.close())
+            self._connection = None
+
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+
+class MarketStream():
+
+    """
+    Represents a long-lived consumer that pushes streamed quotes and bars into a
+    StockFrame as they arrive. Quotes are built into bars by a QuoteAggregator,
+    and every time bars close the `on_bar` callback runs, so indicators and
+    signals react as soon as a bar is done instead of after the next poll.
+    """
+
+    def __init__(self, stock_frame: StockFrame, transport: StreamTransport, symbols: List[str],
+                 on_bar: Callable[[List[Dict]], None] = None, bar_size: int = 1, bar_type: str = 'minute') -> None:
+        """Initalizes the stream.
+        Arguments:
+        ----
+        stock_frame {StockFrame} -- The StockFrame the bars are added to.
+        transport {StreamTransport} -- The connection the messages come from.
+        symbols {List[str]} -- The symbols to subscribe to.
+        Keyword Arguments:
+        ----
+        on_bar {Callable[[List[Dict]], None]} -- Called with the bars that closed, after
+            they were added to the StockFrame. (default: {None})
+        bar_size {int} -- The number of `bar_type` units in one bar. (default: {1})
+        bar_type {str} -- One of `minute`, `hour` or `daily`. (default: {'minute'})
+        """
+
+        self.stock_frame = stock_frame
+        self.transport = transport
+        self.symbols = list(symbols)
+        self.on_bar = on_bar
+
+        self.quote_aggregator = QuoteAggregator(
+            stock_frame=stock_frame,
+            bar_size=bar_size,
+            bar_type=bar_type
+        )
+
+        # The newest message timestamp, the stream's clock in milliseconds.
+        self.last_timestamp: int = None
+
+        # Quotes before the start of the current bar are late, their bar already closed.
+        self.late_quotes = 0
+        self._bar_milliseconds = bar_size * BAR_TYPE_NANOSECONDS[bar_type] // 1_000_000
+        self._watermark = 0
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread = None
+
+    def run(self) -> None:
+        """Reads messages until the stream ends or `stop` is called.
+        Overview:
+        ----
+        Everything, including the `on_bar` callback, runs in the calling thread,
+        so the StockFrame is never written from two threads at once. A bar closes
+        when a message from a later bar arrives, from any symbol, or when the
+        transport's clock passes its end while the stream is quiet. When the stream ends,
+        the bars still open are closed.
+        """
+
+        self.transport.connect(symbols=self.symbols)
+
+        try:
+            while not self._stop.is_set():
+
+                messages = self.transport.receive(timeout=RECEIVE_TIMEOUT)
+
+                if messages is None:
+                    self._finish(bars=self.quote_aggregator.close_bars())
+                    break
+
+                if messages:
+                    self.process(messages=messages)
+                else:
+                    self._finish(bars=self.quote_aggregator.close_bars(timestamp=self.transport.clock()))
+
+        finally:
+            self.transport.close()
+
+    def start(self) -> threading.Thread:
+        """Runs the stream in a background thread, `on_bar` then runs in that thread too."""
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='market-stream', daemon=True)
+        self._thread.start()
+
+        return self._thread
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops the stream after the messages being processed."""
+
+        self._stop.set()
+
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def process(self, messages: List[Dict]) -> List[Dict]:
+        """Adds a batch of messages to the StockFrame.
+        Arguments:
+        ----
+        messages {List[Dict]} -- The quote and bar messages, in the order they arrived.
+        Returns:
+        ----
+        {List[Dict]} -- The bars that closed.
+        """
+
+        closed_bars = []
+        streamed_bars = []
+        quotes = {}
+
+        for message in messages:
+
+            self.last_timestamp = max(self.last_timestamp or 0, message_timestamp(message=message))
+
+            if message['type'] == 'bar':
+                streamed_bars.append({key: value for key, value in message.items() if key != 'type'})
+                continue
+
+            if message_timestamp(message=message) < self._watermark:
+                self.late_quotes += 1
+                continue
+
+            # A second quote for a symbol waits until the first is folded in.
+            if message['symbol'] in quotes:
+                closed_bars += self.quote_aggregator.add_quotes(quotes=quotes)
+                quotes = {}
+
+            quotes[message['symbol']] = message
+
+        if quotes:
+            closed_bars += self.quote_aggregator.add_quotes(quotes=quotes)
+
+        # The streamed bars are complete, they go into the StockFrame in one batch.
+        if streamed_bars:
+            self.stock_frame.add_rows(data=streamed_bars)
+            closed_bars += streamed_bars
+
+        # Quiet symbols close once the stream has moved past their bar.
+        closed_bars += self.quote_aggregator.close_bars(timestamp=self.last_timestamp)
+        self._watermark = self.last_timestamp - self.last_timestamp % self._bar_milliseconds
+
+        self._finish(bars=closed_bars)
+
+        return closed_bars
+
+    def _finish(self, bars: List[Dict]) -> None:
+
+        if bars and self.on_bar:
+            self.on_bar(bars)
+
+
+def message_timestamp(message: Dict) -> int:
+    """Returns the time of a message in milliseconds since epoch."""
+
+    if message['type'] == 'bar':
+        return message['datetime']
+
+    return message.get('tradeTimeInLong') or message['quoteTimeInLong']
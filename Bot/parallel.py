@@ -0,0 +1,255 @@
+import os
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List
+from typing import Dict
+from typing import Tuple
+
+
+# The price columns the indicators read.
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Each worker gets a few shards, so a slow shard doesn't hold up the others.
+SHARDS_PER_WORKER = 4
+
+# Below this many bars the round trip to the pool costs more than it saves.
+MIN_PARALLEL_ROWS = 100_000
+
+
+class SharedColumns():
+
+    """
+    Represents a set of equally long columns copied into shared memory, so
+    worker processes can map them by name instead of receiving a pickled copy.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]) -> None:
+        """Copies the columns into new shared memory blocks.
+        Arguments:
+        ----
+        columns {Dict[str, np.ndarray]} -- The columns to share.
+        """
+
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+
+        for column_name, values in columns.items():
+
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+
+            self._blocks[column_name] = block
+            self.arrays[column_name] = np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)
+            self.arrays[column_name][:] = values
+
+    @property
+    def descriptor(self) -> Dict[str, tuple]:
+        """Returns what a worker needs to map the columns, the block name, dtype and length of each."""
+
+        return {
+            column_name: (self._blocks[column_name].name, values.dtype.str, len(values))
+            for column_name, values in self.arrays.items()
+        }
+
+    @staticmethod
+    def attach(descriptor: Dict[str, tuple]) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+        """Maps the columns of a descriptor in a worker process.
+        Returns:
+        ----
+        {Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]} -- The columns and the
+            blocks, which the worker closes once it no longer uses the columns.
+        """
+
+        arrays = {}
+        blocks = []
+
+        for column_name, (block_name, dtype, rows) in descriptor.items():
+
+            # Pool workers share the parent's resource tracker, which unlinks the block once.
+            block = shared_memory.SharedMemory(name=block_name)
+
+            blocks.append(block)
+            arrays[column_name] = np.ndarray((rows,), dtype=np.dtype(dtype), buffer=block.buf)
+
+        return arrays, blocks
+
+    def close(self) -> None:
+        """Releases the shared memory blocks."""
+
+        self.arrays.clear()
+
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+
+        self._blocks.clear()
+
+
+class ParallelIndicators():
+
+    """
+    Represents a process pool that computes indicators over the full history,
+    with the symbols split into shards. Each symbol's series is independent,
+    so the shards need nothing from each other.
+    """
+
+    def __init__(self, workers: int = None) -> None:
+        """Initalizes the pool, the worker processes start on first use.
+        Keyword Arguments:
+        ----
+        workers {int} -- The number of worker processes. (default: {None}, one per core)
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    def compute(self, stock_frame, indicators: List[Tuple[str, str, Dict]], column_names: List[str],
+                carried: List[str] = None) -> Tuple[Dict[str, np.ndarray], Dict[str, Dict]]:
+        """Computes indicators for every symbol, one shard of symbols per task.
+        Overview:
+        ----
+        The bars are copied once into shared memory. Each worker builds its shard
+        from them, adds the indicators with the same method calls and arguments,
+        and writes its rows of every indicator column straight into shared output
+        columns. Only the shard bounds, the calls and the running states of the
+        indicators travel through pickling.
+        Arguments:
+        ----
+        stock_frame {StockFrame} -- The StockFrame holding the bars.
+        indicators {List[Tuple[str, str, Dict]]} -- The name, `Indicators` method and
+            keyword arguments of each indicator.
+        column_names {List[str]} -- The columns the indicators write.
+        Keyword Arguments:
+        ----
+        carried {List[str]} -- The columns of running sums, like the OBV, that carry on
+            from their current values, which are shared with the workers. (default: {None})
+        Returns:
+        ----
+        {Tuple[Dict[str, np.ndarray], Dict[str, Dict]]} -- The values of every column, in
+            frame order, and the running state of each symbol for each indicator.
+        """
+
+        frame = stock_frame.frame
+        offsets = stock_frame.symbol_offsets
+        symbols = stock_frame.symbols
+
+        inputs = {
+            column_name: frame[column_name].to_numpy(dtype=np.float64)
+            for column_name in PRICE_COLUMNS + (carried or []) if column_name in frame.columns
+        }
+        inputs['datetime'] = frame.index.get_level_values('datetime').to_numpy().view(np.int64)
+
+        shared_inputs = SharedColumns(columns=inputs)
+        shared_outputs = SharedColumns(columns={
+            column_name: np.full(len(frame), np.nan) for column_name in column_names
+        })
+
+        states = {name: {} for name, _, _ in indicators}
+
+        try:
+            tasks = [
+                (
+                    shared_inputs.descriptor,
+                    shared_outputs.descriptor,
+                    [symbols[position] for position in shard],
+                    int(offsets[shard[0]]),
+                    np.diff(offsets[shard[0]:shard[-1] + 2]).tolist(),
+                    indicators
+                )
+                for shard in self._shards(offsets=offsets)
+            ]
+
+            for shard_states in self._pool().map(_compute_shard, tasks):
+                for name, symbol_states in shard_states.items():
+                    states[name].update(symbol_states)
+
+            return {
+                column_name: values.copy() for column_name, values in shared_outputs.arrays.items()
+            }, states
+
+        finally:
+            shared_inputs.close()
+            shared_outputs.close()
+
+    def _shards(self, offsets: np.ndarray) -> List[List[int]]:
+        """Splits the symbols into contiguous shards with about the same number of rows."""
+
+        symbol_count = len(offsets) - 1
+        shard_count = max(1, min(symbol_count, self.workers * SHARDS_PER_WORKER))
+
+        # Cut where the running row count crosses each shard boundary.
+        bounds = np.searchsorted(
+            offsets[1:],
+            np.linspace(0, offsets[-1], shard_count + 1)[1:-1],
+            side='left'
+        )
+        edges = np.unique(np.concatenate(([0], bounds + 1, [symbol_count])))
+
+        return [
+            list(range(first, last)) for first, last in zip(edges[:-1], edges[1:]) if last > first
+        ]
+
+    def _pool(self) -> ProcessPoolExecutor:
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        return self._executor
+
+    def close(self) -> None:
+        """Stops the worker processes."""
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _compute_shard(task: tuple) -> Dict[str, Dict]:
+    """Computes the indicators over one shard of symbols in a worker process.
+    Returns:
+    ----
+    {Dict[str, Dict]} -- The running state of each symbol, for each indicator.
+    """
+
+    # Imported here, the Indicators import this module.
+    from Bot.indicator import Indicators
+    from Bot.stock_frame import StockFrame
+
+    input_descriptor, output_descriptor, symbols, start, lengths, indicators = task
+    end = start + sum(lengths)
+
+    inputs, input_blocks = SharedColumns.attach(descriptor=input_descriptor)
+    outputs, output_blocks = SharedColumns.attach(descriptor=output_descriptor)
+
+    try:
+        stock_frame = StockFrame(data=[])
+        stock_frame.add_arrays(
+            symbols=np.repeat(np.array(symbols, dtype=object), lengths),
+            timestamps=inputs['datetime'][start:end],
+            values={
+                column_name: values[start:end]
+                for column_name, values in inputs.items() if column_name != 'datetime'
+            }
+        )
+
+        indicator_client = Indicators(price_data_frame=stock_frame)
+
+        with indicator_client.batch():
+            for _, method, arguments in indicators:
+                getattr(indicator_client, method)(**arguments)
+
+        # The shard keeps the symbol and timestamp order of the full frame.
+        frame = stock_frame.frame
+        for column_name, values in outputs.items():
+            values[start:end] = frame[column_name].to_numpy(dtype=np.float64)
+
+        return {name: indicator_client.stream(indicator=name).states for name, _, _ in indicators}
+
+    finally:
+        inputs.clear()
+        outputs.clear()
+
+        for block in input_blocks + output_blocks:
+            block.close()
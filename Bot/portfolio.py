@@ -1,12 +1,15 @@
 import numpy as np
 
+from datetime import datetime as dt
 from pandas import DataFrame
 from typing import Tuple
 from typing import List
 from typing import Optional
 
 
-from pyrobot.stock_frame import StockFrame
+from Bot.candle_cache import CandleCache
+from Bot.candle_cache import FREQUENCY_MILLISECONDS
+from Bot.stock_frame import StockFrame
 from td.client import TDClient
 
 
@@ -34,6 +37,9 @@ class Portfolio():
         self._stock_frame: StockFrame = None
         self._stock_frame_daily: StockFrame = None
 
+        # Keeps the daily candles on disk between runs, if set.
+        self.candle_cache: CandleCache = None
+
     def add_positions(self, positions: List[dict]) -> dict:
         """Add Multiple positions to the portfolio at once.
 
@@ -628,6 +634,10 @@ class Portfolio():
     def _grab_daily_historical_prices(self) -> StockFrame:
         """Grabs the daily historical prices for each position.
 
+        Overview:
+        ----
+        With a candle cache, only the days it doesn't cover yet are requested.
+
         Returns:
         ----
         {StockFrame} -- A StockFrame object with data organized, grouped, and sorted.
@@ -635,21 +645,43 @@ class Portfolio():
 
         new_prices = []
 
+        # One year of daily candles.
+        end = int(dt.now().timestamp() * 1000)
+        start = end - 365 * FREQUENCY_MILLISECONDS['daily']
+
         # Loop through each position.
         for symbol in self.positions:
 
             # Grab the historical prices.
-            historical_prices_response = self.td_client.get_price_history(
-                symbol=symbol,
-                period_type='year',
-                period=1,
-                frequency_type='daily',
-                frequency=1,
-                extended_hours=True
-            )
+            if self.candle_cache:
+                candles = self.candle_cache.grab(
+                    symbol=symbol,
+                    frequency_type='daily',
+                    frequency=1,
+                    start=start,
+                    end=end,
+                    fetch=lambda range_start, range_end, symbol=symbol: self.td_client.get_price_history(
+                        symbol=symbol,
+                        period_type='year',
+                        start_date=str(range_start),
+                        end_date=str(range_end),
+                        frequency_type='daily',
+                        frequency=1,
+                        extended_hours=True
+                    )['candles']
+                )
+            else:
+                candles = self.td_client.get_price_history(
+                    symbol=symbol,
+                    period_type='year',
+                    period=1,
+                    frequency_type='daily',
+                    frequency=1,
+                    extended_hours=True
+                )['candles']
 
             # Loop through the chandles.
-            for candle in historical_prices_response['candles']:
+            for candle in candles:
 
                 new_price_mini_dict = {}
                 new_price_mini_dict['symbol'] = symbol
@@ -663,6 +695,5 @@ class Portfolio():
 
         # Create and set the StockFrame
         self._stock_frame_daily = StockFrame(data=new_prices)
-        self._stock_frame_daily.create_frame()
 
         return self._stock_frame_daily
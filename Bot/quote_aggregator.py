@@ -0,0 +1,171 @@
+import numpy as np
+
+from typing import List
+from typing import Dict
+
+from Bot.resampler import BAR_TYPE_NANOSECONDS
+from Bot.indicator_stream import session_ids
+from Bot.stock_frame import StockFrame
+
+
+class QuoteAggregator():
+
+    """
+    Represents a streaming aggregator that turns quote snapshots, like the
+    ones returned by `get_quotes`, into OHLCV bars and adds each bar to a
+    StockFrame once its bucket closes.
+    """
+
+    def __init__(self, stock_frame: StockFrame, bar_size: int = 1, bar_type: str = 'minute') -> None:
+        """Initalizes the aggregator.
+        Arguments:
+        ----
+        stock_frame {StockFrame} -- The StockFrame the finished bars are added to.
+        Keyword Arguments:
+        ----
+        bar_size {int} -- The number of `bar_type` units in one bar. (default: {1})
+        bar_type {str} -- One of `minute`, `hour` or `daily`. (default: {'minute'})
+        Usage:
+        ----
+            >>> aggregator = QuoteAggregator(stock_frame=stock_frame)
+            >>> while True:
+                    quotes = trading_robot.updated_quote()
+                    new_bars = aggregator.add_quotes(quotes=quotes)
+        """
+
+        self._stock_frame = stock_frame
+        self._bucket_size = bar_size * BAR_TYPE_NANOSECONDS[bar_type]
+
+        # The open bar of each symbol, and the time and cumulative volume of the last snapshot we used.
+        self._open_bars: Dict[str, Dict] = {}
+        self._timestamps: Dict[str, int] = {}
+        self._total_volume: Dict[str, float] = {}
+
+    @property
+    def open_bars(self) -> Dict[str, Dict]:
+        """Returns the bars that are still being built, keyed by symbol."""
+
+        return self._open_bars
+
+    def add_quotes(self, quotes: Dict[str, Dict]) -> List[Dict]:
+        """Folds a batch of quote snapshots into the open bars.
+        Overview:
+        ----
+        Each snapshot updates the high, low and close of its symbol's open bar with
+        the last price. Volume is the change in the cumulative `totalVolume` since
+        the previous snapshot, so polling faster never counts the same shares twice.
+        A drop in `totalVolume` only starts over when the snapshot is in a later
+        session, otherwise it adds nothing. When a snapshot lands in a later bucket,
+        the open bar is finished and added to the StockFrame in one batch with the
+        other finished bars. Snapshots without a last price or a time, and snapshots
+        older than the last one of their symbol, are skipped.
+        Arguments:
+        ----
+        quotes {Dict[str, Dict]} -- The quote snapshots keyed by symbol.
+        Returns:
+        ----
+        {List[Dict]} -- The bars that were finished by this batch.
+        """
+
+        finished_bars = []
+
+        for symbol, quote in quotes.items():
+
+            timestamp = quote.get('tradeTimeInLong') or quote.get('quoteTimeInLong')
+            price = quote.get('lastPrice')
+
+            if price is None or not timestamp:
+                continue
+
+            # Out of order snapshots, from a slow poll or a late message, are stale.
+            last_timestamp = self._timestamps.get(symbol)
+
+            if last_timestamp is not None and timestamp < last_timestamp:
+                continue
+
+            bucket = self._bucket(timestamp=timestamp)
+
+            # The volume traded since the previous snapshot.
+            total_volume = quote.get('totalVolume', 0)
+            last_total_volume = self._total_volume.get(symbol)
+
+            if last_total_volume is None:
+                volume = 0
+            elif total_volume >= last_total_volume:
+                volume = total_volume - last_total_volume
+            elif self._session(timestamp=timestamp) > self._session(timestamp=last_timestamp):
+                volume = total_volume
+            else:
+                volume = 0
+                total_volume = last_total_volume
+
+            self._timestamps[symbol] = timestamp
+            self._total_volume[symbol] = total_volume
+
+            open_bar = self._open_bars.get(symbol)
+
+            if open_bar and bucket > open_bar['datetime']:
+                finished_bars.append(self._open_bars.pop(symbol))
+                open_bar = None
+
+            if open_bar is None:
+                self._open_bars[symbol] = {
+                    'symbol': symbol,
+                    'open': price,
+                    'high': price,
+                    'low': price,
+                    'close': price,
+                    'volume': volume,
+                    'datetime': bucket
+                }
+            else:
+                open_bar['high'] = max(open_bar['high'], price)
+                open_bar['low'] = min(open_bar['low'], price)
+                open_bar['close'] = price
+                open_bar['volume'] += volume
+
+        if finished_bars:
+            self._stock_frame.add_rows(data=finished_bars)
+
+        return finished_bars
+
+    def close_bars(self, timestamp: int = None) -> List[Dict]:
+        """Finishes the open bars whose bucket ended before a point in time.
+        Overview:
+        ----
+        Bars normally close when the next snapshot arrives. Call this at the bar
+        boundary, or at the end of the session, to close quiet symbols too.
+        Keyword Arguments:
+        ----
+        timestamp {int} -- The current time in milliseconds since epoch. (default: {None},
+            which closes every open bar)
+        Returns:
+        ----
+        {List[Dict]} -- The bars that were finished.
+        """
+
+        finished_bars = []
+
+        for symbol in list(self._open_bars):
+
+            open_bar = self._open_bars[symbol]
+
+            if timestamp is None or self._bucket(timestamp=timestamp) > open_bar['datetime']:
+                finished_bars.append(self._open_bars.pop(symbol))
+
+        if finished_bars:
+            self._stock_frame.add_rows(data=finished_bars)
+
+        return finished_bars
+
+    def _bucket(self, timestamp: int) -> int:
+        """Returns the start of the bucket, in milliseconds, a timestamp in milliseconds falls in."""
+
+        nanoseconds = np.int64(timestamp) * 1_000_000
+
+        return int((nanoseconds - nanoseconds % self._bucket_size) // 1_000_000)
+
+    def _session(self, timestamp: int) -> int:
+        """Returns the trading session a timestamp in milliseconds falls in."""
+
+        return int(session_ids(timestamps=np.int64(timestamp) * 1_000_000))
@@ -0,0 +1,293 @@
+import random
+import threading
+
+import time as time_true
+
+import requests
+
+from concurrent.futures import Future
+from typing import Any
+from typing import Dict
+from typing import Tuple
+from typing import Callable
+
+from td.exceptions import ExdLmtError
+from td.exceptions import ServerError
+
+
+# The class of each TDClient method, methods that aren't listed are `account` calls.
+ENDPOINT_CLASSES = {
+    'get_price_history': 'market_data',
+    'get_quotes': 'market_data',
+    'search_instruments': 'market_data',
+    'get_instruments': 'market_data',
+    'get_market_hours': 'market_data',
+    'get_movers': 'market_data',
+    'get_options_chain': 'market_data',
+    'place_order': 'orders',
+    'modify_order': 'orders',
+    'cancel_order': 'orders',
+    'create_saved_order': 'orders',
+    'cancel_saved_order': 'orders'
+}
+
+# The read-only methods. Only these are retried and shared, a retry of anything
+# else, like an order or a watchlist, could make the same change twice.
+SAFE_METHODS = {
+    'get_accounts',
+    'get_instruments',
+    'get_market_hours',
+    'get_movers',
+    'get_options_chain',
+    'get_orders',
+    'get_orders_path',
+    'get_orders_query',
+    'get_preferences',
+    'get_price_history',
+    'get_quotes',
+    'get_saved_order',
+    'get_streamer_subscription_keys',
+    'get_transactions',
+    'get_user_principals',
+    'get_watchlist',
+    'get_watchlist_accounts',
+    'search_instruments'
+}
+
+# The errors that can go away on their own, a rate limit, a server error or a network failure.
+RETRYABLE_ERRORS = (
+    ExdLmtError,
+    ServerError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout
+)
+
+# The requests per second and the burst size of the whole account, TD allows about 120 a minute.
+GLOBAL_RATE = (2.0, 10)
+
+# The requests per second and the burst size of each endpoint class, limits inside `GLOBAL_RATE`.
+ENDPOINT_RATES = {
+    'market_data': (2.0, 10),
+    'orders': (2.0, 4),
+    'account': (1.0, 4)
+}
+
+
+class TokenBucket():
+
+    """
+    Represents a token bucket, which lets requests through at a steady rate
+    while allowing short bursts up to the size of the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """Initalizes a full bucket.
+        Arguments:
+        ----
+        rate {float} -- The tokens added per second.
+        capacity {int} -- The most tokens the bucket holds, the largest burst.
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._updated = time_true.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes a token, waiting for one if the bucket is empty.
+        Returns:
+        ----
+        {float} -- The seconds spent waiting.
+        """
+
+        waited = 0.0
+
+        while True:
+
+            with self._lock:
+
+                now = time_true.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+
+                delay = (1.0 - self._tokens) / self.rate
+
+            time_true.sleep(delay)
+            waited += delay
+
+
+class ThrottledSession():
+
+    """
+    Represents a TDClient behind a shared scheduling layer. Every call takes a
+    token from the bucket of its endpoint class and then from the bucket of the
+    whole account, so the classes together stay under the account limit. Read-only
+    calls that fail with a rate limit, a server error or a network failure are
+    retried with jittered exponential backoff, and identical read-only calls that
+    are already in flight share one request. Every other call is sent once. Any
+    attribute that isn't a method is passed through untouched.
+    """
+
+    def __init__(self, session: Any, rates: Dict[str, Tuple[float, int]] = None, global_rate: Tuple[float, int] = GLOBAL_RATE,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 8.0) -> None:
+        """Initalizes the scheduling layer.
+        Arguments:
+        ----
+        session {TDClient} -- The session to call.
+        Keyword Arguments:
+        ----
+        rates {Dict[str, Tuple[float, int]]} -- The requests per second and the burst size
+            of each endpoint class. (default: {None}, `ENDPOINT_RATES`)
+        global_rate {Tuple[float, int]} -- The requests per second and the burst size
+            shared by every class. (default: {GLOBAL_RATE})
+        max_retries {int} -- The most retries of a read-only call that failed with a transient error. (default: {3})
+        backoff {float} -- The largest delay before the first retry, in seconds. (default: {0.5})
+        max_backoff {float} -- The largest delay before any retry, in seconds. (default: {8.0})
+        Usage:
+        ----
+            >>> session = ThrottledSession(session=td_client)
+            >>> session.get_quotes(instruments=['MSFT', 'AAPL'])
+            >>> session.counters
+            {'calls': 1, 'requests': 1, 'throttled': 0, 'retried': 0, 'coalesced': 0, 'failed': 0}
+        """
+
+        self.session = session
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._buckets = {
+            endpoint: TokenBucket(rate=rate, capacity=capacity)
+            for endpoint, (rate, capacity) in dict(ENDPOINT_RATES, **(rates or {})).items()
+        }
+        self._global_bucket = TokenBucket(rate=global_rate[0], capacity=global_rate[1])
+
+        self._in_flight: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'calls': 0,
+            'requests': 0,
+            'throttled': 0,
+            'retried': 0,
+            'coalesced': 0,
+            'failed': 0
+        }
+
+    def __getattr__(self, name: str) -> Any:
+
+        attribute = getattr(self.session, name)
+
+        if not callable(attribute):
+            return attribute
+
+        def scheduled(*args, **kwargs) -> Any:
+            return self.call(name, *args, **kwargs)
+
+        return scheduled
+
+    def _count(self, counter: str) -> None:
+
+        with self._lock:
+            self.counters[counter] += 1
+
+    def call(self, name: str, /, *args, **kwargs) -> Any:
+        """Calls a method of the session through the scheduling layer.
+        Arguments:
+        ----
+        name {str} -- The name of the method, for example `get_price_history`.
+        Returns:
+        ----
+        {Any} -- What the method returned.
+        """
+
+        endpoint = ENDPOINT_CLASSES.get(name, 'account')
+        function = getattr(self.session, name)
+
+        self._count(counter='calls')
+
+        if name not in SAFE_METHODS:
+            return self._request(endpoint=endpoint, function=function, args=args, kwargs=kwargs, retries=0)
+
+        key = (name, repr(args), repr(sorted(kwargs.items())))
+
+        # Join an identical call that is already in flight.
+        with self._lock:
+
+            future = self._in_flight.get(key)
+            leader = future is None
+
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._request(
+                endpoint=endpoint,
+                function=function,
+                args=args,
+                kwargs=kwargs,
+                retries=self.max_retries
+            ))
+        except Exception as error:
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+        return future.result()
+
+    def _request(self, endpoint: str, function: Callable[..., Any], args: tuple, kwargs: dict, retries: int) -> Any:
+        """Sends a request, retrying transient failures with jittered exponential backoff.
+        Overview:
+        ----
+        Only the errors in `RETRYABLE_ERRORS` are retried. A response with an `error`
+        key, like an unknown symbol, is returned straight away, the same request would
+        fail again. The delay before retry `n` is drawn between zero and
+        `backoff * 2 ** n`, so clients that failed together don't retry together.
+        When every retry fails, the last error is raised.
+        """
+
+        bucket = self._buckets[endpoint]
+        attempt = 0
+
+        while True:
+
+            # The class bucket first, so a call held by its class doesn't hold an account token.
+            waited = bucket.acquire()
+            waited += self._global_bucket.acquire()
+
+            if waited > 0:
+                self._count(counter='throttled')
+
+            self._count(counter='requests')
+
+            try:
+                response = function(*args, **kwargs)
+            except RETRYABLE_ERRORS:
+                if attempt >= retries:
+                    self._count(counter='failed')
+                    raise
+            except Exception:
+                self._count(counter='failed')
+                raise
+            else:
+                if isinstance(response, dict) and 'error' in response:
+                    self._count(counter='failed')
+                return response
+
+            self._count(counter='retried')
+            time_true.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+            attempt += 1
@@ -0,0 +1,107 @@
+import numpy as np
+
+from typing import Dict
+from typing import Tuple
+
+from Bot.symbol_buffer import SymbolBuffer
+
+
+# The length of one unit of each bar type, in nanoseconds.
+BAR_TYPE_NANOSECONDS = {
+    'minute': 60 * 1_000_000_000,
+    'hour': 60 * 60 * 1_000_000_000,
+    'daily': 24 * 60 * 60 * 1_000_000_000
+}
+
+
+class BarResampler():
+
+    """
+    Represents the rules used to roll the bars of a StockFrame up into a
+    higher timeframe. Buckets are labeled by their start time, daily buckets
+    start at midnight UTC.
+    """
+
+    def __init__(self, bar_size: int, bar_type: str = 'minute') -> None:
+        """Initalizes the resampler.
+        Arguments:
+        ----
+        bar_size {int} -- The number of `bar_type` units in one bucket, for example `5`.
+        Keyword Arguments:
+        ----
+        bar_type {str} -- One of `minute`, `hour` or `daily`. (default: {'minute'})
+        """
+
+        if bar_type not in BAR_TYPE_NANOSECONDS:
+            raise ValueError("Bar type must be one of {bar_types}".format(
+                bar_types=list(BAR_TYPE_NANOSECONDS)
+            ))
+
+        self.bar_size = bar_size
+        self.bar_type = bar_type
+        self.bucket_size = bar_size * BAR_TYPE_NANOSECONDS[bar_type]
+
+    def bucket_start(self, timestamps: np.ndarray) -> np.ndarray:
+        """Returns the start of the bucket each timestamp falls in."""
+
+        return timestamps - timestamps % self.bucket_size
+
+    def aggregate(self, buffer: SymbolBuffer, start: int = None, end: int = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Rolls the rows of a buffer up into buckets.
+        Overview:
+        ----
+        Only the buckets that overlap `[start, end]` are built. The rows of those
+        buckets are found with a binary search, so updating the open bucket after
+        a new bar only reads that bucket, not the history.
+        Arguments:
+        ----
+        buffer {SymbolBuffer} -- The buffer holding the source bars.
+        Keyword Arguments:
+        ----
+        start {int} -- The first changed timestamp in nanoseconds. (default: {the first row})
+        end {int} -- The last changed timestamp in nanoseconds. (default: {the last row})
+        Returns:
+        ----
+        {Tuple[np.ndarray, Dict[str, np.ndarray]]} -- The bucket timestamps and the OHLCV values.
+        """
+
+        index = buffer.index
+
+        first = 0
+        last = len(index)
+
+        if start is not None:
+            first = int(np.searchsorted(index, self.bucket_start(np.int64(start)), side='left'))
+
+        if end is not None:
+            last = int(np.searchsorted(index, self.bucket_start(np.int64(end)) + self.bucket_size, side='left'))
+
+        buckets = self.bucket_start(index[first:last])
+
+        if not len(buckets):
+            return buckets, {}
+
+        # Each bucket starts where its label changes.
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+
+        values = {}
+        columns = buffer.columns
+
+        if 'open' in columns:
+            values['open'] = buffer.column('open')[first:last][starts]
+
+        if 'high' in columns:
+            values['high'] = np.maximum.reduceat(buffer.column('high')[first:last], starts)
+
+        if 'low' in columns:
+            values['low'] = np.minimum.reduceat(buffer.column('low')[first:last], starts)
+
+        if 'close' in columns:
+            values['close'] = buffer.column('close')[first:last][ends]
+
+        if 'volume' in columns:
+            values['volume'] = np.add.reduceat(
+                buffer.column('volume')[first:last].astype(np.float64), starts)
+
+        return buckets[starts], values
@@ -6,6 +6,9 @@ import pathlib
 import json
 
 import time as time_true
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from td.client import TDClient
 from td.utils import TDUtilities
 
@@ -13,12 +16,32 @@ from datetime import datetime as dt, timezone, tzinfo
 from datetime import time
 from datetime import timezone as tz
 from datetime import timedelta
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Union, Callable
+from Bot.bar_archive import BarArchive
+from Bot.candle_cache import CandleCache
+from Bot.market_stream import MarketStream
+from Bot.market_stream import StreamTransport
+from Bot.market_stream import TDStreamTransport
 from Bot.portfolio import Portfolio
+from Bot.quote_aggregator import QuoteAggregator
+from Bot.request_scheduler import ThrottledSession
 from Bot.stock_frame import StockFrame
 from Bot.trade import Trade
 
 
+# The most price history requests `hist_quote` keeps in flight at once.
+HIST_QUOTE_CONCURRENCY = 8
+
+# The most symbols in one `get_quotes` call.
+QUOTE_CHUNK_SIZE = 200
+
+# The most `get_quotes` calls `updated_quote` keeps in flight at once.
+QUOTE_CONCURRENCY = 4
+
+# The seconds `get_latest_bar` waits for quotes before it goes on without the late ones.
+LATEST_BAR_TIMEOUT = 5.0
+
+
 class robotFrame():
 
     def __init__(self, client_id: str, redirect_uri: str, creds: str = None, acct: str = None, paper_trading: bool = True) -> None:
@@ -27,14 +50,20 @@ class robotFrame():
         self.client_id: str = client_id
         self.redirect_uri: str = redirect_uri
         self.creds: str = creds
-        self.session: TDClient = self.__new_session()
+        self.session: ThrottledSession = self.__new_session()
         self.trades: dict = {}
         self.hist_prices: dict = {}
         self.stock_frame = None
         self.paper_trading = paper_trading
         self.portfolio: Portfolio = None
+        self.quote_aggregator: QuoteAggregator = None
+        self.candle_cache: CandleCache = None
+        self.quote_errors: Dict[str, str] = {}
+        self.hist_errors: Dict[str, str] = {}
+        self._quote_executor: ThreadPoolExecutor = None
+        self._quote_calls: Dict[tuple, Future] = {}
 
-    def __new_session(self) -> TDClient:
+    def __new_session(self) -> ThrottledSession:
 
         td_client = TDClient(
             client_id=self.client_id,
@@ -44,7 +73,8 @@ class robotFrame():
 
         td_client.login()
 
-        return td_client
+        # Every call goes through the rate limits, retries and counters of one shared layer.
+        return ThrottledSession(session=td_client)
 
     # checks pre market hour
     @property
@@ -111,53 +141,304 @@ class robotFrame():
 
         return trade
 
-    def new_stock_frame(self, data: List[dict]) -> StockFrame:
+    def new_stock_frame(self, data: List[dict], archive_path: str = None) -> StockFrame:
+
+        archive = None
 
-        self.stock_frame = StockFrame(data=data)
+        # Back the frame with the on-disk archive for warm starts.
+        if archive_path:
+            archive = BarArchive(path=archive_path)
+
+        self.stock_frame = StockFrame(data=data, archive=archive)
 
         return self.stock_frame
 
-    def updated_quote(self) -> dict:
-        tickers = self.portfolio.positions.keys()
+    def set_candle_cache(self, candle_cache: CandleCache) -> None:
+        """Keeps the price history on disk, so warm-ups only fetch the candles they are missing.
+        Arguments:
+        ----
+        candle_cache {CandleCache} -- The cache used by `hist_quote` and the portfolio's daily prices.
+        Usage:
+        ----
+            >>> trading_robot.set_candle_cache(candle_cache=CandleCache(path='data/candles'))
+        """
+
+        self.candle_cache = candle_cache
+
+        if self.portfolio:
+            self.portfolio.candle_cache = candle_cache
+
+    def updated_quote(self, symbols: Optional[List[str]] = None, timeout: float = None) -> dict:
+        """Grabs the quotes of every position in a few batched calls.
+        Overview:
+        ----
+        The symbols are split into chunks of `QUOTE_CHUNK_SIZE`, one `get_quotes`
+        call each, sent side by side on a pool of `QUOTE_CONCURRENCY` threads. A
+        chunk that fails or is still running when the timeout runs out is left out,
+        so one slow call never holds up the others, and while its call is still
+        running the chunk isn't sent again. The symbols left out are kept in
+        `quote_errors` with the reason. A quote without a last price or a time is
+        still returned, but it is listed in `quote_errors` as incomplete and the
+        quote aggregator skips it.
+        Keyword Arguments:
+        ----
+        symbols {List[str]} -- The symbols to grab. (default: {None}, every position)
+        timeout {float} -- The most seconds to wait for the chunks. (default: {None}, no limit)
+        Returns:
+        ----
+        {dict} -- The quotes that arrived, keyed by symbol.
+        """
+
+        if symbols is None:
+            symbols = self.portfolio.positions
+
+        symbols = list(symbols)
+        chunks = [
+            symbols[position:position + QUOTE_CHUNK_SIZE] for position in range(0, len(symbols), QUOTE_CHUNK_SIZE)
+        ]
+
+        if self._quote_executor is None:
+            self._quote_executor = ThreadPoolExecutor(max_workers=QUOTE_CONCURRENCY, thread_name_prefix='quotes')
+
+        # Forget the calls that finished, the ones still running are waited on again.
+        self._quote_calls = {chunk: future for chunk, future in self._quote_calls.items() if not future.done()}
+
+        futures = {}
+
+        for chunk in chunks:
+
+            future = self._quote_calls.get(tuple(chunk))
+
+            if future is None:
+                future = self._quote_executor.submit(self.session.get_quotes, instruments=chunk)
+                self._quote_calls[tuple(chunk)] = future
+
+            futures[future] = chunk
 
-        quotes = self.session.get_quotes(instruments=list(tickers))
+        # Calls still running after the timeout finish in the background and are ignored.
+        done, _ = wait(futures, timeout=timeout)
+
+        quotes = {}
+        self.quote_errors = {}
+
+        for future, chunk in futures.items():
+
+            if future not in done:
+                self.quote_errors.update({symbol: 'timeout' for symbol in chunk})
+                continue
+
+            try:
+                chunk_quotes = future.result()
+            except Exception as error:
+                self.quote_errors.update({symbol: repr(error) for symbol in chunk})
+                continue
+
+            for symbol in chunk:
+
+                quote = chunk_quotes.get(symbol) if isinstance(chunk_quotes, dict) else None
+
+                if not isinstance(quote, dict):
+                    self.quote_errors[symbol] = 'missing quote'
+                    continue
+
+                if quote.get('lastPrice') is None or not (quote.get('tradeTimeInLong') or quote.get('quoteTimeInLong')):
+                    self.quote_errors[symbol] = 'incomplete quote'
+
+                quotes[symbol] = quote
 
         return quotes
 
-    def hist_quote(self, start: dt, end: dt, bar_size: int = 1, bar_type: str = 'minute', symbols: Optional[List[str]] = None) -> List[Dict]:
+    def shutdown(self) -> None:
+        """Stops the threads of the robot, quote calls still running are abandoned.
+        An archive-backed StockFrame is flushed to disk.
+        """
+
+        if self.stock_frame:
+            self.stock_frame.flush()
+
+        if self._quote_executor:
+            self._quote_executor.shutdown(wait=False, cancel_futures=True)
+
+        self._quote_executor = None
+        self._quote_calls = {}
+
+    def new_quote_aggregator(self, bar_size: int = 1, bar_type: str = 'minute') -> QuoteAggregator:
+        """Creates the aggregator that turns polled quotes into bars for the StockFrame."""
+
+        self.quote_aggregator = QuoteAggregator(
+            stock_frame=self.stock_frame,
+            bar_size=bar_size,
+            bar_type=bar_type
+        )
+
+        return self.quote_aggregator
+
+    def new_market_stream(self, transport: StreamTransport = None, on_bar: Callable[[List[dict]], None] = None,
+                          symbols: Optional[List[str]] = None, bar_size: int = 1, bar_type: str = 'minute') -> MarketStream:
+        """Creates a stream that pushes quotes and bars into the StockFrame as they arrive.
+        Overview:
+        ----
+        Instead of polling and sleeping until the next bar, the stream wakes the
+        `on_bar` callback as soon as bars close, so indicators and signals are
+        refreshed within milliseconds of the bar.
+        Keyword Arguments:
+        ----
+        transport {StreamTransport} -- The connection to read from, for example a
+            `ReplayTransport` in tests. (default: {None}, the TD streamer through `session`)
+        on_bar {Callable[[List[dict]], None]} -- Called with the bars that closed. (default: {None})
+        symbols {List[str]} -- The symbols to subscribe to. (default: {None}, every position)
+        bar_size {int} -- The number of `bar_type` units in one bar. (default: {1})
+        bar_type {str} -- One of `minute`, `hour` or `daily`. (default: {'minute'})
+        Returns:
+        ----
+        {MarketStream} -- The stream, call `run` to block or `start` to run it in a thread.
+        Usage:
+        ----
+            >>> def on_bar(bars):
+                    indicator_client.refresh()
+                    trading_robot.execute_signals(
+                        signals=indicator_client.check_signals(),
+                        trades_to_execute=trades_dict
+                    )
+            >>> market_stream = trading_robot.new_market_stream(on_bar=on_bar)
+            >>> market_stream.run()
+        """
+
+        if symbols is None:
+            symbols = self.portfolio.positions
+
+        if transport is None:
+            transport = TDStreamTransport(session=self.session)
+
+        return MarketStream(
+            stock_frame=self.stock_frame,
+            transport=transport,
+            symbols=list(symbols),
+            on_bar=on_bar,
+            bar_size=bar_size,
+            bar_type=bar_type
+        )
+
+    def poll_quotes(self) -> List[dict]:
+        """Grabs one batch of quotes for every position and folds it into the open bars.
+        Overview:
+        ----
+        A few batched `get_quotes` calls cover the whole portfolio, so this can replace the
+        price history call per symbol that `get_latest_bar` makes on every bar.
+        Returns:
+        ----
+        {List[dict]} -- The bars finished by this batch, already added to the StockFrame.
+        """
+
+        if not self.quote_aggregator:
+            self.new_quote_aggregator()
+
+        return self.quote_aggregator.add_quotes(quotes=self.updated_quote())
+
+    def hist_quote(self, start: dt, end: dt, bar_size: int = 1, bar_type: str = 'minute', symbols: Optional[List[str]] = None,
+                   concurrency: int = HIST_QUOTE_CONCURRENCY) -> List[Dict]:
+        """Grabs the historical prices of every symbol.
+        Overview:
+        ----
+        The price history of each symbol is a separate request, so the requests are
+        sent from a small pool of threads and mostly wait on the network side by
+        side. The results are merged in symbol order, whatever order they arrive in.
+        With a candle cache, only the time ranges it doesn't cover are requested.
+        A symbol whose request fails is left out, so one bad symbol never aborts
+        the others, and its error is kept in `hist_errors`.
+        Arguments:
+        ----
+        start {datetime} -- The start of the price history.
+        end {datetime} -- The end of the price history.
+        Keyword Arguments:
+        ----
+        bar_size {int} -- The size of each bar. (default: {1})
+        bar_type {str} -- The type of bar, for example `minute` or `daily`. (default: {'minute'})
+        symbols {List[str]} -- The symbols to grab. (default: {None}, every position)
+        concurrency {int} -- The most requests in flight at once, keep it under the API
+            rate limit. `1` sends them one after another. (default: {HIST_QUOTE_CONCURRENCY})
+        Returns:
+        ----
+        {Dict} -- The candles of each symbol that arrived, and every candle in `aggregated`.
+        """
 
         self._bar_size = bar_size
         self._bar_type = bar_type
 
-        start = str(TDUtilities.milliseconds_since_epoch(dt_object=start))
-        end = str(TDUtilities.milliseconds_since_epoch(dt_object=end))
+        start = TDUtilities().milliseconds_since_epoch(dt_object=start)
+        end = TDUtilities().milliseconds_since_epoch(dt_object=end)
 
         new_prices = []
 
         if not symbols:
             symbols = self.portfolio.positions
 
-        for symbol in symbols:
+        symbols = list(symbols)
+
+        def fetch_candles(symbol: str, start: int, end: int) -> List[dict]:
 
             hist_price_resp = self.session.get_price_history(
                 symbol=symbol,
                 period_type='day',
-                start_date=start,
-                end_date=end,
+                start_date=str(start),
+                end_date=str(end),
                 frequency_type=bar_type,
                 frequency=bar_size,
                 extended_hours=True
             )
+
+            # The session already retried, an error response fails the symbol.
+            if 'candles' not in hist_price_resp:
+                raise ValueError(hist_price_resp.get('error', 'missing candles'))
+
+            return hist_price_resp['candles']
+
+        def grab_candles(symbol: str) -> Union[List[dict], Exception]:
+
+            try:
+
+                if not self.candle_cache:
+                    return fetch_candles(symbol=symbol, start=start, end=end)
+
+                # Only the ranges missing from the cache are fetched.
+                return self.candle_cache.grab(
+                    symbol=symbol,
+                    frequency_type=bar_type,
+                    frequency=bar_size,
+                    start=start,
+                    end=end,
+                    fetch=lambda range_start, range_end: fetch_candles(symbol=symbol, start=range_start, end=range_end)
+                )
+
+            # Hand the error back instead of raising, so the other symbols still arrive.
+            except Exception as error:
+                return error
+
+        if concurrency > 1 and len(symbols) > 1:
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(symbols))) as executor:
+                symbol_candles = list(executor.map(grab_candles, symbols))
+        else:
+            symbol_candles = [grab_candles(symbol) for symbol in symbols]
+
+        self.hist_errors = {}
+
+        for symbol, candles in zip(symbols, symbol_candles):
+
+            if isinstance(candles, Exception):
+                self.hist_errors[symbol] = repr(candles)
+                continue
+
             self.hist_prices[symbol] = {}
-            self.hist_prices[symbol]['candles'] = hist_price_resp['candles']
+            self.hist_prices[symbol]['candles'] = candles
 
-            for candle in hist_price_resp['candles']:
+            for candle in candles:
 
                 new_price_mini_dict = {}
-                new_price_mini_dict['symbol'] = candle['symbol']
+                new_price_mini_dict['symbol'] = symbol
                 new_price_mini_dict['open'] = candle['open']
                 new_price_mini_dict['close'] = candle['close']
                 new_price_mini_dict['high'] = candle['high']
+                new_price_mini_dict['low'] = candle['low']
                 new_price_mini_dict['volume'] = candle['volume']
                 new_price_mini_dict['datetime'] = candle['datetime']
 
@@ -167,7 +448,33 @@ class robotFrame():
 
         return self.hist_prices
 
-    def get_latest_bar(self) -> List[dict]:
+    def get_latest_bar(self, source: str = 'history') -> List[dict]:
+        """Grabs the latest bar of every position.
+        Overview:
+        ----
+        With the `history` source, the last 15 minutes of price history are grabbed
+        for each symbol, one call after another. With the `quotes` source, the
+        quotes of every symbol are grabbed in a few batched calls and folded into
+        the bars being built by the quote aggregator, so the time this takes
+        doesn't grow with the number of symbols. A symbol whose quote failed or is
+        late is skipped until the next bar.
+        Keyword Arguments:
+        ----
+        source {str} -- Either `history` or `quotes`. (default: {'history'})
+        Returns:
+        ----
+        {List[dict]} -- The latest bar of each symbol, ready for `StockFrame.add_rows`.
+        Usage:
+        ----
+            >>> latest_bars = trading_robot.get_latest_bar(source='quotes')
+            >>> stock_frame.add_rows(data=latest_bars)
+        """
+
+        if source == 'quotes':
+            return self._latest_bar_from_quotes()
+
+        if source != 'history':
+            raise ValueError("The source must be `history` or `quotes`, not {source}.".format(source=source))
 
         bar_size = self._bar_size
         bar_type = self._bar_type
@@ -176,26 +483,15 @@ class robotFrame():
         end_date = dt.today()
         start_date = end_date - timedelta(minutes=15)
 
-        start = str(TDUtilities.milliseconds_since_epoch(dt_object=start_date))
-        end = str(TDUtilities.milliseconds_since_epoch(dt_object=end_date))
+        start = str(TDUtilities().milliseconds_since_epoch(dt_object=start_date))
+        end = str(TDUtilities().milliseconds_since_epoch(dt_object=end_date))
 
         latest_prices = []
 
         for symbol in self.portfolio.positions:
 
-            hist_price_resp = self.session.get_price_history(
-                symbol=symbol,
-                period_type='day',
-                start_date=start,
-                end_date=end,
-                frequency_type=bar_type,
-                frequency=bar_size,
-                extended_hours=True
-            )
-
-            if 'error' in hist_price_resp:
-                time_true.sleep(2)
-
+            # The session already retried, skip the symbol until the next bar.
+            try:
                 hist_price_resp = self.session.get_price_history(
                     symbol=symbol,
                     period_type='day',
@@ -205,14 +501,20 @@ class robotFrame():
                     frequency=bar_size,
                     extended_hours=True
                 )
+            except Exception:
+                continue
+
+            if 'candles' not in hist_price_resp:
+                continue
 
             for candle in hist_price_resp['candles'][-1:]:
 
                 new_price_mini_dict = {}
-                new_price_mini_dict['symbol'] = candle['symbol']
+                new_price_mini_dict['symbol'] = symbol
                 new_price_mini_dict['open'] = candle['open']
                 new_price_mini_dict['close'] = candle['close']
                 new_price_mini_dict['high'] = candle['high']
+                new_price_mini_dict['low'] = candle['low']
                 new_price_mini_dict['volume'] = candle['volume']
                 new_price_mini_dict['datetime'] = candle['datetime']
 
@@ -220,6 +522,23 @@ class robotFrame():
 
         return latest_prices
 
+    def _latest_bar_from_quotes(self) -> List[dict]:
+        """Builds the latest bars from one round of batched quotes."""
+
+        if not self.quote_aggregator:
+            self.new_quote_aggregator(bar_size=self._bar_size, bar_type=self._bar_type)
+
+        quotes = self.updated_quote(timeout=LATEST_BAR_TIMEOUT)
+
+        # Bars that closed are added to the StockFrame by the aggregator.
+        self.quote_aggregator.add_quotes(quotes=quotes)
+
+        open_bars = self.quote_aggregator.open_bars
+
+        return [
+            dict(open_bars[symbol]) for symbol in quotes if symbol in open_bars and symbol not in self.quote_errors
+        ]
+
     def wait_till_next_bar(self, last_bar_timestap: pd.DatetimeIndex) -> None:
 
         last_bar = last_bar_timestap.to_pydatetime()[
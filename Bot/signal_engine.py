@@ -0,0 +1,319 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+from typing import Any
+from typing import List
+from typing import Dict
+from typing import Tuple
+from typing import Callable
+
+from Bot import kernels
+
+
+# The operators that can be passed by name to `set_indicator_signal`.
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+# How the rules of a side are combined.
+LOGIC = {
+    'and': np.logical_and,
+    'or': np.logical_or
+}
+
+
+class SignalEngine():
+
+    """
+    Represents the buy and sell rules compiled into a few vectorized comparisons.
+    Overview:
+    ----
+    Every rule is made of terms, a column compared with a threshold or with another
+    column. The terms of all the rules that use the same operator are evaluated
+    together, over every row at once, so the number of numpy calls depends on the
+    number of distinct operators and not on the number of rules or symbols. The
+    terms of a rule are joined with AND, for example a threshold and its max bound,
+    and the rules of a side are joined with the side's logic.
+
+    Crossover terms only hold on the bar where the comparison turns true, so they
+    also compare the previous bar. For the latest rows, the previous bar is read
+    from the end of each symbol buffer, `StockFrame.previous_rows`, so nothing has
+    to be remembered between checks.
+    """
+
+    def __init__(self, indicators: dict, indicators_comp_key: List[str], indicators_key: List[str],
+                 buy_logic: str = 'and', sell_logic: str = 'and') -> None:
+        """Compiles the signals.
+        Arguments:
+        ----
+        indicators {dict} -- The signals, as stored by `Indicators.set_indicator_signal`,
+            `Indicators.set_indicator_signal_compare` and `Indicators.set_indicator_signal_crossover`.
+        indicators_comp_key {List[str]} -- The signals that compare two indicators, crossovers included.
+        indicators_key {List[str]} -- The signals that compare an indicator with a threshold.
+        Keyword Arguments:
+        ----
+        buy_logic {str} -- How the buy rules are combined, `and` or `or`. (default: {'and'})
+        sell_logic {str} -- How the sell rules are combined, `and` or `or`. (default: {'and'})
+        """
+
+        for logic in (buy_logic, sell_logic):
+            if logic not in LOGIC:
+                raise ValueError("The signal logic must be one of {options}, not {logic}.".format(
+                    options=list(LOGIC),
+                    logic=logic
+                ))
+
+        self.buy_logic = buy_logic
+        self.sell_logic = sell_logic
+
+        # Side -> a list of rules, each a list of (operator, left column, right column, threshold, crossover).
+        rules = {'buys': [], 'sells': []}
+
+        for indicator in indicators_key:
+
+            signal = indicators[indicator]
+
+            for side, key in (('buys', 'buy'), ('sells', 'sell')):
+
+                if signal.get(key + '_operator') is None:
+                    continue
+
+                terms = [(signal[key + '_operator'], indicator, None, signal[key], False)]
+
+                # The max bound only applies when both parts of it are set.
+                if signal.get(key + '_max') is not None and signal.get(key + '_operator_max') is not None:
+                    terms.append((signal[key + '_operator_max'], indicator, None, signal[key + '_max'], False))
+
+                rules[side].append(terms)
+
+        for indicator in indicators_comp_key:
+
+            signal = indicators[indicator]
+            if 'indicator_1' in signal:
+                indicator_1, indicator_2 = signal['indicator_1'], signal['indicator_2']
+            else:
+                indicator_1, indicator_2 = indicator.split('_comp_')
+
+            for side, key in (('buys', 'buy'), ('sells', 'sell')):
+                if signal.get(key + '_operator'):
+                    rules[side].append([(
+                        signal[key + '_operator'],
+                        indicator_1,
+                        indicator_2,
+                        None,
+                        signal.get('type') == 'crossover'
+                    )])
+
+        self._columns = []
+        for side_rules in rules.values():
+            for terms in side_rules:
+                for _, left, right, _, _ in terms:
+                    for column_name in (left, right):
+                        if column_name is not None and column_name not in self._columns:
+                            self._columns.append(column_name)
+
+        self._sides = {
+            side: self._compile(rules=side_rules) for side, side_rules in rules.items()
+        }
+
+        self.crossovers = any(
+            crossover for side_rules in rules.values() for terms in side_rules for *_, crossover in terms
+        )
+
+    @property
+    def columns(self) -> List[str]:
+        """Returns the columns the rules read."""
+
+        return list(self._columns)
+
+    def _compile(self, rules: List[List[tuple]]) -> Tuple[List[tuple], np.ndarray, int]:
+        """Groups the terms of one side by operator.
+        Returns:
+        ----
+        {Tuple[List[tuple], np.ndarray, int]} -- For each operator, the function, the
+            positions of its terms and the columns and thresholds they read. Then the
+            position of the first term of each rule and the number of terms.
+        """
+
+        groups: Dict[Callable[[Any, Any], Any], dict] = {}
+        rule_starts = []
+        position = 0
+
+        for terms in rules:
+
+            rule_starts.append(position)
+
+            for function, left, right, threshold, crossover in terms:
+
+                function = OPERATORS.get(function, function)
+                kind = 'threshold' if right is None else 'column'
+
+                group = groups.setdefault((function, kind, crossover), {
+                    'positions': [],
+                    'left': [],
+                    'right': []
+                })
+
+                group['positions'].append(position)
+                group['left'].append(self._columns.index(left))
+                group['right'].append(threshold if right is None else self._columns.index(right))
+
+                position += 1
+
+        compiled = [
+            (
+                function,
+                kind,
+                crossover,
+                np.array(group['positions'], dtype=np.intp),
+                np.array(group['left'], dtype=np.intp),
+                np.array(group['right'], dtype=np.float64 if kind == 'threshold' else np.intp)
+            )
+            for (function, kind, crossover), group in groups.items()
+        ]
+
+        return compiled, np.array(rule_starts, dtype=np.intp), position
+
+    def masks(self, values: np.ndarray, previous: np.ndarray = None) -> Dict[str, np.ndarray]:
+        """Evaluates the rules over a table of values.
+        Arguments:
+        ----
+        values {np.ndarray} -- A `(rows, columns)` array, with the columns in the order of `columns`.
+        Keyword Arguments:
+        ----
+        previous {np.ndarray} -- The values of the bar before each row, `NaN` where there
+            is none. Only crossover rules read it. (default: {None})
+        Returns:
+        ----
+        {Dict[str, np.ndarray]} -- The `buys` and `sells` masks, one value per row.
+        """
+
+        masks = {}
+
+        for side, logic in (('buys', self.buy_logic), ('sells', self.sell_logic)):
+
+            compiled, rule_starts, term_count = self._sides[side]
+
+            if not len(rule_starts):
+                masks[side] = np.zeros(len(values), dtype=bool)
+                continue
+
+            terms = np.empty((len(values), term_count), dtype=bool)
+
+            with np.errstate(invalid='ignore'):
+                for function, kind, crossover, positions, left, right in compiled:
+
+                    other = right if kind == 'threshold' else values[:, right]
+                    terms[:, positions] = function(values[:, left], other)
+
+                    if crossover:
+
+                        # It crossed if it didn't hold on a complete previous bar.
+                        other = right if kind == 'threshold' else previous[:, right]
+                        before = function(previous[:, left], other) | np.isnan(previous[:, left])
+                        if kind == 'column':
+                            before |= np.isnan(previous[:, right])
+
+                        terms[:, positions] &= ~before
+
+            # Each rule holds when all of its terms do.
+            rule_values = np.logical_and.reduceat(terms, rule_starts, axis=1)
+
+            masks[side] = LOGIC[logic].reduce(rule_values, axis=1)
+
+        return masks
+
+    def evaluate(self, frame: pd.DataFrame, previous: pd.DataFrame = None) -> Dict[str, pd.Series]:
+        """Evaluates the rules over the rows of a frame, usually the latest row of each symbol.
+        Arguments:
+        ----
+        frame {pd.DataFrame} -- The rows to check, with every column in `columns`.
+        Keyword Arguments:
+        ----
+        previous {pd.DataFrame} -- The bar before each row of `frame`, in the same order,
+            usually `StockFrame.previous_rows`. Required when a rule is a crossover. (default: {None})
+        Raises:
+        ----
+        ValueError: If a rule is a crossover and `previous` isn't given.
+        Returns:
+        ----
+        {Dict[str, pd.Series]} -- The `buys` and `sells` rows, indexed like `frame`.
+        Usage:
+        ----
+            >>> signal_engine = SignalEngine(
+                    indicators=indicator_client.get_indicator_signal(),
+                    indicators_comp_key=[],
+                    indicators_key=['rsi']
+                )
+            >>> signals = signal_engine.evaluate(
+                    frame=stock_frame.latest_rows,
+                    previous=stock_frame.previous_rows
+                )
+            >>> signals['buys'].index.get_level_values('symbol')
+        """
+
+        values = frame[self._columns].to_numpy(dtype=np.float64)
+
+        if self.crossovers:
+
+            if previous is None:
+                raise ValueError("Crossover signals need the previous bar of each row.")
+
+            previous = previous[self._columns].to_numpy(dtype=np.float64)
+
+        return {
+            side: pd.Series(True, index=frame.index[mask], dtype=bool)
+            for side, mask in self.masks(values=values, previous=previous).items()
+        }
+
+    def history(self, values: np.ndarray, offsets: np.ndarray) -> Dict[str, np.ndarray]:
+        """Evaluates the rules over every row of every symbol at once.
+        Overview:
+        ----
+        The previous bar of each row is the row before it in the same symbol, so
+        crossovers fire exactly where they would have fired live. An entry is the
+        first buy while out of the position and an exit is the first sell while
+        in it, where a row with both a buy and a sell is ignored.
+        Arguments:
+        ----
+        values {np.ndarray} -- A `(rows, columns)` array of every symbol's rows, back to
+            back, with the columns in the order of `columns`.
+        offsets {np.ndarray} -- The row offsets of the symbols, one more than there are symbols.
+        Returns:
+        ----
+        {Dict[str, np.ndarray]} -- The `buys`, `sells`, `entries` and `exits` masks, one
+            value per row.
+        """
+
+        starts = kernels.segment_starts(offsets=offsets)
+
+        previous = np.empty_like(values)
+        previous[1:] = values[:-1]
+        previous[starts] = np.nan
+
+        masks = self.masks(values=values, previous=previous)
+
+        events = masks['buys'].astype(np.int8) - masks['sells'].astype(np.int8)
+
+        # The row of the last buy or sell so far, rows from an earlier symbol are before its start.
+        rows = np.arange(len(values))
+        last_event = np.maximum.accumulate(np.where(events != 0, rows, -1)) if len(values) else rows
+        first_rows = np.repeat(offsets[:-1], kernels.segment_lengths(offsets=offsets))
+
+        in_position = (last_event >= first_rows) & (events[np.maximum(last_event, 0)] > 0)
+
+        was_in_position = np.empty_like(in_position)
+        was_in_position[1:] = in_position[:-1]
+        was_in_position[starts] = False
+
+        masks['entries'] = in_position & ~was_in_position
+        masks['exits'] = ~in_position & was_in_position
+
+        return masks
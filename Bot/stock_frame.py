@@ -1,9 +1,15 @@
 # Last Updated: Shawn Khandia 1:54 AM 06/13/21
 
+import bisect
+
+import time as time_true
+
 import pandas as pd
 import numpy as np
 
+from datetime import datetime as dt
 from datetime import time
+from datetime import timedelta
 from datetime import timezone
 from datetime import timezone
 
@@ -14,93 +20,947 @@ from typing import Union
 from pandas.core.groupby import DataFrameGroupBy
 from pandas.core.window import RollingGroupby
 
+from Bot.bar_archive import BarArchive
+from Bot.resampler import BAR_TYPE_NANOSECONDS
+from Bot.resampler import BarResampler
+from Bot.signal_engine import SignalEngine
+from Bot.symbol_buffer import SymbolBuffer
+
+
+# The dtypes used by compact StockFrames, other float columns are stored as `float32`.
+COMPACT_DTYPES = {
+    "open": np.float32,
+    "close": np.float32,
+    "high": np.float32,
+    "low": np.float32,
+    "volume": np.uint32
+}
+
 
 class StockFrame():
 
-    def __init__(self, data: List[Dict]) -> None:
+    def __init__(self, data: List[Dict], archive: BarArchive = None, compact: bool = False,
+                 flush_interval: float = 5.0) -> None:
+        """Initalizes the StockFrame.
+        Arguments:
+        ----
+        data {List[Dict]} -- A list of candles to load.
+        Keyword Arguments:
+        ----
+        archive {BarArchive} -- An on-disk archive to back the StockFrame with. The bars
+            already in the archive are mapped instead of loaded, and new bars are
+            appended to it in place. (default: {None})
+        compact {bool} -- Store prices as `float32` and volume as `uint32` instead of
+            `float64`. The volume column is widened to `uint64` if a bar overflows it.
+            (default: {False})
+        flush_interval {float} -- The most seconds between two flushes of the archive, the
+            bars added in between are on disk once the next flush runs. Call `flush` at
+            shutdown. `0` flushes after every batch. (default: {5.0})
+        Usage:
+        ----
+            >>> # Warm start from the bars saved by the last run.
+            >>> stock_frame = StockFrame(data=[], archive=BarArchive(path='data/bars'))
+        """
 
         self._data = data
-        self._frame: pd.DataFrame = self.create_frame()
-        self._symbol_groups: DataFrameGroupBy = None
-        self._symbol_rolling_groups: RollingGroupby = None
+        self._archive = archive
+        self._compact = compact
+        self._flush_interval = flush_interval
+        self._flushed_at = time_true.monotonic()
+        self._columns: List[str] = []
+        self._dtypes: Dict[str, np.dtype] = {}
+        self._symbols: List[str] = []
+        self._buffers: Dict[str, SymbolBuffer] = {}
+
+        if self._archive:
+            self._buffers.update(self._archive.open_buffers())
+            self._symbols = sorted(self._buffers)
+            for buffer in self._buffers.values():
+                for column, dtype in buffer.dtypes.items():
+                    if column not in self._columns:
+                        self._columns.append(column)
+                        self._dtypes[column] = dtype
+            for buffer in self._buffers.values():
+                for column in self._columns:
+                    buffer.add_column(column_name=column, dtype=self._dtypes[column])
+
+        self._version = 0
+        self._layout_version = 0
+        self._cache: Dict[str, tuple] = {}
+        self._stale_columns = set()
+        self._timeframes: Dict[tuple, tuple] = {}
+
+        self._max_bars: int = None
+        self._max_age: int = None
+        self._spill: BarArchive = None
+        self._spill_buffers: Dict[str, SymbolBuffer] = {}
+        self._warmup: Dict[str, int] = {}
+        self._session_warmup: Dict[str, int] = {}
+
+        self.create_data()
+
+    @property
+    def version(self) -> int:
+        """Returns the data version, which goes up on every change to the StockFrame."""
+
+        return self._version
+
+    @property
+    def bars_version(self) -> int:
+        """Returns a version that only goes up when bars are added, changed or dropped.
+        Overview:
+        ----
+        Writing a column, like an indicator, leaves it alone, so values computed
+        from the bars can be cached against it.
+        """
+
+        return self._layout_version
 
     @property
     def frame(self) -> pd.DataFrame:
-        return self._frame
+        """Returns the multi-index data frame, building it from the buffers if they changed."""
+
+        frame = self._cached(key="frame", builder=self._build_frame)
+
+        # Copy over the columns that were written row by row since the frame was built.
+        if self._stale_columns:
+            for column in self._stale_columns:
+                frame[column] = np.concatenate(
+                    [self._buffers[symbol].column(column) for symbol in self._symbols]
+                )
+            self._stale_columns.clear()
+
+        return frame
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
 
     @property
     def symbol_groups(self) -> DataFrameGroupBy:
 
-        self._symbol_groups = self._frame.groupby(
-            by="symbol",
-            as_index=False,
-            sort=True
+        frame = self.frame
+
+        return self._cached(
+            key="symbol_groups",
+            builder=lambda: frame.groupby(
+                by="symbol",
+                as_index=False,
+                sort=True
+            )
         )
 
-        return self._symbol_groups
+    @property
+    def symbol_offsets(self) -> np.ndarray:
+        """Returns the row offsets of each symbol in `frame`.
+        Overview:
+        ----
+        The rows of symbol `symbols[i]` are `frame.iloc[offsets[i]:offsets[i + 1]]`.
+        Returns:
+        ----
+        {np.ndarray} -- An array with one more entry than there are symbols.
+        """
+
+        return self._cached(
+            key="symbol_offsets",
+            builder=lambda: np.concatenate((
+                [0],
+                np.cumsum([len(self._buffers[symbol]) for symbol in self._symbols], dtype=np.int64)
+            )).astype(np.int64)
+        )
+
+    @property
+    def latest_rows(self) -> pd.DataFrame:
+        """Returns the last row of each symbol, with all the indicator columns.
+        Overview:
+        ----
+        The table is read straight from the end of each symbol buffer and cached
+        until the next append or column write, so its cost depends on the number
+        of symbols and not on the length of the history.
+        Returns:
+        ----
+        {pd.DataFrame} -- One row per symbol, indexed by `symbol` and `datetime`.
+        """
+
+        return self._cached(
+            key="latest_rows",
+            builder=lambda: self._build_rows(back=1),
+            stamp=self._version
+        )
+
+    @property
+    def previous_rows(self) -> pd.DataFrame:
+        """Returns the row before the last row of each symbol, lined up with `latest_rows`.
+        Overview:
+        ----
+        Crossover signals compare the latest bar with this one. A symbol with a
+        single bar gets `NaN` values and a `NaT` timestamp.
+        Returns:
+        ----
+        {pd.DataFrame} -- One row per symbol, indexed by `symbol` and `datetime`.
+        """
+
+        return self._cached(
+            key="previous_rows",
+            builder=lambda: self._build_rows(back=2),
+            stamp=self._version
+        )
+
+    def window(self, symbol: str, start: Union[dt, pd.Timestamp, int] = None,
+               end: Union[dt, pd.Timestamp, int] = None) -> Dict[str, np.ndarray]:
+        """Returns the bars of a symbol between two points in time.
+        Overview:
+        ----
+        The rows are found with a binary search on the symbol's sorted timestamps
+        and returned as views into its buffer, so nothing is scanned or copied.
+        Arguments:
+        ----
+        symbol {str} -- The symbol to grab.
+        Keyword Arguments:
+        ----
+        start {Union[datetime, pd.Timestamp, int]} -- The first time to include, integers
+            are nanoseconds since epoch. (default: {the first bar})
+        end {Union[datetime, pd.Timestamp, int]} -- The last time to include, integers
+            are nanoseconds since epoch. (default: {the last bar})
+        Returns:
+        ----
+        {Dict[str, np.ndarray]} -- The `datetime` array and one array per column.
+        Usage:
+        ----
+            >>> last_30_minutes = stock_frame.window(
+                symbol='MSFT',
+                start=dt.utcnow() - timedelta(minutes=30)
+            )
+            >>> last_30_minutes['close'].mean()
+        """
+
+        buffer = self._buffers[symbol]
+
+        first = 0
+        last = len(buffer)
+
+        if start is not None:
+            first = int(np.searchsorted(buffer.index, self._to_nanoseconds(start), side='left'))
+
+        if end is not None:
+            last = int(np.searchsorted(buffer.index, self._to_nanoseconds(end), side='right'))
+
+        return self._buffer_view(buffer=buffer, first=first, last=max(first, last))
+
+    def last_n(self, symbol: str, n: int) -> Dict[str, np.ndarray]:
+        """Returns the last `n` bars of a symbol as views into its buffer.
+        Arguments:
+        ----
+        symbol {str} -- The symbol to grab.
+        n {int} -- The number of bars.
+        Returns:
+        ----
+        {Dict[str, np.ndarray]} -- The `datetime` array and one array per column.
+        """
+
+        buffer = self._buffers[symbol]
+
+        return self._buffer_view(buffer=buffer, first=max(len(buffer) - n, 0), last=len(buffer))
+
+    def _buffer_view(self, buffer: SymbolBuffer, first: int, last: int) -> Dict[str, np.ndarray]:
+
+        view = {'datetime': buffer.index[first:last].view('datetime64[ns]')}
+
+        for column in self._columns:
+            view[column] = buffer.column(column)[first:last]
+
+        return view
+
+    @staticmethod
+    def _to_nanoseconds(moment: Union[dt, pd.Timestamp, int]) -> int:
+        """Converts a point in time to nanoseconds since epoch, naive times are taken as UTC."""
+
+        if isinstance(moment, (int, np.integer)):
+            return int(moment)
+
+        moment = pd.Timestamp(moment)
+
+        if moment.tzinfo is not None:
+            moment = moment.tz_convert('UTC').tz_localize(None)
+
+        return moment.value
 
     def symbol_rolling_groups(self, size: int) -> RollingGroupby:
 
-        if not self._symbol_groups:
-            self._symbol_groups
+        return self._cached(
+            key="symbol_rolling_groups_{size}".format(size=size),
+            builder=lambda: self.symbol_groups.rolling(size)
+        )
+
+    def _cached(self, key: str, builder, stamp: int = None) -> object:
+        """Returns a cached value, rebuilding it if the rows changed since it was stored.
+        Overview:
+        ----
+        Every cached value is stamped with the layout version it was built against.
+        Writing a column bumps the data version but keeps the layout, because the
+        new values are written into the cached frame in place.
+        Arguments:
+        ----
+        key {str} -- The name of the cached value.
+        builder {Callable} -- Builds the value when the cache is stale.
+        Keyword Arguments:
+        ----
+        stamp {int} -- The version the value depends on, values that read the column
+            data pass the data version. (default: {the layout version})
+        Returns:
+        ----
+        {object} -- The cached value.
+        """
+
+        if stamp is None:
+            stamp = self._layout_version
+
+        cached_stamp, value = self._cache.get(key, (None, None))
+
+        if cached_stamp != stamp:
+            value = builder()
+            self._cache[key] = (stamp, value)
+
+        return value
+
+    def create_data(self) -> None:
+        """Loads the candles passed to the constructor into the buffers.
+        Overview:
+        ----
+        Only the buffers are filled, the MultiIndex frame is built the first
+        time `frame` is read.
+        """
+
+        # Load the candles into the buffers
+        self.add_rows(data=self._data)
+
+    def _get_buffer(self, symbol: str, capacity: int = 256) -> SymbolBuffer:
+        """Grabs the buffer for a symbol, creating it if this is a new symbol."""
+
+        if symbol not in self._buffers:
+            if self._archive:
+                self._buffers[symbol] = self._archive.open_buffer(
+                    symbol=symbol,
+                    columns=self._columns,
+                    capacity=capacity,
+                    dtypes=self._dtypes
+                )
+            else:
+                self._buffers[symbol] = SymbolBuffer(
+                    columns=self._columns,
+                    capacity=capacity,
+                    dtypes=self._dtypes
+                )
+            bisect.insort(self._symbols, symbol)
+
+        return self._buffers[symbol]
+
+    def _add_column(self, column_name: str) -> None:
+        """Adds a column to every buffer, picking its dtype from the storage mode."""
+
+        if column_name in self._columns:
+            return
+
+        if self._compact:
+            dtype = np.dtype(COMPACT_DTYPES.get(column_name, np.float32))
+        else:
+            dtype = np.dtype(np.float64)
+
+        self._columns.append(column_name)
+        self._dtypes[column_name] = dtype
+
+        for buffer in self._buffers.values():
+            buffer.add_column(column_name=column_name, dtype=dtype)
+
+    def _cast_block(self, values: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Casts a block of new values to the dtypes of their columns.
+        Overview:
+        ----
+        Missing values in integer columns become zero. If a value does not fit an
+        unsigned integer column, the column is widened to `uint64` first.
+        """
+
+        for column, column_values in values.items():
+
+            dtype = self._dtypes[column]
+
+            if not np.issubdtype(dtype, np.integer):
+                values[column] = column_values.astype(dtype)
+                continue
 
-        self._symbol_rolling_groups = self._symbol_groups.rolling(size)
+            column_values = np.nan_to_num(column_values, nan=0.0)
 
-        return self._symbol_rolling_groups
+            if len(column_values) and column_values.max() > np.iinfo(dtype).max:
+                dtype = np.dtype(np.uint64)
+                self._dtypes[column] = dtype
+                for buffer in self._buffers.values():
+                    buffer.astype(column_name=column, dtype=dtype)
 
-    def create_data(self) -> pd.DataFrame:
+            values[column] = column_values.astype(dtype)
 
-        # Make a data frame
-        price_df = pd.DataFrame(data=self._data)
-        price_df = self._parse_datetime_column(price_df=price_df)
-        price_df = self._set_multi_index(price=price_df)
+        return values
 
-        return price_df
+    def memory_report(self) -> Dict:
+        """Reports how much memory the bars use.
+        Overview:
+        ----
+        Compares the bytes per bar of the buffers with the bytes per bar the same
+        bars would take as `float64` columns, and with the bytes per bar of the
+        built data frame, index included.
+        Returns:
+        ----
+        {Dict} -- The number of bars and the memory use in bytes.
+        Usage:
+        ----
+            >>> stock_frame = StockFrame(data=historical_prices, compact=True)
+            >>> stock_frame.memory_report()
+            {'bars': 39000, 'columns': 5, 'bytes_per_bar': 28.0, 'float64_bytes_per_bar': 48.0, ...}
+        """
 
-    def _parse_datetime_column(self, price_df: pd.DataFrame) -> pd.DataFrame:
+        bars = sum(len(buffer) for buffer in self._buffers.values())
+        buffer_bytes = sum(buffer.nbytes for buffer in self._buffers.values())
+        frame_bytes = int(self.frame.memory_usage(index=True, deep=True).sum())
 
-        price_df["datetime"] = pd.to_datetime(
-            price_df["datetime"], unit="ms", origin="unix")
+        return {
+            'bars': bars,
+            'columns': len(self._columns),
+            'bytes': buffer_bytes,
+            'bytes_per_bar': buffer_bytes / bars if bars else 0.0,
+            'float64_bytes_per_bar': 8.0 * (1 + len(self._columns)),
+            'frame_bytes': frame_bytes,
+            'frame_bytes_per_bar': frame_bytes / bars if bars else 0.0
+        }
 
-        return price_df
+    def _invalidate(self) -> None:
+        """Bumps the versions after the rows change so every cached value gets rebuilt."""
 
-    def _set_multi_index(self, price_df: pd.DataFrame) -> pd.DataFrame:
+        self._version += 1
+        self._layout_version = self._version
+        self._cache.clear()
 
-        price_df = price_df.set_index(keys=["symbol", "datetime"])
+    def _build_frame(self) -> pd.DataFrame:
+        """Builds the multi-index data frame from the symbol buffers."""
 
-        return price_df
+        self._stale_columns.clear()
 
-    def add_rows(self, data: dict) -> None:
+        buffers = [self._buffers[symbol] for symbol in self._symbols]
+        sizes = [len(buffer) for buffer in buffers]
+
+        if buffers:
+            timestamps = np.concatenate([buffer.index for buffer in buffers])
+            data = {
+                column: np.concatenate([buffer.column(column) for buffer in buffers])
+                for column in self._columns
+            }
+        else:
+            timestamps = np.empty(0, dtype=np.int64)
+            data = {column: np.empty(0, dtype=self._dtypes[column]) for column in self._columns}
+
+        # Build the index straight from integer codes, one level entry per symbol.
+        datetimes, datetime_codes = np.unique(timestamps, return_inverse=True)
+
+        index = pd.MultiIndex(
+            levels=[
+                pd.Index(self._symbols, dtype=object),
+                pd.DatetimeIndex(datetimes.view("datetime64[ns]"))
+            ],
+            codes=[
+                np.repeat(np.arange(len(self._symbols)), sizes),
+                datetime_codes.ravel()
+            ],
+            names=["symbol", "datetime"]
+        )
 
-        column_names = ["open", "close", "high", "low", "volume"]
+        return pd.DataFrame(data=data, index=index, columns=self._columns)
 
-        for symbol in data:
+    def _build_rows(self, back: int) -> pd.DataFrame:
+        """Builds a table of the row `back` bars from the end of each symbol buffer.
+        Arguments:
+        ----
+        back {int} -- `1` for the last row, `2` for the row before it.
+        Returns:
+        ----
+        {pd.DataFrame} -- One row per symbol with bars, missing rows are `NaN`
+            and their columns are `float64`.
+        """
+
+        symbols = [symbol for symbol in self._symbols if len(self._buffers[symbol])]
+        buffers = [self._buffers[symbol] for symbol in symbols]
+
+        present = all(len(buffer) >= back for buffer in buffers)
+
+        index = pd.MultiIndex.from_arrays(
+            [
+                pd.Index(symbols, dtype=object),
+                pd.DatetimeIndex(
+                    np.array(
+                        [buffer.index[-back] if len(buffer) >= back else np.iinfo(np.int64).min for buffer in buffers],
+                        dtype=np.int64
+                    ).view("datetime64[ns]")
+                )
+            ],
+            names=["symbol", "datetime"]
+        )
 
-            # Parse the timestamp
-            time_stamp = pd.to_datetime(
-                data[symbol]["quoteTimeInLong"],
-                unit="ms",
-                origin="unix"
+        data = {
+            column: np.array(
+                [buffer.column(column)[-back] if len(buffer) >= back else np.nan for buffer in buffers],
+                dtype=self._dtypes[column] if present else np.float64
             )
+            for column in self._columns
+        }
 
-            # Define our index
-            row_id = (symbol, time_stamp)
+        return pd.DataFrame(data=data, index=index, columns=self._columns)
 
-            # Define our values
-            row_values = [
-                data[symbol]["openPrice"],
-                data[symbol]["closePrice"],
-                data[symbol]["highPrice"],
-                data[symbol]["lowPrice"],
-                data[symbol]["askSize"] + data[symbol]["bidSize"]
-            ]
+    def set_column(self, column_name: str, values: Union[np.ndarray, pd.Series]) -> None:
+        """Stores a full column, for example an indicator, in the buffers.
+        Arguments:
+        ----
+        column_name {str} -- The name of the column.
+        values {Union[np.ndarray, pd.Series]} -- The values, aligned with the rows of `frame`.
+        """
+
+        self._add_column(column_name=column_name)
+
+        values = np.asarray(values, dtype=self._dtypes[column_name])
+
+        offset = 0
 
-            # New row
-            new_row = pd.Series(data=row_values)
+        for symbol in self._symbols:
+            buffer = self._buffers[symbol]
+            buffer.column(column_name)[:] = values[offset:offset + len(buffer)]
+            offset += len(buffer)
 
-            # Add the row
-            self.frame.loc[row_id, column_names] = new_row.values
-            self.frame.sort_index(inplace=True)
+        self._version += 1
+        self._stale_columns.discard(column_name)
+
+        # The layout did not change, so update the cached frame in place.
+        stamp, frame = self._cache.get("frame", (None, None))
+
+        if stamp == self._layout_version:
+            frame[column_name] = values
+
+    def buffer(self, symbol: str) -> SymbolBuffer:
+        """Returns the buffer holding a symbol's rows."""
+
+        return self._buffers[symbol]
+
+    def write_rows(self, column_name: str, symbol: str, position: int, values: np.ndarray) -> None:
+        """Writes values into a column for one symbol, starting at a row position.
+        Overview:
+        ----
+        Used by incremental indicators to write only the rows that changed. The
+        cached frame picks up the new values the next time it is read.
+        Arguments:
+        ----
+        column_name {str} -- The name of the column.
+        symbol {str} -- The symbol to write to.
+        position {int} -- The position of the first row within the symbol.
+        values {np.ndarray} -- The values to write.
+        """
+
+        self._add_column(column_name=column_name)
+
+        buffer = self._buffers[symbol]
+        buffer.column(column_name)[position:position + len(values)] = values
+
+        self._version += 1
+
+        if "frame" in self._cache:
+            self._stale_columns.add(column_name)
+
+    def add_rows(self, data: Union[List[Dict], Dict[str, Dict]]) -> None:
+        """Adds a batch of bars to the StockFrame in one pass.
+        Overview:
+        ----
+        The batch is turned into one aligned block, the block is sorted by symbol
+        and timestamp, and each symbol's slice is merged into its buffer in a single
+        step. The cached frame and groups are dropped once for the whole batch.
+        Arguments:
+        ----
+        data {Union[List[Dict], Dict[str, Dict]]} -- Either a list of candles, like the
+            ones returned by `get_latest_bar`, or a quote dictionary keyed by symbol, like
+            the one returned by `get_quotes`.
+        Usage:
+        ----
+            >>> latest_bars = trading_robot.get_latest_bar()
+            >>> stock_frame.add_rows(data=latest_bars)
+        """
+
+        symbols, timestamps, values = self._build_block(data=data)
+
+        self._add_block(symbols=symbols, timestamps=timestamps, values=values)
+
+    def add_arrays(self, symbols: np.ndarray, timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """Adds a batch of bars that is already in column form, like the columns of another StockFrame.
+        Arguments:
+        ----
+        symbols {np.ndarray} -- The symbol of each row.
+        timestamps {np.ndarray} -- The timestamp of each row in nanoseconds since epoch.
+        values {Dict[str, np.ndarray]} -- The value columns of the batch.
+        """
+
+        self._add_block(
+            symbols=np.asarray(symbols, dtype=object),
+            timestamps=np.asarray(timestamps, dtype=np.int64),
+            values={column: np.asarray(column_values) for column, column_values in values.items()}
+        )
+
+    def _add_block(self, symbols: np.ndarray, timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """Sorts a block of rows and merges each symbol's slice into its buffer.
+        Arguments:
+        ----
+        symbols {np.ndarray} -- The symbol of each row.
+        timestamps {np.ndarray} -- The timestamp of each row in nanoseconds.
+        values {Dict[str, np.ndarray]} -- The value columns of the block.
+        """
+
+        if not len(symbols):
+            return
+
+        for column in values:
+            self._add_column(column_name=column)
+
+        values = self._cast_block(values=values)
+
+        # Sort only the new block.
+        order = np.lexsort((timestamps, symbols))
+        symbols = symbols[order]
+        timestamps = timestamps[order]
+        values = {column: column_values[order] for column, column_values in values.items()}
+
+        # Keep the last row when the block repeats a bar.
+        last = np.ones(len(symbols), dtype=bool)
+        last[:-1] = (symbols[1:] != symbols[:-1]) | (timestamps[1:] != timestamps[:-1])
+
+        if not last.all():
+            symbols = symbols[last]
+            timestamps = timestamps[last]
+            values = {column: column_values[last] for column, column_values in values.items()}
+
+        # Split the sorted block into one contiguous slice per symbol.
+        boundaries = np.flatnonzero(symbols[1:] != symbols[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(symbols)]))
+
+        changed = {}
+
+        for start, end in zip(starts, ends):
+            buffer = self._get_buffer(
+                symbol=symbols[start],
+                capacity=max(2 * (end - start), 256)
+            )
+            buffer.merge(
+                timestamps=timestamps[start:end],
+                values={column: column_values[start:end] for column, column_values in values.items()}
+            )
+            changed[symbols[start]] = (timestamps[start], timestamps[end - 1])
+
+        self._apply_retention(symbols=list(changed))
+
+        # Flush the archive once the whole block, retention included, is in.
+        if self._archive and time_true.monotonic() - self._flushed_at >= self._flush_interval:
+            self.flush()
+
+        self._invalidate()
+        self._update_timeframes(changed=changed)
+
+    def flush(self) -> None:
+        """Writes the bars of an archive-backed StockFrame to disk, along with their headers.
+        Overview:
+        ----
+        `add_rows` calls this every `flush_interval` seconds. Until then the new bars
+        are only in the shared mappings, so they survive the bot crashing but not the
+        machine going down, and a restart doesn't see them yet.
+        Usage:
+        ----
+            >>> stock_frame.flush()
+        """
+
+        for buffer in self._buffers.values():
+            buffer.flush()
+
+        self._flushed_at = time_true.monotonic()
+
+    def set_retention(self, max_bars: int = None, max_age: timedelta = None, spill: BarArchive = None) -> None:
+        """Bounds how much history the StockFrame keeps for each symbol.
+        Overview:
+        ----
+        After every batch, each symbol that got new bars drops its oldest bars until
+        it is within the limits. If both limits are set the stricter one wins. A symbol
+        never drops below the warm-up its indicators registered with `set_warmup`,
+        including the latest session of indicators that start over every session, or
+        below the length of the longest timeframe added with `add_timeframe`.
+
+        On a StockFrame backed by a BarArchive, the dropped bars only leave the
+        mapped view, the archive keeps them, so there is nothing to spill. Timeframes
+        added with `add_timeframe` keep the same limits in their own bars.
+        Keyword Arguments:
+        ----
+        max_bars {int} -- The most bars to keep per symbol. (default: {None})
+        max_age {timedelta} -- The longest span of history to keep per symbol, measured
+            from the symbol's latest bar. (default: {None})
+        spill {BarArchive} -- An archive to move the dropped bars into instead of
+            throwing them away. (default: {None})
+        Usage:
+        ----
+            >>> stock_frame.set_retention(
+                max_age=timedelta(days=2),
+                spill=BarArchive(path='data/bars')
+            )
+        """
+
+        self._max_bars = max_bars
+        self._max_age = None
+        self._spill = spill
+
+        if max_age is not None:
+            self._max_age = int(max_age.total_seconds() * 1_000_000_000)
+
+        for _, stock_frame in self._timeframes.values():
+            stock_frame.set_retention(max_bars=max_bars, max_age=max_age)
+
+        self._apply_retention(symbols=self._symbols)
+        self._invalidate()
+
+    @property
+    def warmup(self) -> Dict[str, int]:
+        """Returns the bars of history each consumer registered with `set_warmup`."""
+
+        return dict(self._warmup)
+
+    @property
+    def session_warmup(self) -> Dict[str, int]:
+        """Returns the session start each consumer registered with `set_warmup`, in nanoseconds past midnight UTC."""
+
+        return dict(self._session_warmup)
+
+    def set_warmup(self, name: str, bars: int, session_start: int = None) -> None:
+        """Registers the number of bars a consumer, like an indicator, needs to stay exact.
+        Arguments:
+        ----
+        name {str} -- The name of the consumer, for example the indicator column.
+        bars {int} -- The number of bars of history it needs.
+        Keyword Arguments:
+        ----
+        session_start {int} -- For consumers that start over every session, like the VWAP,
+            the start of the session in nanoseconds past midnight UTC. Every bar of the
+            latest session is kept as well. (default: {None})
+        """
+
+        self._warmup[name] = bars
+
+        if session_start is not None:
+            self._session_warmup[name] = session_start
+
+    def _apply_retention(self, symbols: List[str]) -> None:
+        """Drops, or spills, the bars that fall outside the retention policy."""
+
+        if self._max_bars is None and self._max_age is None:
+            return
+
+        warmup_bars = max(self._warmup.values(), default=0)
+        warmup_age = max(
+            (resampler.bucket_size for resampler, _ in self._timeframes.values()),
+            default=0
+        )
+        session_starts = set(self._session_warmup.values())
+
+        for symbol in symbols:
+
+            buffer = self._buffers[symbol]
+            keep = len(buffer)
+
+            if not keep:
+                continue
+
+            if self._max_bars is not None:
+                keep = min(keep, self._max_bars)
+
+            if self._max_age is not None:
+                cutoff = buffer.index[-1] - self._max_age
+                keep = min(keep, len(buffer) - int(np.searchsorted(buffer.index, cutoff, side='left')))
+
+            # Never cut into the warm-up or the session of an indicator, or the open bucket of a timeframe.
+            keep = max(keep, min(warmup_bars, len(buffer)))
+
+            if warmup_age:
+                cutoff = buffer.index[-1] - buffer.index[-1] % warmup_age
+                keep = max(keep, len(buffer) - int(np.searchsorted(buffer.index, cutoff, side='left')))
+
+            for session_start in session_starts:
+                cutoff = buffer.index[-1] - (buffer.index[-1] - session_start) % BAR_TYPE_NANOSECONDS['daily']
+                keep = max(keep, len(buffer) - int(np.searchsorted(buffer.index, cutoff, side='left')))
+
+            if keep >= len(buffer):
+                continue
+
+            timestamps, values = buffer.drop_front(rows=len(buffer) - keep)
+
+            # An archive still holds the rows it dropped from view.
+            if self._spill and not self._archive:
+                self._spill_rows(symbol=symbol, timestamps=timestamps, values=values)
+
+    def _spill_rows(self, symbol: str, timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """Moves dropped bars into the spill archive."""
+
+        if symbol not in self._spill_buffers:
+            self._spill_buffers[symbol] = self._spill.open_buffer(
+                symbol=symbol,
+                columns=self._columns,
+                dtypes=self._dtypes
+            )
+
+        spill_buffer = self._spill_buffers[symbol]
+
+        for column in values:
+            spill_buffer.add_column(column_name=column, dtype=self._dtypes[column])
+
+        spill_buffer.merge(timestamps=timestamps, values=values)
+        spill_buffer.flush()
+
+    def add_timeframe(self, bar_size: int, bar_type: str = 'minute') -> 'StockFrame':
+        """Adds a higher timeframe view of the bars that is kept up to date as bars arrive.
+        Overview:
+        ----
+        The history is rolled up once when the timeframe is added. After that, every
+        batch passed to `add_rows` only rebuilds the buckets it touched, which is
+        normally just the open bucket of each symbol. The open bucket shows up as
+        the last row of each symbol, and it is final once a bar lands in the next bucket.
+        Arguments:
+        ----
+        bar_size {int} -- The number of `bar_type` units in one bar, for example `5`.
+        Keyword Arguments:
+        ----
+        bar_type {str} -- One of `minute`, `hour` or `daily`. (default: {'minute'})
+        Returns:
+        ----
+        {StockFrame} -- A StockFrame holding the higher timeframe bars.
+        Usage:
+        ----
+            >>> stock_frame = trading_robot.new_stock_frame(data=historical_prices['aggregated'])
+            >>> stock_frame_5_min = stock_frame.add_timeframe(bar_size=5, bar_type='minute')
+            >>> stock_frame_hourly = stock_frame.add_timeframe(bar_size=1, bar_type='hour')
+        """
+
+        key = (bar_size, bar_type)
+
+        if key not in self._timeframes:
+
+            self._timeframes[key] = (
+                BarResampler(bar_size=bar_size, bar_type=bar_type),
+                StockFrame(data=[], compact=self._compact)
+            )
+
+            if self._max_bars is not None or self._max_age is not None:
+                self._timeframes[key][1].set_retention(
+                    max_bars=self._max_bars,
+                    max_age=None if self._max_age is None else timedelta(microseconds=self._max_age // 1000)
+                )
+
+            # Roll up the history that is already loaded.
+            self._update_timeframes(
+                changed={symbol: (None, None) for symbol in self._symbols},
+                keys=[key]
+            )
+
+        return self._timeframes[key][1]
+
+    def timeframe(self, bar_size: int, bar_type: str = 'minute') -> 'StockFrame':
+        """Returns a timeframe added with `add_timeframe`."""
+
+        return self._timeframes[(bar_size, bar_type)][1]
+
+    def _update_timeframes(self, changed: Dict[str, tuple], keys: List[tuple] = None) -> None:
+        """Rebuilds the higher timeframe buckets touched by a batch.
+        Arguments:
+        ----
+        changed {Dict[str, tuple]} -- The first and last changed timestamp of each symbol.
+        Keyword Arguments:
+        ----
+        keys {List[tuple]} -- The timeframes to update. (default: {all of them})
+        """
+
+        for key in keys or list(self._timeframes):
+
+            resampler, stock_frame = self._timeframes[key]
+
+            block_symbols = []
+            block_timestamps = []
+            block_values = {}
+
+            for symbol, (start, end) in changed.items():
+
+                buckets, values = resampler.aggregate(
+                    buffer=self._buffers[symbol],
+                    start=start,
+                    end=end
+                )
+
+                block_symbols.append(np.full(len(buckets), symbol, dtype=object))
+                block_timestamps.append(buckets)
+
+                for column, column_values in values.items():
+                    block_values.setdefault(column, []).append(column_values)
+
+            if not block_symbols:
+                continue
+
+            stock_frame._add_block(
+                symbols=np.concatenate(block_symbols),
+                timestamps=np.concatenate(block_timestamps),
+                values={column: np.concatenate(column_values) for column, column_values in block_values.items()}
+            )
+
+    def _build_block(self, data: Union[List[Dict], Dict[str, Dict]]) -> tuple:
+        """Turns a list of candles or a quote dictionary into aligned arrays.
+        Arguments:
+        ----
+        data {Union[List[Dict], Dict[str, Dict]]} -- The candles or quotes.
+        Returns:
+        ----
+        {tuple} -- The symbols, the timestamps in nanoseconds and a dictionary of value columns.
+        """
+
+        if isinstance(data, dict):
+
+            symbols = list(data.keys())
+            quotes = [data[symbol] for symbol in symbols]
+
+            timestamps = [quote["quoteTimeInLong"] for quote in quotes]
+            values = {
+                "open": [quote["openPrice"] for quote in quotes],
+                "close": [quote["closePrice"] for quote in quotes],
+                "high": [quote["highPrice"] for quote in quotes],
+                "low": [quote["lowPrice"] for quote in quotes],
+                "volume": [quote["askSize"] + quote["bidSize"] for quote in quotes]
+            }
+
+        else:
+
+            symbols = [candle["symbol"] for candle in data]
+            timestamps = [candle["datetime"] for candle in data]
+
+            value_columns = []
+            for candle in data:
+                for column in candle:
+                    if column not in ("symbol", "datetime") and column not in value_columns:
+                        value_columns.append(column)
+
+            values = {
+                column: [candle.get(column, np.nan) for candle in data] for column in value_columns
+            }
+
+        symbols = np.array(symbols, dtype=object)
+
+        # Timestamps come in as milliseconds since epoch.
+        timestamps = np.array(timestamps, dtype=np.int64) * 1_000_000
+
+        values = {
+            column: np.array(column_values, dtype=np.float64) for column, column_values in values.items()
+        }
+
+        return symbols, timestamps, values
 
     def do_indicator_exist(self, column_names: List[str]) -> bool:
         """Checks to see if the indicator columns specified exist.
@@ -121,15 +981,15 @@ class StockFrame():
         bool -- `True` if all the columns exist.
         """
 
-        if set(column_names).issubset(self._frame.columns):
+        if set(column_names).issubset(self._columns):
             return True
         else:
             raise KeyError("The following indicator columns are missing from the StockFrame: {missing_columns}".format(
                 missing_columns=set(column_names).difference(
-                    self._frame.columns)
+                    self._columns)
             ))
 
-    def _check_signals(self, indicators: dict, indciators_comp_key: List[str], indicators_key: List[str]) -> Union[pd.DataFrame, None]:
+    def _check_signals(self, indicators: dict, indciators_comp_key: List[str], indicators_key: List[str]) -> Dict[str, pd.Series]:
         """Returns the last row of the StockFrame if conditions are met.
         Overview:
         ----
@@ -137,7 +997,8 @@ class StockFrame():
         conditions that warrant a `buy` or `sell` signal are met. This
         method will take last row for each symbol in the StockFrame and
         compare the indicator column values with the conditions specified
-        by the user.
+        by the user. The rules are compiled by a `SignalEngine`, so every
+        rule counts, including the max bounds, and they are checked together.
         If the conditions are met the row will be returned back to the user.
         Arguments:
         ----
@@ -149,96 +1010,20 @@ class StockFrame():
             one indicator to a numerical value.
         Returns:
         ----
-        {Union[pd.DataFrame, None]} -- If signals are generated then, a pandas.DataFrame object
-            will be returned. If no signals are found then nothing will be returned.
+        {Dict[str, pd.Series]} -- The `buys` and `sells` rows, indexed by `symbol` and `datetime`.
+            A side without signals is an empty series.
         """
 
-        # Grab the last rows.
-        last_rows = self._symbol_groups.tail(1)
-
-        # Define a list of conditions.
-        conditions = {}
+        signal_engine = SignalEngine(
+            indicators=indicators,
+            indicators_comp_key=indciators_comp_key,
+            indicators_key=indicators_key
+        )
 
         # Check to see if all the columns exist.
-        if self.do_indicator_exist(column_names=indicators_key):
-
-            for indicator in indicators_key:
-
-                column = last_rows[indicator]
-
-                # Grab the Buy & Sell Condition.
-                buy_condition_target = indicators[indicator]['buy']
-                sell_condition_target = indicators[indicator]['sell']
-
-                buy_condition_operator = indicators[indicator]['buy_operator']
-                sell_condition_operator = indicators[indicator]['sell_operator']
-
-                condition_1: pd.Series = buy_condition_operator(
-                    column, buy_condition_target
-                )
-                condition_2: pd.Series = sell_condition_operator(
-                    column, sell_condition_target
-                )
-
-                condition_1 = condition_1.where(lambda x: x == True).dropna()
-                condition_2 = condition_2.where(lambda x: x == True).dropna()
-
-                conditions['buys'] = condition_1
-                conditions['sells'] = condition_2
-
-        # Store the indicators in a list.
-        check_indicators = []
-
-        # Split the name so we can check if the indicator exist.
-        for indicator in indciators_comp_key:
-            parts = indicator.split('_comp_')
-            check_indicators += parts
-
-        if self.do_indicator_exist(column_names=check_indicators):
-
-            for indicator in indciators_comp_key:
-
-                # Split the indicators.
-                parts = indicator.split('_comp_')
-
-                # Grab the indicators that need to be compared.
-                indicator_1 = last_rows[parts[0]]
-                indicator_2 = last_rows[parts[1]]
-
-                # If we have a buy operator, grab it.
-                if indicators[indicator]['buy_operator']:
+        self.do_indicator_exist(column_names=signal_engine.columns)
 
-                    # Grab the Buy Operator.
-                    buy_condition_operator = indicators[indicator]['buy_operator']
-
-                    # Grab the Condition.
-                    condition_1: pd.Series = buy_condition_operator(
-                        indicator_1, indicator_2
-                    )
-
-                    # Keep the one's that aren't null.
-                    condition_1 = condition_1.where(
-                        lambda x: x == True).dropna()
-
-                    # Add it as a buy signal.
-                    conditions['buys'] = condition_1
-
-                # If we have a sell operator, grab it.
-                if indicators[indicator]['sell_operator']:
-
-                    # Grab the Sell Operator.
-                    sell_condition_operator = indicators[indicator]['sell_operator']
-
-                    # Store it in a Pd.Series.
-                    condition_2: pd.Series = sell_condition_operator(
-                        indicator_1, indicator_2
-                    )
-
-                    # keep the one's that aren't null.
-                    condition_2 = condition_2.where(
-                        lambda x: x == True).dropna()
-
-                    # Add it as a sell signal.
-                    conditions['sells'] = condition_2
-
-        return conditions
+        return signal_engine.evaluate(
+            frame=self.latest_rows,
+            previous=self.previous_rows if signal_engine.crossovers else None
+        )
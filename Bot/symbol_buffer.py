@@ -0,0 +1,310 @@
+import numpy as np
+
+from typing import List
+from typing import Dict
+
+
+class SymbolBuffer():
+
+    """
+    Represents the preallocated column storage for a single symbol. Rows
+    are kept sorted by timestamp and appends are amortized O(1).
+    """
+
+    def __init__(self, columns: List[str], capacity: int = 256, dtypes: Dict[str, np.dtype] = None) -> None:
+        """Initalizes the buffer.
+        Arguments:
+        ----
+        columns {List[str]} -- The value columns the buffer will hold.
+        Keyword Arguments:
+        ----
+        capacity {int} -- The number of rows to preallocate. (default: {256})
+        dtypes {Dict[str, np.dtype]} -- The dtype of each column, columns that are
+            not listed are stored as `float64`. (default: {None})
+        """
+
+        self._size = 0
+        self._edits = 0
+        self._capacity = max(int(capacity), 1)
+        self._index = self._allocate(
+            column_name="datetime",
+            dtype=np.int64,
+            capacity=self._capacity
+        )
+        self._columns: Dict[str, np.ndarray] = {}
+
+        dtypes = dtypes or {}
+
+        for column in columns:
+            self.add_column(
+                column_name=column,
+                dtype=dtypes.get(column, np.float64)
+            )
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def index(self) -> np.ndarray:
+        """Returns a view of the timestamps (ns since epoch) in use."""
+
+        return self._index[:self._size]
+
+    @property
+    def edits(self) -> int:
+        """Returns a counter that goes up when rows before the last row are inserted or rewritten.
+        Overview:
+        ----
+        Appends, a new copy of the last bar and dropping old rows leave the counter
+        alone, so consumers that keep running state only need to start over when
+        it changes.
+        """
+
+        return self._edits
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    def column(self, column_name: str) -> np.ndarray:
+        """Returns a view of the values in use for a column."""
+
+        return self._columns[column_name][:self._size]
+
+    @property
+    def dtypes(self) -> Dict[str, np.dtype]:
+        return {column_name: values.dtype for column_name, values in self._columns.items()}
+
+    @property
+    def nbytes(self) -> int:
+        """Returns the number of bytes used by the rows in use."""
+
+        return self._size * (
+            self._index.dtype.itemsize +
+            sum(values.dtype.itemsize for values in self._columns.values())
+        )
+
+    def add_column(self, column_name: str, dtype: np.dtype = np.float64) -> None:
+        """Adds a new column, float columns are filled with `NaN` values."""
+
+        if column_name not in self._columns:
+            self._columns[column_name] = self._allocate(
+                column_name=column_name,
+                dtype=dtype,
+                capacity=self._capacity
+            )
+
+    def astype(self, column_name: str, dtype: np.dtype) -> None:
+        """Changes the dtype of a column, for example to widen an integer column."""
+
+        values = np.array(self.column(column_name), dtype=dtype)
+
+        del self._columns[column_name]
+        self._discard(column_name=column_name)
+
+        self.add_column(column_name=column_name, dtype=dtype)
+        self._columns[column_name][:self._size] = values
+
+    def _discard(self, column_name: str) -> None:
+        """Releases the storage of a dropped column. In-memory storage is garbage collected."""
+
+        pass
+
+    @staticmethod
+    def _missing(dtype: np.dtype, rows: int) -> np.ndarray:
+        """Returns the fill values for rows without a value, `NaN` or zero for integers."""
+
+        if np.issubdtype(dtype, np.floating):
+            return np.full(rows, np.nan, dtype=dtype)
+
+        return np.zeros(rows, dtype=dtype)
+
+    def _allocate(self, column_name: str, dtype: np.dtype, capacity: int) -> np.ndarray:
+        """Allocates the storage for a column, float columns start out as `NaN`."""
+
+        return self._missing(dtype=dtype, rows=capacity)
+
+    def _resize(self, column_name: str, values: np.ndarray, capacity: int) -> np.ndarray:
+        """Moves a column into storage with room for `capacity` rows."""
+
+        new_values = self._allocate(
+            column_name=column_name,
+            dtype=values.dtype,
+            capacity=capacity
+        )
+        new_values[:self._size] = values[:self._size]
+
+        return new_values
+
+    def flush(self) -> None:
+        """Persists the buffer. In-memory buffers have nothing to do."""
+
+        pass
+
+    def reserve(self, rows: int) -> None:
+        """Makes sure there is room for `rows` more rows, doubling the capacity when needed."""
+
+        required = self._size + rows
+
+        if required <= self._capacity:
+            return
+
+        capacity = max(self._capacity * 2, required)
+
+        self._index = self._resize(
+            column_name="datetime",
+            values=self._index,
+            capacity=capacity
+        )
+
+        for column_name, values in self._columns.items():
+            self._columns[column_name] = self._resize(
+                column_name=column_name,
+                values=values,
+                capacity=capacity
+            )
+
+        self._capacity = capacity
+
+    def drop_front(self, rows: int) -> tuple:
+        """Drops the oldest rows from the buffer.
+        Arguments:
+        ----
+        rows {int} -- The number of rows to drop.
+        Returns:
+        ----
+        {tuple} -- A copy of the dropped timestamps and a dictionary of the dropped values.
+        """
+
+        rows = min(rows, self._size)
+        remaining = self._size - rows
+
+        dropped_index = self._index[:rows].copy()
+        dropped_values = {
+            column_name: values[:rows].copy() for column_name, values in self._columns.items()
+        }
+
+        self._index[:remaining] = self._index[rows:self._size]
+
+        for values in self._columns.values():
+            values[:remaining] = values[rows:self._size]
+
+        self._size = remaining
+
+        return dropped_index, dropped_values
+
+    def append(self, timestamp: int, values: Dict[str, float]) -> None:
+        """Adds a single row to the buffer.
+        Overview:
+        ----
+        Rows that arrive in order are written at the end of the buffer. A row with
+        the same timestamp as an existing row overwrites it, and a late row is
+        inserted at its sorted position.
+        Arguments:
+        ----
+        timestamp {int} -- The bar timestamp in nanoseconds since epoch.
+        values {Dict[str, float]} -- The column values for the row.
+        """
+
+        position = self._size
+
+        if self._size and timestamp <= self._index[self._size - 1]:
+
+            position = int(np.searchsorted(self.index, timestamp))
+
+            if position < self._size - 1 or self._index[position] != timestamp:
+                self._edits += 1
+
+            # Same bar again, just update it.
+            if self._index[position] == timestamp:
+                for column_name, value in values.items():
+                    self.add_column(column_name=column_name)
+                    self._columns[column_name][position] = value
+                return
+
+        self.reserve(rows=1)
+
+        # Make room for a late row.
+        if position < self._size:
+            self._index[position + 1:self._size + 1] = self._index[position:self._size]
+            for column_values in self._columns.values():
+                column_values[position + 1:self._size + 1] = column_values[position:self._size]
+
+        self._index[position] = timestamp
+
+        for column_name, column_values in self._columns.items():
+            if column_name in values:
+                column_values[position] = values[column_name]
+            else:
+                column_values[position] = self._missing(dtype=column_values.dtype, rows=1)[0]
+
+        self._size += 1
+
+    def extend(self, timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """Adds a block of rows that is already sorted by timestamp and newer than the buffer."""
+
+        rows = len(timestamps)
+
+        self.reserve(rows=rows)
+
+        self._index[self._size:self._size + rows] = timestamps
+
+        for column_name, column_values in self._columns.items():
+            if column_name in values:
+                column_values[self._size:self._size + rows] = values[column_name]
+            else:
+                column_values[self._size:self._size + rows] = self._missing(
+                    dtype=column_values.dtype,
+                    rows=rows
+                )
+
+        self._size += rows
+
+    def merge(self, timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """Merges a sorted block of rows into the buffer in a single step.
+        Overview:
+        ----
+        Only the rows at or after the first timestamp of the block are touched, so
+        a block that lands at the end of the buffer costs the same as `extend`. Rows
+        in the block replace existing rows with the same timestamp.
+        Arguments:
+        ----
+        timestamps {np.ndarray} -- The sorted, unique timestamps of the block in nanoseconds.
+        values {Dict[str, np.ndarray]} -- The column values of the block.
+        """
+
+        if not len(timestamps):
+            return
+
+        if not self._size or timestamps[0] > self._index[self._size - 1]:
+            self.extend(timestamps=timestamps, values=values)
+            return
+
+        for column_name in values:
+            self.add_column(column_name=column_name)
+
+        # Only the overlapping tail of the buffer takes part in the merge.
+        start = int(np.searchsorted(self.index, timestamps[0]))
+
+        if timestamps[0] < self._index[self._size - 1]:
+            self._edits += 1
+        tail_index = self._index[start:self._size]
+
+        # Drop the old rows the block replaces.
+        keep = ~np.isin(tail_index, timestamps)
+        merged_index = np.concatenate((tail_index[keep], timestamps))
+        order = np.argsort(merged_index, kind="mergesort")
+
+        self.reserve(rows=len(merged_index) - len(tail_index))
+        end = start + len(merged_index)
+
+        for column_name, column_values in self._columns.items():
+            tail_values = column_values[start:self._size][keep]
+            block_values = values.get(column_name)
+            if block_values is None:
+                block_values = self._missing(dtype=column_values.dtype, rows=len(timestamps))
+            column_values[start:end] = np.concatenate(
+                (tail_values, block_values.astype(column_values.dtype)))[order]
+
+        self._index[start:end] = merged_index[order]
+        self._size = end
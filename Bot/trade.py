@@ -1,4 +1,3 @@
-from _typeshed import NoneType
 from datetime import datetime as dt
 from typing import List, Union, Optional
 
@@ -79,12 +79,12 @@ indicator_client.sma(period=50, column_name='sma_50')
 # Add 50-day EMA
 indicator_client.ema(period=50, column_name='ema_50')
 
-# Add Signal Check
-indicator_client.set_indicator_signal_compare(
+# Add Signal Check, buy when the 50 SMA crosses above the 200 SMA and sell when it crosses below.
+indicator_client.set_indicator_signal_crossover(
     indicator_1='sma_50',
     indicator_2='sma_200',
-    condition_buy=operator.ge,
-    condition_sell=operator.le
+    buy='crossover',
+    sell='crossunder'
 )
 
 # Create new Trade Object entering position
@@ -175,8 +175,8 @@ while trading_bot.is_reg_open:
     signals = indicator_client.check_signals()
 
     # Define the buy and sell signals
-    buys = signals['buy'].to_list()
-    sells = signals['sell'].to_list()
+    buys = signals['buys'].to_list()
+    sells = signals['sells'].to_list()
 
     print("-"*50)
     print("Current Signals: ")
@@ -0,0 +1,127 @@
+import json
+import pathlib
+import threading
+
+from datetime import datetime as dt
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Dict
+from typing import List
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+
+class FakeTDServer():
+
+    """
+    Represents a local stand-in for the TD Ameritrade price history API. Each
+    symbol gets one candle per minute between the requested start and end
+    dates, and symbols listed in `failures` answer with an error instead.
+    """
+
+    def __init__(self, failures: Dict[str, int] = None) -> None:
+        """Initalizes the server, call `start` to begin serving.
+        Keyword Arguments:
+        ----
+        failures {Dict[str, int]} -- The status code each failing symbol answers with. A
+            `200` answers with an `error` body and no candles. (default: {None})
+        """
+
+        self.failures = failures or {}
+        self.requests: List[str] = []
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread: threading.Thread = None
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{port}'.format(port=self._server.server_address[1])
+
+    def start(self) -> 'FakeTDServer':
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type:
+
+        fake_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+                # The path is `/v1/marketdata/{symbol}/pricehistory`.
+                symbol = url.path.split('/')[3]
+                fake_server.requests.append(symbol)
+
+                status = fake_server.failures.get(symbol)
+
+                if status is None:
+                    status = 200
+                    body = {'candles': candles(start=int(params['startDate']), end=int(params['endDate'])), 'symbol': symbol}
+                elif status == 200:
+                    body = {'error': 'Bad symbol {symbol}'.format(symbol=symbol)}
+                else:
+                    body = {'error': 'Status {status}'.format(status=status)}
+
+                content = json.dumps(body).encode('utf-8')
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+
+def candles(start: int, end: int) -> List[dict]:
+    """Returns one candle per whole minute between two times in milliseconds since epoch."""
+
+    first = -(-start // 60_000) * 60_000
+
+    return [
+        {
+            'open': 100.0,
+            'close': 101.0,
+            'high': 102.0,
+            'low': 99.0,
+            'volume': 1000,
+            'datetime': timestamp
+        }
+        for timestamp in range(first, end + 1, 60_000)
+    ]
+
+
+def write_credentials(path: pathlib.Path) -> pathlib.Path:
+    """Writes a TDClient credentials file whose tokens won't expire during the tests."""
+
+    expires = (dt.now() + timedelta(days=30)).timestamp()
+
+    with open(path, 'w') as credentials_file:
+        json.dump(
+            obj={
+                'access_token': 'test-access-token',
+                'refresh_token': 'test-refresh-token',
+                'logged_in': True,
+                'access_token_expires_at': expires,
+                'refresh_token_expires_at': expires
+            },
+            fp=credentials_file
+        )
+
+    return path
@@ -0,0 +1,117 @@
+from datetime import datetime as dt
+
+import pytest
+
+from Bot.candle_cache import CandleCache
+
+from tests.fake_td_server import candles
+
+
+# The start of a minute, in milliseconds since epoch.
+START = 1_600_000_020_000
+
+# One minute, in milliseconds.
+MINUTE = 60_000
+
+
+class FakeFetch():
+
+    """Returns one candle per minute of each range and records the ranges, failing on the ones listed."""
+
+    def __init__(self, failures: list = None) -> None:
+        self.failures = list(failures or [])
+        self.ranges = []
+
+    def __call__(self, start: int, end: int) -> list:
+
+        self.ranges.append((start, end))
+
+        if (start, end) in self.failures:
+            raise ConnectionError('Fetch failed')
+
+        return candles(start=start, end=end)
+
+
+@pytest.fixture
+def candle_cache(tmp_path):
+    return CandleCache(path=str(tmp_path.joinpath('candles')))
+
+
+def grab(candle_cache: CandleCache, fetch: FakeFetch, start: int, end: int, symbol: str = 'MSFT') -> list:
+    return candle_cache.grab(symbol=symbol, frequency_type='minute', frequency=1, start=start, end=end, fetch=fetch)
+
+
+def test_overlapping_and_adjacent_ranges_only_fetch_the_gaps(candle_cache):
+
+    fetch = FakeFetch()
+
+    grab(candle_cache=candle_cache, fetch=fetch, start=START, end=START + 60 * MINUTE)
+    grab(candle_cache=candle_cache, fetch=fetch, start=START + 30 * MINUTE, end=START + 90 * MINUTE)
+    grab(candle_cache=candle_cache, fetch=fetch, start=START + 90 * MINUTE, end=START + 120 * MINUTE)
+    cached = grab(candle_cache=candle_cache, fetch=fetch, start=START + 10 * MINUTE, end=START + 110 * MINUTE)
+
+    assert fetch.ranges == [
+        (START, START + 60 * MINUTE),
+        (START + 60 * MINUTE, START + 90 * MINUTE),
+        (START + 90 * MINUTE, START + 120 * MINUTE)
+    ]
+
+    assert candle_cache.coverage(symbol='MSFT', frequency_type='minute', frequency=1) == [(START, START + 120 * MINUTE)]
+    assert [candle['datetime'] for candle in cached] == list(range(START + 10 * MINUTE, START + 110 * MINUTE + 1, MINUTE))
+
+
+def test_a_range_inside_two_covered_ranges_fetches_the_hole(candle_cache):
+
+    fetch = FakeFetch()
+
+    grab(candle_cache=candle_cache, fetch=fetch, start=START, end=START + 10 * MINUTE)
+    grab(candle_cache=candle_cache, fetch=fetch, start=START + 20 * MINUTE, end=START + 30 * MINUTE)
+
+    assert candle_cache.missing(
+        symbol='MSFT',
+        frequency_type='minute',
+        frequency=1,
+        start=START + 5 * MINUTE,
+        end=START + 25 * MINUTE
+    ) == [(START + 10 * MINUTE, START + 20 * MINUTE)]
+
+
+def test_the_open_last_bar_is_fetched_again(candle_cache):
+
+    fetch = FakeFetch()
+
+    now = int(dt.now().timestamp() * 1000)
+    start = now - now % MINUTE - 10 * MINUTE
+
+    grab(candle_cache=candle_cache, fetch=fetch, start=start, end=now)
+
+    # Covered up to a bar before the fetch, which happened a moment after `now`.
+    (_, covered_end), = candle_cache.coverage(symbol='MSFT', frequency_type='minute', frequency=1)
+    assert now - MINUTE <= covered_end < now
+
+    grab(candle_cache=candle_cache, fetch=fetch, start=start, end=now)
+
+    assert len(fetch.ranges) == 2
+    assert fetch.ranges[1] == (covered_end, now)
+
+
+def test_a_failed_fetch_keeps_the_ranges_that_succeeded(candle_cache):
+
+    fetch = FakeFetch(failures=[(START + 20 * MINUTE, START + 40 * MINUTE)])
+
+    grab(candle_cache=candle_cache, fetch=fetch, start=START + 10 * MINUTE, end=START + 20 * MINUTE)
+
+    # The gaps on both sides of the cached range, the second one fails.
+    with pytest.raises(ConnectionError):
+        grab(candle_cache=candle_cache, fetch=fetch, start=START, end=START + 40 * MINUTE)
+
+    assert candle_cache.coverage(symbol='MSFT', frequency_type='minute', frequency=1) == [(START, START + 20 * MINUTE)]
+
+    fetch.failures = []
+    cached = grab(candle_cache=candle_cache, fetch=fetch, start=START, end=START + 40 * MINUTE)
+
+    assert fetch.ranges[-1] == (START + 20 * MINUTE, START + 40 * MINUTE)
+    assert [candle['datetime'] for candle in cached] == list(range(START, START + 40 * MINUTE + 1, MINUTE))
+
+    # Other symbols have their own coverage.
+    assert candle_cache.coverage(symbol='AAPL', frequency_type='minute', frequency=1) == []
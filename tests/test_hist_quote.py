@@ -0,0 +1,77 @@
+from datetime import datetime as dt
+from datetime import timedelta
+
+import pytest
+
+from Bot.request_scheduler import ThrottledSession
+from Bot.robot_frame import robotFrame
+
+from tests.fake_td_server import FakeTDServer
+from tests.fake_td_server import write_credentials
+
+
+@pytest.fixture
+def fake_server():
+
+    server = FakeTDServer(failures={'BAD': 200, 'DOWN': 500}).start()
+
+    yield server
+
+    server.stop()
+
+
+@pytest.fixture
+def trading_robot(fake_server, tmp_path):
+
+    trading_robot = robotFrame(
+        client_id='TEST',
+        redirect_uri='http://localhost',
+        creds=str(write_credentials(path=tmp_path.joinpath('credentials.json')))
+    )
+
+    # Point the client at the fake server, and keep the retries short.
+    trading_robot.session.config['api_endpoint'] = fake_server.url
+    trading_robot.session = ThrottledSession(session=trading_robot.session.session, max_retries=1, backoff=0.01)
+
+    return trading_robot
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_hist_quote_returns_the_symbols_that_succeeded(trading_robot, fake_server, concurrency):
+
+    end = dt.now()
+    start = end - timedelta(minutes=30)
+
+    historical_prices = trading_robot.hist_quote(
+        start=start,
+        end=end,
+        symbols=['MSFT', 'BAD', 'AAPL', 'DOWN'],
+        concurrency=concurrency
+    )
+
+    assert set(trading_robot.hist_errors) == {'BAD', 'DOWN'}
+    assert 'Bad symbol BAD' in trading_robot.hist_errors['BAD']
+
+    assert 'BAD' not in historical_prices
+    assert 'DOWN' not in historical_prices
+    assert len(historical_prices['MSFT']['candles']) == 30
+
+    # The candles of the symbols that succeeded stay in symbol order.
+    symbols = [candle['symbol'] for candle in historical_prices['aggregated']]
+    assert symbols == ['MSFT'] * 30 + ['AAPL'] * 30
+
+    # The server error was retried once, the unknown symbol wasn't.
+    assert fake_server.requests.count('BAD') == 1
+    assert fake_server.requests.count('DOWN') == 2
+
+
+def test_hist_quote_clears_old_errors(trading_robot):
+
+    end = dt.now()
+    start = end - timedelta(minutes=5)
+
+    trading_robot.hist_quote(start=start, end=end, symbols=['BAD'])
+    trading_robot.hist_quote(start=start, end=end, symbols=['MSFT'])
+
+    assert trading_robot.hist_errors == {}
+    assert len(trading_robot.hist_prices['aggregated']) == 5
@@ -0,0 +1,146 @@
+import numpy as np
+
+from Bot.indicator import Indicators
+from Bot.indicator_stream import session_ids
+from Bot.stock_frame import StockFrame
+
+
+# The start of a minute, in milliseconds since epoch.
+START = 1_600_000_020_000
+
+# The indicators added by `add_indicators`.
+INDICATORS = ['sma', 'ema', 'rsi', 'rsi_ema', 'macd', 'bollinger', 'atr', 'vwap', 'stochastic', 'obv']
+
+
+def bars(symbol: str, minutes: list, seed: int = 0) -> list:
+    """Returns a bar for each minute, the same bars for the same symbol, minutes and seed."""
+
+    random = np.random.default_rng(seed=seed)
+    rows = []
+
+    for minute in minutes:
+
+        close = 100.0 + 3.0 * np.sin(minute / 70.0) + random.normal()
+
+        rows.append({
+            'symbol': symbol,
+            'open': close,
+            'high': close + 1.0,
+            'low': close - 1.0,
+            'close': close,
+            'volume': float(random.integers(100, 1000)),
+            'datetime': START + minute * 60_000
+        })
+
+    return rows
+
+
+def add_indicators(indicator_client: Indicators) -> None:
+
+    indicator_client.sma(period=10)
+    indicator_client.ema(period=10)
+    indicator_client.rsi(period=14)
+    indicator_client.rsi(period=14, method='ema', column_name='rsi_ema')
+    indicator_client.macd(fast_period=6, slow_period=13, signal_period=5)
+    indicator_client.bollinger_bands(period=20)
+    indicator_client.average_true_range(period=14)
+    indicator_client.vwap()
+    indicator_client.stochastic_oscillator(k_period=14, d_period=3)
+    indicator_client.on_balance_volume()
+
+
+def test_incremental_refresh_matches_a_full_recompute():
+
+    # Every other minute, so there is room for late bars.
+    minutes = list(range(0, 3 * 1440, 20))
+    history = bars(symbol='MSFT', minutes=minutes) + bars(symbol='AAPL', minutes=minutes, seed=1)
+    history.sort(key=lambda bar: bar['datetime'])
+
+    # Each update is one batch of bars, a new copy of the last bar, or a bar that fills an old gap.
+    updates = []
+
+    for number, start in enumerate(range(120, len(history), 6)):
+
+        batch = history[start:start + 6]
+        updates.append(batch)
+
+        if number % 5 == 2:
+            updates.append([dict(batch[-1], close=batch[-1]['close'] + 0.5, volume=batch[-1]['volume'] + 10.0)])
+
+        if number % 7 == 3:
+            minute = (batch[0]['datetime'] - START) // 60_000 - 50
+            updates.append(bars(symbol=batch[0]['symbol'], minutes=[minute], seed=number))
+
+    stock_frame = StockFrame(data=history[:120])
+    indicator_client = Indicators(price_data_frame=stock_frame)
+    add_indicators(indicator_client=indicator_client)
+
+    reference = StockFrame(data=history[:120])
+    reference_indicators = Indicators(price_data_frame=reference)
+    add_indicators(indicator_client=reference_indicators)
+
+    for update in updates:
+
+        stock_frame.add_rows(data=update)
+        indicator_client.refresh()
+
+        reference.add_rows(data=update)
+        reference_indicators.refresh(incremental=False)
+
+        for indicator in INDICATORS:
+            for column_name in indicator_client.stream(indicator=indicator).columns:
+                np.testing.assert_allclose(
+                    stock_frame.frame[column_name],
+                    reference.frame[column_name],
+                    rtol=1e-9,
+                    atol=1e-9,
+                    err_msg=column_name
+                )
+
+
+def test_retention_keeps_the_vwap_session_and_the_obv_total():
+
+    # Three days of half hour bars, the current session is shorter than the retention.
+    history = bars(symbol='MSFT', minutes=range(0, 3 * 1440, 30))
+    late_bar = bars(symbol='MSFT', minutes=[3 * 1440 - 45], seed=1)
+
+    reference = StockFrame(data=[])
+    reference.add_rows(data=history + late_bar)
+
+    reference_indicators = Indicators(price_data_frame=reference)
+    reference_indicators.vwap()
+    reference_indicators.on_balance_volume()
+
+    stock_frame = StockFrame(data=[])
+    stock_frame.add_rows(data=history[:60])
+
+    indicator_client = Indicators(price_data_frame=stock_frame)
+    indicator_client.vwap()
+    indicator_client.on_balance_volume()
+
+    stock_frame.set_retention(max_bars=50)
+
+    for start in range(60, len(history), 5):
+        stock_frame.add_rows(data=history[start:start + 5])
+        indicator_client.refresh()
+
+    # The late bar makes both indicators start over from the bars that are left.
+    stock_frame.add_rows(data=late_bar)
+    indicator_client.refresh()
+
+    assert 'vwap' in stock_frame.warmup
+
+    for incremental in (True, False):
+
+        indicator_client.refresh(incremental=incremental)
+
+        frame = stock_frame.frame
+        expected = reference.frame.loc[frame.index]
+
+        timestamps = frame.index.get_level_values('datetime').to_numpy().view(np.int64)
+        sessions = session_ids(timestamps=timestamps)
+        current_session = sessions == sessions[-1]
+
+        assert len(frame) == 50
+        np.testing.assert_allclose(frame['obv'], expected['obv'])
+        np.testing.assert_allclose(frame['vwap'][current_session], expected['vwap'][current_session])
@@ -0,0 +1,199 @@
+import asyncio
+import json
+
+import websockets
+
+from Bot.market_stream import MarketStream
+from Bot.market_stream import ReplayTransport
+from Bot.market_stream import TDStreamTransport
+from Bot.stock_frame import StockFrame
+
+
+# The start of a minute, in milliseconds since epoch.
+START = 1_600_000_020_000
+
+
+def replay_quotes(minutes: int) -> list:
+    """Returns two symbols trading every 10 seconds, with the price going up each minute."""
+
+    messages = []
+
+    for second in range(0, minutes * 60, 10):
+        for symbol in ('MSFT', 'AAPL'):
+            messages.append({
+                'type': 'quote',
+                'symbol': symbol,
+                'lastPrice': 100.0 + second // 60 + second % 60 / 100,
+                'totalVolume': 10 * (second // 10 + 1),
+                'tradeTimeInLong': START + second * 1000
+            })
+
+    return messages
+
+
+def test_replayed_quotes_close_one_bar_per_minute():
+
+    stock_frame = StockFrame(data=[])
+    closed = []
+
+    market_stream = MarketStream(
+        stock_frame=stock_frame,
+        transport=ReplayTransport(messages=replay_quotes(minutes=3), batch_size=7),
+        symbols=['MSFT', 'AAPL'],
+        on_bar=closed.append
+    )
+    market_stream.run()
+
+    assert sum(len(bars) for bars in closed) == 6
+
+    bars = stock_frame.window(symbol='MSFT')
+    assert bars['datetime'].tolist() == [(START + minute * 60_000) * 1_000_000 for minute in range(3)]
+    assert bars['open'].tolist() == [100.0, 101.0, 102.0]
+    assert bars['close'].tolist() == [100.5, 101.5, 102.5]
+
+    # The first snapshot only sets the volume baseline.
+    assert bars['volume'].tolist() == [50.0, 60.0, 60.0]
+
+
+def test_replay_counts_late_quotes_and_batches_streamed_bars():
+
+    stock_frame = StockFrame(data=[])
+
+    messages = replay_quotes(minutes=2)
+    messages.append({'type': 'quote', 'symbol': 'MSFT', 'lastPrice': 1.0, 'totalVolume': 0, 'tradeTimeInLong': START})
+    messages += [
+        {'type': 'bar', 'symbol': symbol, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, 'volume': 100,
+         'datetime': START + 120_000}
+        for symbol in ('MSFT', 'AAPL', 'IBM')
+    ]
+
+    # The late quote and the three bars arrive together, in the last batch.
+    market_stream = MarketStream(stock_frame=stock_frame, transport=ReplayTransport(messages=messages, batch_size=4), symbols=[])
+
+    versions = []
+    add_rows = stock_frame.add_rows
+
+    def counted_add_rows(data):
+        versions.append(len(data))
+        add_rows(data=data)
+
+    stock_frame.add_rows = counted_add_rows
+    market_stream.run()
+
+    assert market_stream.late_quotes == 1
+    assert versions.count(3) == 1
+    assert stock_frame.window(symbol='IBM')['close'].tolist() == [1.5]
+
+
+class FakeConnection():
+
+    def __init__(self, messages: list) -> None:
+        self.messages = list(messages)
+        self.closed = False
+
+    async def recv(self) -> str:
+
+        if not self.messages:
+            await asyncio.sleep(10)
+
+        message = self.messages.pop(0)
+
+        if isinstance(message, Exception):
+            raise message
+
+        return json.dumps(message)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeStreamingSession():
+
+    def __init__(self, connection: FakeConnection) -> None:
+        self.connection = connection
+        self.requests = []
+
+    def level_one_quotes(self, symbols: list, fields: list) -> None:
+        self.requests.append(('QUOTE', symbols, fields))
+
+    def chart(self, service: str, symbols: list, fields: list) -> None:
+        self.requests.append((service, symbols, fields))
+
+    async def build_pipeline(self) -> FakeConnection:
+        return self.connection
+
+
+class FakeSession():
+
+    def __init__(self, connections: list) -> None:
+        self.connections = list(connections)
+        self.streaming_sessions = []
+
+    def create_streaming_session(self) -> FakeStreamingSession:
+
+        streaming_session = FakeStreamingSession(connection=self.connections.pop(0))
+        self.streaming_sessions.append(streaming_session)
+
+        return streaming_session
+
+
+def quote_update(symbol: str, **fields) -> dict:
+    return {'data': [{'service': 'QUOTE', 'content': [dict(key=symbol, **fields)]}]}
+
+
+def test_td_transport_translates_quotes_and_chart_bars():
+
+    transport = TDStreamTransport(session=None, source='quotes')
+
+    assert transport.translate(message=quote_update('MSFT', **{'1': 99.9})) == []
+    assert transport.translate(message=quote_update('MSFT', **{'3': 100.0, '8': 500, '51': START})) == [{
+        'type': 'quote',
+        'symbol': 'MSFT',
+        'bidPrice': 99.9,
+        'lastPrice': 100.0,
+        'totalVolume': 500,
+        'tradeTimeInLong': START
+    }]
+
+    # Bid and ask updates don't make a quote message.
+    assert transport.translate(message=quote_update('MSFT', **{'2': 100.1})) == []
+    assert transport.translate(message={'notify': [{'heartbeat': '1600000020000'}]}) == []
+
+    chart = {'data': [{'service': 'CHART_EQUITY', 'content': [
+        {'seq': 1, 'key': 'MSFT', '1': 1.0, '2': 2.0, '3': 0.5, '4': 1.5, '5': 100.0, '6': 7, '7': START, '8': 18500}
+    ]}]}
+
+    assert transport.translate(message=chart) == [{
+        'type': 'bar',
+        'symbol': 'MSFT',
+        'open': 1.0,
+        'high': 2.0,
+        'low': 0.5,
+        'close': 1.5,
+        'volume': 100.0,
+        'datetime': START
+    }]
+
+
+def test_td_transport_reconnects_when_the_socket_drops():
+
+    dropped = websockets.exceptions.ConnectionClosedError(None, None)
+    session = FakeSession(connections=[
+        FakeConnection(messages=[quote_update('MSFT', **{'3': 100.0, '51': START}), dropped]),
+        FakeConnection(messages=[quote_update('MSFT', **{'3': 101.0, '51': START + 1000})])
+    ])
+
+    transport = TDStreamTransport(session=session, source='quotes', reconnect_delay=0.0)
+    transport.connect(symbols=['MSFT'])
+
+    try:
+        assert transport.receive(timeout=1.0)[0]['lastPrice'] == 100.0
+        assert transport.receive(timeout=1.0) == []
+        assert transport.receive(timeout=1.0) == []
+        assert transport.receive(timeout=1.0)[0]['lastPrice'] == 101.0
+        assert transport.receive(timeout=0.01) == []
+    finally:
+        transport.close()
+
+    assert transport.reconnects == 1
+    assert [streaming_session.requests[0][0] for streaming_session in session.streaming_sessions] == ['QUOTE', 'QUOTE']
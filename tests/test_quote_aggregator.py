@@ -0,0 +1,56 @@
+from Bot.quote_aggregator import QuoteAggregator
+from Bot.stock_frame import StockFrame
+
+
+# The start of a minute, in milliseconds since epoch.
+START = 1_600_000_020_000
+
+# One day, in milliseconds.
+DAY = 24 * 60 * 60 * 1000
+
+
+def quote(price: float, total_volume: float, timestamp: int) -> dict:
+    return {'MSFT': {'lastPrice': price, 'totalVolume': total_volume, 'tradeTimeInLong': timestamp}}
+
+
+def test_an_older_snapshot_in_the_same_bar_is_ignored():
+
+    aggregator = QuoteAggregator(stock_frame=StockFrame(data=[]))
+
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=1_000_000, timestamp=START + 1000))
+    aggregator.add_quotes(quotes=quote(price=101.0, total_volume=1_000_100, timestamp=START + 3000))
+    aggregator.add_quotes(quotes=quote(price=99.0, total_volume=1_000_050, timestamp=START + 2000))
+
+    open_bar = aggregator.open_bars['MSFT']
+    assert open_bar['volume'] == 100
+    assert (open_bar['low'], open_bar['close']) == (100.0, 101.0)
+
+
+def test_a_stale_snapshot_from_the_previous_bar_is_ignored():
+
+    stock_frame = StockFrame(data=[])
+    aggregator = QuoteAggregator(stock_frame=stock_frame)
+
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=1000, timestamp=START))
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=1100, timestamp=START + 30_000))
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=1200, timestamp=START + 60_000))
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=1050, timestamp=START + 40_000))
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=1400, timestamp=START + 90_000))
+
+    assert stock_frame.window(symbol='MSFT')['volume'].tolist() == [100.0]
+    assert aggregator.open_bars['MSFT']['volume'] == 300
+
+
+def test_a_volume_drop_starts_over_only_in_a_new_session():
+
+    aggregator = QuoteAggregator(stock_frame=StockFrame(data=[]))
+
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=5000, timestamp=START))
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=4000, timestamp=START + 1000))
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=5200, timestamp=START + 2000))
+
+    assert aggregator.open_bars['MSFT']['volume'] == 200
+
+    aggregator.add_quotes(quotes=quote(price=100.0, total_volume=300, timestamp=START + DAY))
+
+    assert aggregator.open_bars['MSFT']['volume'] == 300
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from td.exceptions import ServerError
+
+from Bot.request_scheduler import ThrottledSession
+from Bot.request_scheduler import TokenBucket
+
+
+class FakeClient():
+
+    """A stand-in for TDClient that records its calls and answers from a script."""
+
+    def __init__(self, answers: list = None) -> None:
+        self.answers = list(answers or [])
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def _answer(self, name: str) -> dict:
+
+        self.calls.append(name)
+        self.release.wait(timeout=5)
+
+        answer = self.answers.pop(0) if self.answers else {'ok': True}
+
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer
+
+    def get_quotes(self, instruments: list) -> dict:
+        return self._answer(name='get_quotes')
+
+    def place_order(self, account: str, order: dict) -> dict:
+        return self._answer(name='place_order')
+
+    def create_watchlist(self, account: str, name: str, watchlist_items: list) -> dict:
+        return self._answer(name='create_watchlist')
+
+
+def test_token_bucket_allows_a_burst_then_waits():
+
+    bucket = TokenBucket(rate=50.0, capacity=2)
+
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.02, abs=0.015)
+
+
+def test_identical_calls_in_flight_share_one_request():
+
+    client = FakeClient()
+    client.release.clear()
+    session = ThrottledSession(session=client)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(session.get_quotes(instruments=['MSFT'])))
+        for _ in range(2)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    # Hold the leader in the client until the other call has joined it.
+    while session.counters['coalesced'] < 1:
+        time.sleep(0.001)
+
+    client.release.set()
+
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == ['get_quotes']
+    assert results == [{'ok': True}, {'ok': True}]
+
+
+def test_server_errors_are_retried_and_error_responses_are_not():
+
+    client = FakeClient(answers=[ServerError(message='down'), {'MSFT': {}}, {'error': 'Bad symbol'}])
+    session = ThrottledSession(session=client, backoff=0.0)
+
+    assert session.get_quotes(instruments=['MSFT']) == {'MSFT': {}}
+    assert session.get_quotes(instruments=['BAD']) == {'error': 'Bad symbol'}
+
+    assert client.calls == ['get_quotes'] * 3
+    assert session.counters['retried'] == 1
+    assert session.counters['failed'] == 1
+
+
+@pytest.mark.parametrize('method, arguments', [
+    ('place_order', {'account': '1', 'order': {}}),
+    ('create_watchlist', {'account': '1', 'name': 'tech', 'watchlist_items': []})
+])
+def test_changes_are_never_retried(method, arguments):
+
+    client = FakeClient(answers=[ServerError(message='timeout')])
+    session = ThrottledSession(session=client, backoff=0.0)
+
+    with pytest.raises(ServerError):
+        getattr(session, method)(**arguments)
+
+    assert client.calls == [method]
+    assert session.counters['retried'] == 0
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from Bot.indicator import Indicators
+from Bot.signal_engine import SignalEngine
+from Bot.stock_frame import StockFrame
+
+
+# The start of a minute, in milliseconds since epoch.
+START = 1_600_000_020_000
+
+# The indicator values of each symbol. A and C pass every rule of their side, B
+# and D only pass the comparison because their RSI is past the max bound.
+VALUES = {
+    'A': {'rsi': 25.0, 'sma': 10.0, 'ema': 9.0},
+    'B': {'rsi': 15.0, 'sma': 10.0, 'ema': 9.0},
+    'C': {'rsi': 75.0, 'sma': 10.0, 'ema': 11.0},
+    'D': {'rsi': 85.0, 'sma': 10.0, 'ema': 11.0},
+    'E': {'rsi': 50.0, 'sma': 10.0, 'ema': 10.0}
+}
+
+
+@pytest.fixture
+def indicator_client():
+
+    stock_frame = StockFrame(data=[
+        {'symbol': symbol, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 100.0,
+         'datetime': START + minute * 60_000}
+        for symbol in VALUES for minute in range(2)
+    ])
+
+    lengths = np.diff(stock_frame.symbol_offsets)
+
+    for column_name in ('rsi', 'sma', 'ema'):
+        stock_frame.set_column(
+            column_name=column_name,
+            values=np.repeat([VALUES[symbol][column_name] for symbol in stock_frame.symbols], lengths)
+        )
+
+    indicator_client = Indicators(price_data_frame=stock_frame)
+
+    # Buy an RSI between 20 and 30, sell one between 70 and 80.
+    indicator_client.set_indicator_signal(
+        indicator='rsi',
+        buy=30.0,
+        sell=70.0,
+        condition_buy='<',
+        condition_sell='>',
+        buy_max=20.0,
+        sell_max=80.0,
+        condition_buy_max='>',
+        condition_sell_max='<'
+    )
+
+    indicator_client.set_indicator_signal_compare(
+        indicator_1='sma',
+        indicator_2='ema',
+        condition_buy='>',
+        condition_sell='<'
+    )
+
+    return indicator_client
+
+
+def signal_symbols(signals: dict) -> dict:
+    return {side: sorted(rows.index.get_level_values('symbol')) for side, rows in signals.items()}
+
+
+def test_and_logic_needs_every_rule_and_its_max_bound(indicator_client):
+
+    indicator_client.set_signal_logic(buy_logic='and', sell_logic='and')
+
+    assert signal_symbols(signals=indicator_client.check_signals()) == {'buys': ['A'], 'sells': ['C']}
+
+
+def test_or_logic_needs_one_rule(indicator_client):
+
+    indicator_client.set_signal_logic(buy_logic='or', sell_logic='or')
+
+    assert signal_symbols(signals=indicator_client.check_signals()) == {'buys': ['A', 'B'], 'sells': ['C', 'D']}
+
+
+def test_each_side_keeps_its_own_logic(indicator_client):
+
+    indicator_client.set_signal_logic(buy_logic='or', sell_logic='and')
+
+    assert signal_symbols(signals=indicator_client.check_signals()) == {'buys': ['A', 'B'], 'sells': ['C']}
+
+
+def test_a_max_bound_holds_under_or_logic(indicator_client):
+
+    # Without the comparison, only the RSI rule and its bound are left.
+    indicator_client.set_indicator_signal_compare(
+        indicator_1='sma',
+        indicator_2='ema',
+        condition_buy=None,
+        condition_sell=None
+    )
+    indicator_client.set_signal_logic(buy_logic='or', sell_logic='or')
+
+    assert signal_symbols(signals=indicator_client.check_signals()) == {'buys': ['A'], 'sells': ['C']}
+
+
+def test_unknown_logic_is_rejected(indicator_client):
+
+    indicator_client.set_signal_logic(buy_logic='xor')
+
+    with pytest.raises(ValueError):
+        indicator_client.check_signals()
+
+
+def test_comp_keys_without_indicator_names_are_split(indicator_client):
+
+    # Signals saved before the indicator names were stored only have the key.
+    signal_engine = SignalEngine(
+        indicators={'sma_comp_ema': {'buy_operator': '>', 'sell_operator': '<'}},
+        indicators_comp_key=['sma_comp_ema'],
+        indicators_key=[]
+    )
+
+    signals = signal_engine.evaluate(frame=indicator_client.price_data_frame.groupby(level='symbol').tail(1))
+
+    assert signal_engine.columns == ['sma', 'ema']
+    assert signal_symbols(signals=signals) == {'buys': ['A', 'B'], 'sells': ['C', 'D']}